@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Benchmark every automation script against moto and fake CLI tools.
+
+Each scenario runs in its own interpreter. moto's mock_aws() stands in for AWS,
+the account is seeded at a synthetic size, and kind/kubectl/helm/docker/aws/
+minikube are replaced by stubs on PATH that only log their arguments. For every
+scenario and size the harness records:
+
+* wall_seconds       time spent in the script function(s), excluding seeding
+* api_calls          AWS API calls made by the script (from aws_metrics)
+* peak_rss_kb        peak RSS of the scenario's interpreter
+* subprocess_spawns  subprocess.Popen calls made by the script
+* tool_invocations   fake CLI invocations (commands run through a shell)
+* errors_logged      ERROR records the script logged
+
+A scenario that raises or logs an ERROR has failed: it fails the run and is
+never stored as a baseline, since its numbers describe a script that stopped
+early. Results are compared with benchmarks/baselines.json and the run exits
+non-zero if any metric regresses past its tolerance:
+
+    python benchmarks/bench_scripts.py                      # small + medium
+    python benchmarks/bench_scripts.py --sizes large sweep  # one scenario, 10k
+    python benchmarks/bench_scripts.py --update-baseline
+
+Requires boto3 and moto (pip install "moto[all]").
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# ================= CONFIG =================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(REPO_ROOT, "script")
+BASELINE_FILE = os.path.join(REPO_ROOT, "benchmarks", "baselines.json")
+REGION = "us-east-1"
+
+# Synthetic account sizes: instances, users and roles scale with these
+SIZES = {"small": 10, "medium": 1000, "large": 10000}
+DEFAULT_SIZES = ["small", "medium"]
+
+# Allowed growth over baseline before a metric counts as a regression
+TOLERANCE = {
+    "api_calls": 0.10,
+    "subprocess_spawns": 0.0,
+    "tool_invocations": 0.0,
+    "peak_rss_kb": 0.25,
+    "wall_seconds": 1.00,
+}
+WALL_NOISE_FLOOR = 1.0    # Seconds; moto latency jitters, smaller wall regressions are ignored
+# moto answers instantly, so the shared limiter's real-AWS pacing would only
+# measure itself; throttling behaviour is covered by aws_retry's counters
+BENCH_RATE = 100000.0
+
+FAKE_TOOLS = ["kind", "kubectl", "helm", "docker", "aws", "minikube", "sudo", "curl", "rm"]
+FAKE_TOOL = """#!/bin/sh
+echo "$(basename "$0") $*" >> "$BENCH_SPAWN_LOG"
+case "$(basename "$0") $*" in
+    "kubectl get pods"*) echo "pod-0   1/1   Running   0   1m" ;;
+esac
+exit 0
+"""
+
+# AWS managed policies (arn:aws:iam::aws:policy/...) that the scripts attach
+MOTO_CONFIG = {"iam": {"load_aws_managed_policies": True}}
+# From this size iam-roles provisions a generated manifest instead of its examples
+IAM_MANIFEST_FROM = SIZES["medium"]
+IAM_MANIFEST_POLICY = "arn:aws:iam::aws:policy/ReadOnlyAccess"
+
+FAKE_ENV = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_SESSION_TOKEN": "testing",
+    "AWS_DEFAULT_REGION": REGION,
+    "AWS_METRICS_FILE": "",
+    "DB_PASSWORD": "benchmark-password",
+    "PG_FRESH": "1",  # Each run provisions from scratch instead of resuming a journal
+}
+
+# ================= SEEDING =================
+def _boto(service):
+    import boto3
+    return boto3.client(service, region_name=REGION)
+
+def _default_ami():
+    return _boto("ec2").describe_images()["Images"][0]["ImageId"]
+
+def seed_fleet(size):
+    """VPCs with instances, a share of them carrying instance profiles"""
+    ec2, iam = _boto("ec2"), _boto("iam")
+    ami = _default_ami()
+    vpc_count = max(2, size // 100)
+    role_count = max(1, size // 100)
+    profiles = []
+    for i in range(role_count):
+        iam.create_role(RoleName=f"bench-role-{i}", AssumeRolePolicyDocument="{}")
+        iam.create_instance_profile(InstanceProfileName=f"bench-profile-{i}")
+        iam.add_role_to_instance_profile(InstanceProfileName=f"bench-profile-{i}", RoleName=f"bench-role-{i}")
+        profiles.append(f"bench-profile-{i}")
+    for v in range(vpc_count):
+        vpc_id = ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+        subnet_id = ec2.create_subnet(VpcId=vpc_id, CidrBlock="10.0.0.0/20")["Subnet"]["SubnetId"]
+        count = size // vpc_count + (1 if v < size % vpc_count else 0)
+        if not count:
+            continue
+        instances = ec2.run_instances(ImageId=ami, MinCount=count, MaxCount=count, SubnetId=subnet_id)
+        # moto gives only one instance of a RunInstances call the IamInstanceProfile,
+        # so half of them get theirs one at a time
+        for instance in instances["Instances"][:count // 2]:
+            ec2.associate_iam_instance_profile(IamInstanceProfile={"Name": profiles[v % len(profiles)]},
+                                               InstanceId=instance["InstanceId"])
+    return {}
+
+def seed_iam(size):
+    """Users, groups and roles that the IAM scripts have to coexist with.
+
+    From IAM_MANIFEST_FROM, also a CSV manifest that keeps every existing user,
+    adds half as many new ones, and puts all of them in policy-carrying groups.
+    """
+    iam = _boto("iam")
+    group_count = max(1, size // 10)
+    for i in range(size):
+        iam.create_user(UserName=f"bench-user-{i}")
+    for i in range(group_count):
+        iam.create_group(GroupName=f"bench-group-{i}")
+        iam.create_role(RoleName=f"bench-role-{i}", AssumeRolePolicyDocument="{}")
+    if size < IAM_MANIFEST_FROM:
+        return {}
+
+    manifest = os.path.join(tempfile.mkdtemp(), "iam.csv")
+    with open(manifest, "w") as f:
+        f.write("type,name,groups,policies,service\n")
+        for i in range(group_count):
+            f.write(f"group,bench-group-{i},,{IAM_MANIFEST_POLICY},\n")
+            f.write(f"role,bench-role-{i},,{IAM_MANIFEST_POLICY},ec2.amazonaws.com\n")
+        for i in range(size + size // 2):
+            f.write(f"user,bench-user-{i},bench-group-{i % group_count},,\n")
+    return {"MANIFEST_FILE": manifest}
+
+def seed_security_group(size):
+    ec2, iam = _boto("ec2"), _boto("iam")
+    vpc_id = ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+    iam.create_user(UserName="my-iam-user")
+    iam.create_role(RoleName="my-iam-role", AssumeRolePolicyDocument="{}")
+    return {"VPC_ID": vpc_id}
+
+def seed_cloudformation(size):
+    template = os.path.join(tempfile.mkdtemp(), "template.yaml")
+    with open(template, "w") as f:
+        f.write("Resources:\n" + "".join(
+            f"  Topic{i}:\n    Type: AWS::SNS::Topic\n" for i in range(max(1, size // 100))))
+    return {"TEMPLATE_FILE": template}
+
+def seed_ec2_and_vpc(size):
+    _boto("ec2").create_key_pair(KeyName="my-key")
+    return {"AMI_ID": _default_ami()}
+
+def seed_eks(size):
+    role = _boto("iam").create_role(RoleName="EKSNodeRole", AssumeRolePolicyDocument="{}")
+    return {"NODE_ROLE_ARN": role["Role"]["Arn"]}
+
+def seed_eks_deployment(size):
+    # The placeholder image name contains "<", which the shell reads as a redirect
+    return dict(seed_eks(size), DOCKER_IMAGE="bench/python-nginx:latest")
+
+def seed_nothing(size):
+    return {}
+
+# ================= SCENARIOS =================
+# name -> (script, functions, seed, sizes it scales over)
+SCENARIOS = {
+    "sweep": ("script/ec2-IAM-role-security-group.py", ["main"], seed_fleet, None),
+    "iam-roles": ("script/IAM-roles.py", ["main"], seed_iam, None),
+    "security-group": ("script/securtity-group.py", ["main"], seed_security_group, ["small"]),
+    "s3-bucket": ("script/s3-bucket.py", ["main"], seed_nothing, ["small"]),
+    "lambda": ("script/Lambda-function.py", ["main"], seed_nothing, ["small"]),
+    "cloudformation": ("script/cloud-formation.py", ["main"], seed_cloudformation, None),
+    "postgres": ("script/create-postgress.py", ["main"], seed_nothing, ["small"]),
+    "ec2-and-vpc": ("script/ec2-and-vpc.py", ["main"], seed_ec2_and_vpc, ["small"]),
+    "eks": ("script/eks.py", ["create_eks_cluster"], seed_eks, ["small"]),
+    "eks-deployment": ("complete-deployment/eks-deployment.py", ["main"], seed_eks_deployment, ["small"]),
+    "docker-ecr": ("script/docker-ecr.py", ["main"], seed_nothing, ["small"]),
+    "kind-cluster": ("script/kind-cluster.py", ["main"], seed_nothing, ["small"]),
+    "kind-prometheus": ("script/kind-prometheus.py", ["main"], seed_nothing, ["small"]),
+    # main() blocks forever on port-forwards, so only the provisioning steps run
+    "kind-grafana": ("script/kind-grafana.py", ["create_kind_cluster", "deploy_prometheus_grafana"],
+                     seed_nothing, ["small"]),
+    "minikube": ("script/minikube.py", ["main"], seed_nothing, ["small"]),
+}
+
+# ================= CHILD =================
+class ErrorCounter(logging.Handler):
+    """Counts the ERROR records a scenario logs"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+def run_child(name, size_name):
+    """Seed moto, run one scenario and print its metrics as JSON"""
+    import importlib.util
+    from moto import mock_aws
+
+    script, functions, seed, _ = SCENARIOS[name]
+    sys.path.insert(0, SCRIPT_DIR)
+    spawns = [0]
+    popen_init = subprocess.Popen.__init__
+
+    def counting_init(self, *args, **kwargs):
+        spawns[0] += 1
+        popen_init(self, *args, **kwargs)
+
+    with mock_aws(config=MOTO_CONFIG):
+        overrides = seed(SIZES[size_name])
+        path = os.path.join(REPO_ROOT, script)
+        spec = importlib.util.spec_from_file_location(f"bench_{name.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except Exception as e:
+            print("BENCH " + json.dumps({"skipped": f"import failed: {type(e).__name__}: {e}"}))
+            return
+        for attr, value in overrides.items():
+            setattr(module, attr, value)
+
+        import aws_metrics
+        import aws_retry
+        errors = ErrorCounter()
+        logging.getLogger().addHandler(errors)
+        aws_retry.SERVICE_RATES = {}
+        aws_retry.DEFAULT_RATE = BENCH_RATE
+        aws_metrics.reset()
+        subprocess.Popen.__init__ = counting_init
+        start = time.perf_counter()
+        try:
+            for function in functions:
+                getattr(module, function)()
+            error = None
+        except (Exception, SystemExit) as e:
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - start
+        subprocess.Popen.__init__ = popen_init
+        logging.getLogger().removeHandler(errors)
+        report = aws_metrics.get_report()
+
+    with open(os.environ["BENCH_SPAWN_LOG"]) as f:
+        tools = sum(1 for _ in f)
+    print("BENCH " + json.dumps({
+        "wall_seconds": round(wall, 3),
+        "api_calls": sum(op["calls"] for op in report["operations"].values()),
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "subprocess_spawns": spawns[0],
+        "tool_invocations": tools,
+        "errors_logged": errors.count,
+        "error": error,
+    }))
+
+# ================= PARENT =================
+def run_scenario(name, size_name):
+    """Run one scenario in a fresh interpreter with fake tools on PATH"""
+    with tempfile.TemporaryDirectory() as tmp:
+        bin_dir = os.path.join(tmp, "bin")
+        os.mkdir(bin_dir)
+        for tool in FAKE_TOOLS:
+            tool_path = os.path.join(bin_dir, tool)
+            with open(tool_path, "w") as f:
+                f.write(FAKE_TOOL)
+            os.chmod(tool_path, 0o755)
+        spawn_log = os.path.join(tmp, "spawns.log")
+        open(spawn_log, "w").close()
+        env = dict(os.environ, **FAKE_ENV)
+        env["PATH"] = bin_dir + os.pathsep + env.get("PATH", "")
+        env["BENCH_SPAWN_LOG"] = spawn_log
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, size_name],
+                                capture_output=True, text=True, env=env, cwd=tmp)
+    lines = [line for line in result.stdout.splitlines() if line.startswith("BENCH ")]
+    if not lines:
+        error = result.stderr.strip().splitlines()
+        return {"skipped": error[-1] if error else f"exit code {result.returncode}"}
+    return json.loads(lines[-1][len("BENCH "):])
+
+def find_failure(key, metrics):
+    """Return a message if the scenario raised or logged an ERROR, else None"""
+    if metrics.get("error"):
+        return f"{key}: raised {metrics['error']}"
+    if metrics.get("errors_logged"):
+        return f"{key}: logged {metrics['errors_logged']} ERROR record(s)"
+    return None
+
+def find_regressions(key, metrics, baseline):
+    """Return a message for every metric that grew past its tolerance"""
+    regressions = []
+    for metric, tolerance in TOLERANCE.items():
+        if metric not in metrics or metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + tolerance)
+        if metric == "wall_seconds":
+            limit = max(limit, baseline[metric] + WALL_NOISE_FLOOR)
+        if metrics[metric] > limit:
+            regressions.append(f"{key}: {metric} {metrics[metric]} > baseline {baseline[metric]} "
+                               f"(+{tolerance:.0%} allowed)")
+    return regressions
+
+def load_baselines():
+    if not os.path.exists(BASELINE_FILE):
+        return {}
+    with open(BASELINE_FILE) as f:
+        return json.load(f)
+
+def print_results(results):
+    print(f"{'scenario':<28} {'wall':>9} {'calls':>7} {'rss':>9} {'spawns':>7} {'tools':>6}")
+    for key, m in results.items():
+        if "skipped" in m:
+            print(f"{key:<28} skipped: {m['skipped']}")
+            continue
+        print(f"{key:<28} {m['wall_seconds']:>8.3f}s {m['api_calls']:>7} {m['peak_rss_kb'] / 1024:>7.1f}MB "
+              f"{m['subprocess_spawns']:>7} {m['tool_invocations']:>6}" + (f"  ! {m['error']}" if m["error"] else "")
+              + (f"  ! {m['errors_logged']} errors logged" if m.get("errors_logged") else ""))
+
+# ================= MAIN =================
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description="Benchmark the automation scripts against moto")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help="Scenarios to run (default: all)")
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="Comma-separated: small,medium,large")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--json", help="Write the raw results to this file")
+    args = parser.parse_args()
+
+    sizes = [size for size in args.sizes.split(",") if size]
+    results = {}
+    for name in args.scenarios:
+        scales = SCENARIOS[name][3] or list(SIZES)
+        for size_name in sizes:
+            if size_name in scales:
+                results[f"{name}/{size_name}"] = run_scenario(name, size_name)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failures = [message for key, m in results.items() if "skipped" not in m
+                for message in [find_failure(key, m)] if message]
+    for message in failures:
+        print(f"FAILED {message}", file=sys.stderr)
+
+    baselines = load_baselines()
+    if args.update_baseline:
+        # A failed run's numbers would certify a script that stopped early
+        baselines.update({key: m for key, m in results.items()
+                          if "skipped" not in m and not find_failure(key, m)})
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline updated: {BASELINE_FILE}" + (" (failed scenarios left out)" if failures else ""))
+        sys.exit(1 if failures else 0)
+
+    regressions = []
+    for key, metrics in results.items():
+        if "skipped" not in metrics and key in baselines:
+            regressions.extend(find_regressions(key, metrics, baselines[key]))
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    sys.exit(1 if regressions or failures else 0)
+
+if __name__ == "__main__":
+    main()
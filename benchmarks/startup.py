@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Measure import time and peak RSS of every automation script.
+
+Each script is imported (main() is not run) in a fresh interpreter, several
+times, and the median is reported. With --ref the same scripts are also
+measured as they were at that git revision, giving a before/after table:
+
+    python benchmarks/startup.py --ref baseline-commit --repeat 5
+
+Dummy credentials and a default region are set so no AWS access is needed.
+ru_maxrss is reported in KiB on Linux and bytes on macOS.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+# ================= CONFIG =================
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = [
+    "script/IAM-roles.py",
+    "script/Lambda-function.py",
+    "script/cloud-formation.py",
+    "script/create-postgress.py",
+    "script/docker-ecr.py",
+    "script/ec2-IAM-role-security-group.py",
+    "script/ec2-and-vpc.py",
+    "script/ecommerce_healthcheck.py",
+    "script/eks.py",
+    "script/s3-bucket.py",
+    "script/securtity-group.py",
+    "complete-deployment/eks-deployment.py",
+]
+REPEAT = 5
+
+# Runs in the child interpreter: import the script and report cost as JSON
+PROBE = r"""
+import importlib.util, json, os, resource, sys, time
+path = sys.argv[1]
+sys.path.insert(0, os.path.dirname(path))
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("probe", path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print("PROBE " + json.dumps({"import_seconds": elapsed, "max_rss": rss}))
+"""
+
+PROBE_ENV = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "AWS_EC2_METADATA_DISABLED": "true",
+}
+
+# ================= FUNCTIONS =================
+def measure(path, repeat=REPEAT):
+    """Return median import seconds and peak RSS for one script, or an error"""
+    env = dict(os.environ, **PROBE_ENV)
+    samples = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PROBE, path],
+                                capture_output=True, text=True, env=env)
+        lines = [line for line in result.stdout.splitlines() if line.startswith("PROBE ")]
+        if result.returncode != 0 or not lines:
+            error = result.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit code {result.returncode}"}
+        samples.append(json.loads(lines[-1][len("PROBE "):]))
+    return {
+        "import_seconds": statistics.median(s["import_seconds"] for s in samples),
+        "max_rss": statistics.median(s["max_rss"] for s in samples),
+    }
+
+def export_ref(ref, dest):
+    """Extract the tree at a git revision into dest"""
+    archive = os.path.join(dest, "tree.tar")
+    with open(archive, "wb") as f:
+        subprocess.run(["git", "-C", REPO_ROOT, "archive", ref], stdout=f, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(dest)
+    return dest
+
+def run_benchmark(scripts=SCRIPTS, ref=None, repeat=REPEAT):
+    """Measure every script at the working tree and optionally at a git ref"""
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        before_root = export_ref(ref, tmp) if ref else None
+        for script in scripts:
+            row = {"after": measure(os.path.join(REPO_ROOT, script), repeat)}
+            if before_root:
+                before_path = os.path.join(before_root, script)
+                row["before"] = measure(before_path, repeat) if os.path.exists(before_path) \
+                    else {"error": "missing at ref"}
+            report[script] = row
+    return report
+
+def _fmt(sample):
+    if "error" in sample:
+        return f"{'error':>10} {'':>10}"
+    return f"{sample['import_seconds'] * 1000:>8.1f}ms {sample['max_rss'] / 1024:>8.1f}MB"
+
+def print_table(report):
+    """Print the report as a fixed-width table"""
+    has_before = any("before" in row for row in report.values())
+    header = f"{'script':<42} {'after':>21}"
+    if has_before:
+        header = f"{'script':<42} {'before':>21} {'after':>21}"
+    print(header)
+    for script, row in report.items():
+        cells = [_fmt(row["before"])] if has_before else []
+        cells.append(_fmt(row["after"]))
+        print(f"{script:<42} " + " ".join(cells))
+    for script, row in report.items():
+        for label, sample in row.items():
+            if "error" in sample:
+                print(f"{script} ({label}): {sample['error']}", file=sys.stderr)
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark script startup time and RSS")
+    parser.add_argument("--ref", help="Also measure the scripts at this git revision")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--json", help="Write the raw report to this file")
+    parser.add_argument("scripts", nargs="*", default=SCRIPTS)
+    args = parser.parse_args()
+
+    report = run_benchmark(args.scripts, args.ref, args.repeat)
+    print_table(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
-import boto3
 import subprocess
+import sys
 import time
 import logging
 import os
 
+# Shared AWS helpers live alongside the scripts in ../script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "script"))
+import aws_clients
+
 # ================= CONFIG =================
 REGION = "us-east-1"
 EKS_CLUSTER_NAME = "python-eks-cluster"
@@ -23,9 +27,9 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENTS =================
-eks_client = boto3.client("eks", region_name=REGION)
-ec2_client = boto3.client("ec2", region_name=REGION)
-ecr_client = boto3.client("ecr", region_name=REGION)
+eks_client = aws_clients.client("eks", region_name=REGION)
+ec2_client = aws_clients.client("ec2", region_name=REGION)
+ecr_client = aws_clients.client("ecr", region_name=REGION)
 
 # ================= FUNCTIONS =================
 def run(cmd):
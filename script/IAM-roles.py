@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+from aws_retry import error_code
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import logging
+import os
+import time
 
 # ================= CONFIG =================
 REGION = "us-east-1"  # Region doesn't matter for IAM
 LOG_FILE = "/tmp/iam_manager.log"
+MANIFEST_FILE = os.environ.get("IAM_MANIFEST")  # YAML or CSV manifest for bulk mode
+MAX_WORKERS = 8  # Concurrent IAM writes in bulk mode (aws_retry paces and retries them)
+TEARDOWN_PREFIX = os.environ.get("IAM_TEARDOWN_PREFIX")  # Tear down every user/group/role with this name prefix
+DELETE_INSTANCE_PROFILES = True  # Also delete instance profiles left empty by a role teardown
 
 # ================= LOGGING =================
 logging.basicConfig(
@@ -18,7 +27,7 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENT =================
-iam_client = boto3.client('iam', region_name=REGION)
+iam_client = aws_clients.client('iam', region_name=REGION)
 
 # ================= FUNCTIONS =================
 
@@ -27,10 +36,14 @@ def create_user(username):
     try:
         iam_client.create_user(UserName=username)
         logging.info(f"IAM User created: {username}")
+        return True
     except ClientError as e:
         logging.error(f"Error creating user {username}: {e}")
+        return False
 
-def delete_user(username):
+def delete_user(username, cascade=False):
+    if cascade:
+        return teardown(users=[username], snapshot=get_principal_snapshot(users=[username]))
     try:
         iam_client.delete_user(UserName=username)
         logging.info(f"IAM User deleted: {username}")
@@ -41,8 +54,10 @@ def attach_user_policy(username, policy_arn):
     try:
         iam_client.attach_user_policy(UserName=username, PolicyArn=policy_arn)
         logging.info(f"Policy {policy_arn} attached to user {username}")
+        return True
     except ClientError as e:
         logging.error(f"Error attaching policy: {e}")
+        return False
 
 # ----- IAM ROLE -----
 def create_role(role_name, service_name):
@@ -71,7 +86,9 @@ def create_role(role_name, service_name):
         logging.error(f"Error creating role {role_name}: {e}")
         return None
 
-def delete_role(role_name):
+def delete_role(role_name, cascade=False):
+    if cascade:
+        return teardown(roles=[role_name], snapshot=get_principal_snapshot(roles=[role_name]))
     try:
         iam_client.delete_role(RoleName=role_name)
         logging.info(f"IAM Role deleted: {role_name}")
@@ -82,18 +99,24 @@ def attach_role_policy(role_name, policy_arn):
     try:
         iam_client.attach_role_policy(RoleName=role_name, PolicyArn=policy_arn)
         logging.info(f"Policy {policy_arn} attached to role {role_name}")
+        return True
     except ClientError as e:
         logging.error(f"Error attaching policy to role: {e}")
+        return False
 
 # ----- IAM GROUP -----
 def create_group(group_name):
     try:
         iam_client.create_group(GroupName=group_name)
         logging.info(f"IAM Group created: {group_name}")
+        return True
     except ClientError as e:
         logging.error(f"Error creating group {group_name}: {e}")
+        return False
 
-def delete_group(group_name):
+def delete_group(group_name, cascade=False):
+    if cascade:
+        return teardown(groups=[group_name], snapshot=get_principal_snapshot(groups=[group_name]))
     try:
         iam_client.delete_group(GroupName=group_name)
         logging.info(f"IAM Group deleted: {group_name}")
@@ -104,11 +127,358 @@ def add_user_to_group(username, group_name):
     try:
         iam_client.add_user_to_group(UserName=username, GroupName=group_name)
         logging.info(f"User {username} added to group {group_name}")
+        return True
     except ClientError as e:
         logging.error(f"Error adding user to group: {e}")
+        return False
+
+def attach_group_policy(group_name, policy_arn):
+    try:
+        iam_client.attach_group_policy(GroupName=group_name, PolicyArn=policy_arn)
+        logging.info(f"Policy {policy_arn} attached to group {group_name}")
+        return True
+    except ClientError as e:
+        logging.error(f"Error attaching policy to group: {e}")
+        return False
+
+# ----- BULK PROVISIONING -----
+def _split_list(value):
+    return [item.strip() for item in (value or "").split(";") if item.strip()]
+
+def load_manifest(path):
+    """Read a YAML or CSV manifest into {"users": [...], "groups": [...], "roles": [...]}.
+
+    YAML: top-level users/groups/roles lists of {name, groups, policies, service}.
+    CSV: columns type,name,groups,policies,service with ";"-separated lists.
+    """
+    manifest = {"users": [], "groups": [], "roles": []}
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                kind = row["type"].strip().lower().rstrip("s") + "s"
+                manifest[kind].append({
+                    "name": row["name"].strip(),
+                    "groups": _split_list(row.get("groups")),
+                    "policies": _split_list(row.get("policies")),
+                    "service": (row.get("service") or "").strip() or None,
+                })
+        return manifest
+
+    import yaml  # Only needed for YAML manifests
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    for kind in manifest:
+        for entry in data.get(kind) or []:
+            manifest[kind].append({
+                "name": entry["name"],
+                "groups": list(entry.get("groups") or []),
+                "policies": list(entry.get("policies") or []),
+                "service": entry.get("service"),
+            })
+    return manifest
+
+def get_account_snapshot():
+    """Return every user, group and role with their attachments from one paginated call"""
+    snapshot = {"users": {}, "groups": {}, "roles": {}}
+    paginator = iam_client.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate(Filter=["User", "Group", "Role"]):
+        for user in page.get("UserDetailList", []):
+            snapshot["users"][user["UserName"]] = {
+                "groups": set(user.get("GroupList", [])),
+                "policies": {p["PolicyArn"] for p in user.get("AttachedManagedPolicies", [])},
+                "detail": user,
+            }
+        for group in page.get("GroupDetailList", []):
+            snapshot["groups"][group["GroupName"]] = {
+                "policies": {p["PolicyArn"] for p in group.get("AttachedManagedPolicies", [])},
+                "detail": group,
+            }
+        for role in page.get("RoleDetailList", []):
+            snapshot["roles"][role["RoleName"]] = {
+                "policies": {p["PolicyArn"] for p in role.get("AttachedManagedPolicies", [])},
+                "detail": role,
+            }
+    return snapshot
+
+def plan_manifest(manifest, snapshot):
+    """Diff desired against actual state; return (create ops, attach ops)"""
+    creates, attaches = [], []
+    for group in manifest["groups"]:
+        current = snapshot["groups"].get(group["name"])
+        if current is None:
+            creates.append((create_group, group["name"]))
+        for policy_arn in group["policies"]:
+            if current is None or policy_arn not in current["policies"]:
+                attaches.append((attach_group_policy, group["name"], policy_arn))
+    for role in manifest["roles"]:
+        current = snapshot["roles"].get(role["name"])
+        if current is None:
+            creates.append((create_role, role["name"], role["service"] or "ec2.amazonaws.com"))
+        for policy_arn in role["policies"]:
+            if current is None or policy_arn not in current["policies"]:
+                attaches.append((attach_role_policy, role["name"], policy_arn))
+    for user in manifest["users"]:
+        current = snapshot["users"].get(user["name"])
+        if current is None:
+            creates.append((create_user, user["name"]))
+        for group_name in user["groups"]:
+            if current is None or group_name not in current["groups"]:
+                attaches.append((add_user_to_group, user["name"], group_name))
+        for policy_arn in user["policies"]:
+            if current is None or policy_arn not in current["policies"]:
+                attaches.append((attach_user_policy, user["name"], policy_arn))
+    return creates, attaches
+
+def _run_ops(ops, max_workers):
+    """Run (function, *args) ops on a pool; return {function name: [ok, failed]}"""
+    summary = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(op, pool.submit(*op)) for op in ops]
+        for op, future in futures:
+            counts = summary.setdefault(op[0].__name__, [0, 0])
+            try:
+                ok = future.result()
+            except Exception as e:
+                # One op that raises is counted as failed; the others still run
+                logging.error(f"{op[0].__name__}{op[1:]} failed: {type(e).__name__}: {e}")
+                ok = False
+            counts[0 if ok else 1] += 1
+    return summary
+
+def provision_from_manifest(path, max_workers=MAX_WORKERS):
+    """Create and attach only what the manifest adds to the account"""
+    manifest = load_manifest(path)
+    snapshot = get_account_snapshot()
+    creates, attaches = plan_manifest(manifest, snapshot)
+    logging.info(f"Manifest {path}: {len(creates)} entities to create, {len(attaches)} attachments to apply")
+
+    # Entities must exist before anything is attached to them
+    summary = _run_ops(creates, max_workers)
+    for name, counts in _run_ops(attaches, max_workers).items():
+        summary[name] = counts
+    for name, (ok, failed) in sorted(summary.items()):
+        logging.info(f"{name}: {ok} ok, {failed} failed")
+    return summary
+
+# ----- CASCADING TEARDOWN -----
+def _iam_call(method, kwargs):
+    """Run one IAM delete/detach call; an already missing entity counts as done"""
+    try:
+        getattr(iam_client, method)(**kwargs)
+        return True
+    except ClientError as e:
+        if error_code(e) == "NoSuchEntity":
+            return True
+        logging.error(f"{method} {kwargs} failed: {e}")
+        return False
+
+def _run_calls(calls, max_workers):
+    """Run (method, kwargs) calls on a pool; return ({method: [ok, failed]}, failed calls)"""
+    summary, failed = {}, []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [(call, pool.submit(_iam_call, *call)) for call in calls]
+        for call, future in futures:
+            ok = future.result()
+            summary.setdefault(call[0], [0, 0])[0 if ok else 1] += 1
+            if not ok:
+                failed.append(call)
+    return summary, failed
+
+# A failed dependent call blocks the entity deletes that share one of these arguments
+BLOCKING_KEYS = ("UserName", "GroupName", "RoleName", "InstanceProfileName", "SerialNumber")
+
+def _list_all(operation, key, **kwargs):
+    return [item for page in iam_client.get_paginator(operation).paginate(**kwargs) for item in page[key]]
+
+def get_principal_snapshot(users=(), groups=(), roles=()):
+    """Return get_account_snapshot() entries for only these principals, from targeted List* calls.
+
+    A handful of calls per principal instead of every page of the account's
+    authorization details. Principals that don't exist are left out.
+    """
+    snapshot = {"users": {}, "groups": {}, "roles": {}}
+    for username in users:
+        try:
+            snapshot["users"][username] = {
+                "groups": {g["GroupName"] for g in _list_all("list_groups_for_user", "Groups", UserName=username)},
+                "policies": {p["PolicyArn"] for p in
+                             _list_all("list_attached_user_policies", "AttachedPolicies", UserName=username)},
+                "detail": {"UserPolicyList": [{"PolicyName": name} for name in
+                                              _list_all("list_user_policies", "PolicyNames", UserName=username)]},
+            }
+        except ClientError as e:
+            if error_code(e) != "NoSuchEntity":
+                raise
+    for group_name in groups:
+        try:
+            members = _list_all("get_group", "Users", GroupName=group_name)
+            snapshot["groups"][group_name] = {
+                "policies": {p["PolicyArn"] for p in
+                             _list_all("list_attached_group_policies", "AttachedPolicies", GroupName=group_name)},
+                "detail": {"GroupPolicyList": [{"PolicyName": name} for name in
+                                               _list_all("list_group_policies", "PolicyNames", GroupName=group_name)]},
+            }
+        except ClientError as e:
+            if error_code(e) != "NoSuchEntity":
+                raise
+            continue
+        # Members that stay only need their membership of this group removed
+        for member in members:
+            entry = snapshot["users"].setdefault(member["UserName"], {"groups": set(), "policies": set(), "detail": {}})
+            entry["groups"].add(group_name)
+    for role_name in roles:
+        try:
+            snapshot["roles"][role_name] = {
+                "policies": {p["PolicyArn"] for p in
+                             _list_all("list_attached_role_policies", "AttachedPolicies", RoleName=role_name)},
+                "detail": {
+                    "RolePolicyList": [{"PolicyName": name} for name in
+                                       _list_all("list_role_policies", "PolicyNames", RoleName=role_name)],
+                    "InstanceProfileList": _list_all("list_instance_profiles_for_role", "InstanceProfiles",
+                                                     RoleName=role_name),
+                },
+            }
+        except ClientError as e:
+            if error_code(e) != "NoSuchEntity":
+                raise
+    return snapshot
+
+def select_principals(snapshot, prefix):
+    """Return (users, groups, roles) whose names start with prefix"""
+    return tuple(sorted(name for name in snapshot[kind] if name.startswith(prefix))
+                 for kind in ("users", "groups", "roles"))
+
+def list_user_credentials(username):
+    """Return the delete calls for a user's access keys, MFA devices, certificates, SSH keys
+    and service-specific credentials (CodeCommit, Keyspaces, Bedrock)"""
+    calls = []
+    try:
+        for page in iam_client.get_paginator("list_access_keys").paginate(UserName=username):
+            calls += [("delete_access_key", {"UserName": username, "AccessKeyId": k["AccessKeyId"]})
+                      for k in page["AccessKeyMetadata"]]
+        for page in iam_client.get_paginator("list_mfa_devices").paginate(UserName=username):
+            calls += [("deactivate_mfa_device", {"UserName": username, "SerialNumber": d["SerialNumber"]})
+                      for d in page["MFADevices"]]
+        for page in iam_client.get_paginator("list_signing_certificates").paginate(UserName=username):
+            calls += [("delete_signing_certificate", {"UserName": username, "CertificateId": c["CertificateId"]})
+                      for c in page["Certificates"]]
+        for page in iam_client.get_paginator("list_ssh_public_keys").paginate(UserName=username):
+            calls += [("delete_ssh_public_key", {"UserName": username, "SSHPublicKeyId": k["SSHPublicKeyId"]})
+                      for k in page["SSHPublicKeys"]]
+        # Not paginated; a user has at most a few per service
+        calls += [("delete_service_specific_credential",
+                   {"UserName": username, "ServiceSpecificCredentialId": c["ServiceSpecificCredentialId"]})
+                  for c in iam_client.list_service_specific_credentials(UserName=username)["ServiceSpecificCredentials"]]
+    except ClientError as e:
+        if error_code(e) != "NoSuchEntity":
+            logging.error(f"Error listing credentials of user {username}: {e}")
+    # Deleting a missing login profile is a NoSuchEntity no-op, so it needs no lookup
+    calls.append(("delete_login_profile", {"UserName": username}))
+    return calls
+
+def plan_teardown(snapshot, users=(), groups=(), roles=(), max_workers=MAX_WORKERS):
+    """Return (dependent calls, entity calls) that remove the given principals.
+
+    Dependents come from the account snapshot, except credentials, which are
+    listed per user concurrently. Every dependent call can run in parallel;
+    entity deletes only once all of them have succeeded.
+    """
+    dependents, entities = [], []
+    users = [u for u in users if u in snapshot["users"]]
+    groups = [g for g in groups if g in snapshot["groups"]]
+    roles = [r for r in roles if r in snapshot["roles"]]
+    removed_memberships = set()
+
+    for username in users:
+        current = snapshot["users"][username]
+        dependents += [("detach_user_policy", {"UserName": username, "PolicyArn": arn})
+                       for arn in sorted(current["policies"])]
+        dependents += [("delete_user_policy", {"UserName": username, "PolicyName": p["PolicyName"]})
+                       for p in current["detail"].get("UserPolicyList", [])]
+        for group_name in sorted(current["groups"]):
+            removed_memberships.add((username, group_name))
+            dependents.append(("remove_user_from_group", {"UserName": username, "GroupName": group_name}))
+        entities.append(("delete_user", {"UserName": username}))
+
+    for group_name in groups:
+        current = snapshot["groups"][group_name]
+        dependents += [("detach_group_policy", {"GroupName": group_name, "PolicyArn": arn})
+                       for arn in sorted(current["policies"])]
+        dependents += [("delete_group_policy", {"GroupName": group_name, "PolicyName": p["PolicyName"]})
+                       for p in current["detail"].get("GroupPolicyList", [])]
+        # Members that are not being deleted still have to leave the group
+        for username, user in snapshot["users"].items():
+            if group_name in user["groups"] and (username, group_name) not in removed_memberships:
+                dependents.append(("remove_user_from_group", {"UserName": username, "GroupName": group_name}))
+        entities.append(("delete_group", {"GroupName": group_name}))
+
+    for role_name in roles:
+        current = snapshot["roles"][role_name]
+        dependents += [("detach_role_policy", {"RoleName": role_name, "PolicyArn": arn})
+                       for arn in sorted(current["policies"])]
+        dependents += [("delete_role_policy", {"RoleName": role_name, "PolicyName": p["PolicyName"]})
+                       for p in current["detail"].get("RolePolicyList", [])]
+        for profile in current["detail"].get("InstanceProfileList", []):
+            name = profile["InstanceProfileName"]
+            dependents.append(("remove_role_from_instance_profile", {"InstanceProfileName": name, "RoleName": role_name}))
+            others = [r["RoleName"] for r in profile.get("Roles", []) if r["RoleName"] not in roles]
+            if DELETE_INSTANCE_PROFILES and not others:
+                entities.append(("delete_instance_profile", {"InstanceProfileName": name}))
+        entities.append(("delete_role", {"RoleName": role_name}))
+
+    if users:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for calls in pool.map(list_user_credentials, users):
+                dependents += calls
+                # A virtual MFA device can only be deleted once it is deactivated
+                entities += [("delete_virtual_mfa_device", {"SerialNumber": c[1]["SerialNumber"]})
+                             for c in calls if c[0] == "deactivate_mfa_device" and ":mfa/" in c[1]["SerialNumber"]]
+    return dependents, entities
+
+def teardown(users=(), groups=(), roles=(), max_workers=MAX_WORKERS, dry_run=False, snapshot=None):
+    """Delete users, groups and roles with everything attached to them; return a report"""
+    start = time.monotonic()
+    snapshot = snapshot or get_account_snapshot()
+    dependents, entities = plan_teardown(snapshot, users, groups, roles, max_workers)
+    logging.info(f"Teardown: {len(dependents)} dependents to remove before {len(entities)} entity deletes")
+    report = {"dependents": {}, "entities": {}, "failed": [], "skipped": []}
+    if dry_run:
+        report["planned"] = dependents + entities
+        return report
+
+    report["dependents"], failed = _run_calls(dependents, max_workers)
+    # An entity whose dependents could not be removed would only fail with DeleteConflict
+    blocked = {(key, kwargs[key]) for _, kwargs in failed for key in BLOCKING_KEYS if key in kwargs}
+    ready = []
+    for call in entities:
+        if any((key, value) in blocked for key, value in call[1].items()):
+            report["skipped"].append(call)
+        else:
+            ready.append(call)
+    report["entities"], entity_failed = _run_calls(ready, max_workers)
+    report["failed"] = failed + entity_failed
+
+    for phase in ("dependents", "entities"):
+        for method, (ok, bad) in sorted(report[phase].items()):
+            logging.info(f"{method}: {ok} ok, {bad} failed")
+    if report["skipped"]:
+        logging.warning(f"Skipped {len(report['skipped'])} deletes whose dependents could not be removed")
+    report["seconds"] = round(time.monotonic() - start, 2)
+    logging.info(f"Teardown finished in {report['seconds']}s with {len(report['failed'])} failed calls")
+    return report
 
 # ================= MAIN =================
 def main():
+    if TEARDOWN_PREFIX:
+        snapshot = get_account_snapshot()
+        users, groups, roles = select_principals(snapshot, TEARDOWN_PREFIX)
+        teardown(users, groups, roles, snapshot=snapshot)
+        return
+
+    if MANIFEST_FILE:
+        provision_from_manifest(MANIFEST_FILE)
+        return
+
     # Example usage
 
     # Create a user
@@ -127,9 +497,9 @@ def main():
         attach_role_policy("EC2-S3-Access-Role", "arn:aws:iam::aws:policy/AmazonS3FullAccess")
 
     # Delete examples (uncomment to test deletion)
-    # delete_user("dev-user")
-    # delete_group("developers")
-    # delete_role("EC2-S3-Access-Role")
+    # delete_user("dev-user", cascade=True)
+    # delete_group("developers", cascade=True)
+    # delete_role("EC2-S3-Access-Role", cascade=True)
 
 if __name__ == "__main__":
     main()
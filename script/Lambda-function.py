@@ -4,18 +4,26 @@
 
 # Zips Python code for deployment.
 
-# Creates Lambda function.
+# Creates Lambda function (large packages are staged in S3 first).
 
 # Updates Lambda code if needed.
 
 # Deletes Lambda function.
 
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+from aws_retry import error_code
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
+import base64
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import json
+import lambda_package
 import logging
-import zipfile
 import os
+import subprocess
+import time
 
 # ================= CONFIG =================
 REGION = "us-east-1"
@@ -26,7 +34,36 @@ FUNCTION_NAME = "MyLambdaFunction"
 RUNTIME = "python3.11"
 HANDLER = "lambda_function.lambda_handler"
 ROLE_NAME = "LambdaExecutionRole"
+TIMEOUT = 15       # Seconds
+MEMORY_SIZE = 128  # MB; lambda_profiler.py recommends per-function values for the manifest
 ZIP_FILE = "/tmp/lambda_function.zip"  # The zipped Python code
+REQUIREMENTS_FILE = None  # Optional requirements.txt vendored into the package
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes read at a time when hashing a package
+
+# S3 staging: packages are streamed to S3 and deployed by S3Bucket/S3Key when a
+# staging bucket is set, or always when they exceed the inline ZipFile limit
+STAGING_BUCKET = os.environ.get("LAMBDA_STAGING_BUCKET")
+STAGING_PREFIX = "lambda-packages/"
+INLINE_LIMIT = 50 * 1024 * 1024  # Lambda rejects larger inline ZipFile payloads
+UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
+# Bulk deploy: a YAML or JSON manifest of functions deployed concurrently
+MANIFEST_FILE = os.environ.get("LAMBDA_MANIFEST")
+PACKAGE_DIR = "/tmp/lambda-packages"  # Built zips, one per function
+DEPLOY_WORKERS = 8  # Functions created/updated and waited on at once
+
+# Aliases and concurrency (per function in the manifest, these are the defaults)
+ALIAS_NAME = "live"             # Alias moved to each newly published version; None disables aliases
+SHIFT_WEIGHT = None             # e.g. 0.1 sends 10% of alias traffic to the new version; None cuts over fully
+PROVISIONED_CONCURRENCY = None  # Warm environments kept on the new version before traffic moves
+RESERVED_CONCURRENCY = None     # Cap on concurrent executions for the function
+PC_POLL_INTERVAL = 10           # Seconds between provisioned concurrency status checks
+PC_TIMEOUT = 900                # Seconds to wait for provisioned concurrency to be READY
 
 # ================= LOGGING =================
 logging.basicConfig(
@@ -36,8 +73,9 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENT =================
-iam_client = boto3.client("iam", region_name=REGION)
-lambda_client = boto3.client("lambda", region_name=REGION)
+iam_client = aws_clients.client("iam", region_name=REGION)
+lambda_client = aws_clients.client("lambda", region_name=REGION)
+s3_client = aws_clients.client("s3", region_name=REGION)
 
 # ================= FUNCTIONS =================
 
@@ -68,33 +106,34 @@ def create_lambda_role(role_name):
         logging.info(f"Attached AWSLambdaBasicExecutionRole to {role_name}")
         return role_arn
     except ClientError as e:
-        if "EntityAlreadyExists" in str(e):
+        if error_code(e) == "EntityAlreadyExists":
             logging.info(f"Role {role_name} already exists, fetching ARN...")
             response = iam_client.get_role(RoleName=role_name)
             return response['Role']['Arn']
         logging.error(f"Error creating role: {e}")
         return None
 
-def zip_lambda_code(source_file, zip_file):
-    """Zip the Python code for Lambda"""
-    with zipfile.ZipFile(zip_file, 'w') as z:
-        z.write(source_file, arcname=os.path.basename(source_file))
+def zip_lambda_code(source, zip_file, requirements=REQUIREMENTS_FILE):
+    """Zip the Python code (a file or a directory) and its dependencies for Lambda"""
+    lambda_package.build_package(source, zip_file, requirements=requirements)
     logging.info(f"Created ZIP file: {zip_file}")
 
-def create_lambda_function(function_name, role_arn, zip_file, runtime=RUNTIME, handler=HANDLER):
+def create_lambda_function(function_name, role_arn, zip_file, runtime=RUNTIME, handler=HANDLER,
+                           timeout=TIMEOUT, memory_size=MEMORY_SIZE):
     """Create a Lambda function"""
     try:
-        with open(zip_file, 'rb') as f:
-            code_bytes = f.read()
+        code = package_code(zip_file)
+        if code is None:
+            return None
 
         response = lambda_client.create_function(
             FunctionName=function_name,
             Runtime=runtime,
             Role=role_arn,
             Handler=handler,
-            Code={'ZipFile': code_bytes},
-            Timeout=15,
-            MemorySize=128,
+            Code=code,
+            Timeout=timeout,
+            MemorySize=memory_size,
             Publish=True
         )
         logging.info(f"Lambda function created: {function_name}")
@@ -103,16 +142,77 @@ def create_lambda_function(function_name, role_arn, zip_file, runtime=RUNTIME, h
         logging.error(f"Error creating Lambda function: {e}")
         return None
 
-def update_lambda_function_code(function_name, zip_file):
-    """Update Lambda code"""
+def _package_digest(zip_file):
+    digest = hashlib.sha256()
+    with open(zip_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def package_sha256(zip_file):
+    """Return the base64 SHA-256 of a package, in the format Lambda reports as CodeSha256"""
+    return base64.b64encode(_package_digest(zip_file)).decode()
+
+def stage_package(zip_file, bucket=None):
+    """Stream a package to the staging bucket under its content hash; return the key.
+
+    Identical packages map to the same key and are only uploaded once.
+    """
+    bucket = bucket or STAGING_BUCKET
+    key = f"{STAGING_PREFIX}{_package_digest(zip_file).hex()}.zip"
     try:
-        with open(zip_file, 'rb') as f:
-            code_bytes = f.read()
+        s3_client.head_object(Bucket=bucket, Key=key)
+        logging.info(f"Package already staged: s3://{bucket}/{key}")
+        return key
+    except ClientError as e:
+        if error_code(e) not in ("404", "NoSuchKey", "NotFound"):
+            raise
+    # upload_file reads the zip in multipart chunks, so memory stays flat
+    s3_client.upload_file(zip_file, bucket, key, Config=UPLOAD_CONFIG)
+    logging.info(f"Package staged: s3://{bucket}/{key} ({os.path.getsize(zip_file)} bytes)")
+    return key
+
+def package_code(zip_file, bucket=None):
+    """Return the Code parameters for a package: staged in S3 or inline ZipFile bytes"""
+    bucket = bucket or STAGING_BUCKET
+    size = os.path.getsize(zip_file)
+    if not bucket and size > INLINE_LIMIT:
+        logging.error(f"{zip_file} is {size} bytes, over the inline limit; set LAMBDA_STAGING_BUCKET")
+        return None
+    if bucket:
+        return {'S3Bucket': bucket, 'S3Key': stage_package(zip_file, bucket)}
+    with open(zip_file, 'rb') as f:
+        return {'ZipFile': f.read()}
+
+def get_function_configuration(function_name):
+    """Return the function's configuration, or None if it does not exist"""
+    try:
+        return lambda_client.get_function_configuration(FunctionName=function_name)
+    except ClientError as e:
+        if error_code(e) != "ResourceNotFoundException":
+            logging.error(f"Error reading Lambda function configuration: {e}")
+        return None
+
+def update_lambda_function_code(function_name, zip_file, force=False, config=None):
+    """Update Lambda code, skipping the upload and publish when CodeSha256 already matches.
+
+    config: the function's current configuration, if the caller already has it
+    """
+    try:
+        if not force:
+            config = config or get_function_configuration(function_name)
+            if config and config.get("CodeSha256") == package_sha256(zip_file):
+                logging.info(f"Lambda function code unchanged, skipping update: {function_name}")
+                return config['FunctionArn']
+
+        code = package_code(zip_file)
+        if code is None:
+            return None
 
         response = lambda_client.update_function_code(
             FunctionName=function_name,
-            ZipFile=code_bytes,
-            Publish=True
+            Publish=True,
+            **code
         )
         logging.info(f"Lambda function code updated: {function_name}")
         return response['FunctionArn']
@@ -128,8 +228,238 @@ def delete_lambda_function(function_name):
     except ClientError as e:
         logging.error(f"Error deleting Lambda function: {e}")
 
+# ----- ALIASES AND CONCURRENCY -----
+def set_reserved_concurrency(function_name, reserved):
+    """Set the function's reserved concurrency if it differs; None leaves it alone"""
+    if reserved is None:
+        return
+    current = lambda_client.get_function_concurrency(FunctionName=function_name).get("ReservedConcurrentExecutions")
+    if current != reserved:
+        lambda_client.put_function_concurrency(FunctionName=function_name, ReservedConcurrentExecutions=reserved)
+        logging.info(f"Reserved concurrency for {function_name}: {current} -> {reserved}")
+
+def get_alias(function_name, alias):
+    """Return the alias, or None if it does not exist"""
+    try:
+        return lambda_client.get_alias(FunctionName=function_name, Name=alias)
+    except ClientError as e:
+        if error_code(e) == "ResourceNotFoundException":
+            return None
+        raise
+
+def wait_for_provisioned_concurrency(function_name, qualifier, timeout=PC_TIMEOUT):
+    """Poll until provisioned concurrency on a version is READY; return True on success"""
+    deadline = time.monotonic() + timeout
+    while True:
+        config = lambda_client.get_provisioned_concurrency_config(FunctionName=function_name, Qualifier=qualifier)
+        status = config["Status"]
+        if status == "READY":
+            return True
+        if status == "FAILED":
+            logging.error(f"Provisioned concurrency failed for {function_name}:{qualifier}: {config.get('StatusReason')}")
+            return False
+        if time.monotonic() > deadline:
+            logging.error(f"Provisioned concurrency for {function_name}:{qualifier} not READY after {timeout}s")
+            return False
+        time.sleep(PC_POLL_INTERVAL)
+
+def remove_provisioned_concurrency(function_name, qualifier):
+    try:
+        lambda_client.delete_provisioned_concurrency_config(FunctionName=function_name, Qualifier=qualifier)
+        logging.info(f"Provisioned concurrency removed from {function_name}:{qualifier}")
+    except ClientError as e:
+        if error_code(e) != "ProvisionedConcurrencyConfigNotFoundException":
+            logging.error(f"Error removing provisioned concurrency from {function_name}:{qualifier}: {e}")
+
+def release_version(function_name, alias, version, weight=None, provisioned=None):
+    """Point an alias at a version, warming it first; return True on success.
+
+    With provisioned concurrency, the new version is warmed and waited on until
+    READY before any traffic moves to it. weight (0-1) routes only that share
+    of the alias to the new version; promote_alias() completes the shift.
+    """
+    current = get_alias(function_name, alias)
+    old_version = current["FunctionVersion"] if current else None
+    if old_version == version and not (current.get("RoutingConfig") or {}).get("AdditionalVersionWeights"):
+        logging.info(f"Alias {function_name}:{alias} already on version {version}")
+        return True
+
+    if provisioned:
+        lambda_client.put_provisioned_concurrency_config(
+            FunctionName=function_name, Qualifier=version, ProvisionedConcurrentExecutions=provisioned)
+        logging.info(f"Waiting for {provisioned} provisioned environments on {function_name}:{version}...")
+        if not wait_for_provisioned_concurrency(function_name, version):
+            return False
+
+    if current is None:
+        lambda_client.create_alias(FunctionName=function_name, Name=alias, FunctionVersion=version)
+        logging.info(f"Alias {function_name}:{alias} created on version {version}")
+        return True
+    if weight is not None and 0 < weight < 1 and old_version != version:
+        lambda_client.update_alias(FunctionName=function_name, Name=alias, FunctionVersion=old_version,
+                                   RoutingConfig={"AdditionalVersionWeights": {version: weight}})
+        logging.info(f"Alias {function_name}:{alias} sends {weight:.0%} to version {version}, rest to {old_version}")
+        return True
+    return promote_alias(function_name, alias, version, free_provisioned=bool(provisioned))
+
+def promote_alias(function_name, alias, version=None, free_provisioned=True):
+    """Move all of an alias's traffic to version (default: its weighted version); return True on success.
+
+    free_provisioned: also remove provisioned concurrency from the versions it leaves
+    """
+    current = get_alias(function_name, alias)
+    if current is None:
+        logging.error(f"Alias {function_name}:{alias} does not exist; nothing to promote")
+        return False
+    weights = (current.get("RoutingConfig") or {}).get("AdditionalVersionWeights") or {}
+    version = version or next(iter(weights), current["FunctionVersion"])
+    lambda_client.update_alias(FunctionName=function_name, Name=alias, FunctionVersion=version,
+                               RoutingConfig={"AdditionalVersionWeights": {}})
+    logging.info(f"Alias {function_name}:{alias} moved to version {version}")
+    # Environments kept warm for versions that no longer receive traffic are billed for nothing
+    if free_provisioned:
+        for old_version in {current["FunctionVersion"], *weights} - {version}:
+            remove_provisioned_concurrency(function_name, old_version)
+    return True
+
+# ----- BULK DEPLOY -----
+def load_manifest(path):
+    """Read a YAML or JSON manifest into a list of function specs with defaults filled in.
+
+    Each entry: name, source, and optionally requirements, runtime, handler,
+    memory, timeout, role (an execution role name), alias, shift_weight,
+    provisioned_concurrency and reserved_concurrency.
+    """
+    with open(path) as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+        else:
+            import yaml  # Only needed for YAML manifests
+            data = yaml.safe_load(f) or {}
+    specs = []
+    for entry in data.get("functions") or []:
+        specs.append({
+            "name": entry["name"],
+            "source": entry["source"],
+            "requirements": entry.get("requirements"),
+            "runtime": entry.get("runtime", RUNTIME),
+            "handler": entry.get("handler", HANDLER),
+            "memory": int(entry.get("memory", MEMORY_SIZE)),
+            "timeout": int(entry.get("timeout", TIMEOUT)),
+            "role": entry.get("role", ROLE_NAME),
+            "alias": entry.get("alias", ALIAS_NAME),
+            "shift_weight": entry.get("shift_weight", SHIFT_WEIGHT),
+            "provisioned_concurrency": entry.get("provisioned_concurrency", PROVISIONED_CONCURRENCY),
+            "reserved_concurrency": entry.get("reserved_concurrency", RESERVED_CONCURRENCY),
+        })
+    return specs
+
+def list_function_configurations():
+    """Return {function name: configuration} for every function from one paginated call"""
+    functions = {}
+    for page in lambda_client.get_paginator("list_functions").paginate():
+        for config in page["Functions"]:
+            functions[config["FunctionName"]] = config
+    return functions
+
+def wait_for_function(function_name, waiter_name):
+    """Block until the function is Active (function_active_v2) or its update finished (function_updated_v2)"""
+    try:
+        lambda_client.get_waiter(waiter_name).wait(FunctionName=function_name)
+        return True
+    except Exception as e:
+        logging.error(f"Lambda function {function_name} did not settle ({waiter_name}): {e}")
+        return False
+
+def update_function_settings(spec, role_arn, config):
+    """Apply runtime, handler, memory, timeout and role changes; return True if anything changed"""
+    wanted = {"Runtime": spec["runtime"], "Handler": spec["handler"], "MemorySize": spec["memory"],
+              "Timeout": spec["timeout"], "Role": role_arn}
+    changes = {key: value for key, value in wanted.items() if config.get(key) != value}
+    if not changes:
+        return False
+    lambda_client.update_function_configuration(FunctionName=spec["name"], **changes)
+    logging.info(f"Lambda function configuration updated: {spec['name']} {sorted(changes)}")
+    return True
+
+def _deploy_code(spec, role_arn, config):
+    name = spec["name"]
+    zip_file = os.path.join(PACKAGE_DIR, f"{name}.zip")
+    lambda_package.build_package(spec["source"], zip_file, requirements=spec["requirements"])
+    if config is None:
+        if not create_lambda_function(name, role_arn, zip_file, spec["runtime"], spec["handler"],
+                                      spec["timeout"], spec["memory"]):
+            return "failed"
+        return "created" if wait_for_function(name, "function_active_v2") else "failed"
+
+    outcome = "unchanged"
+    if update_function_settings(spec, role_arn, config):
+        outcome = "updated"
+        # Code cannot be updated while a configuration update is in progress
+        if not wait_for_function(name, "function_updated_v2"):
+            return "failed"
+    if config.get("CodeSha256") != package_sha256(zip_file):
+        if not update_lambda_function_code(name, zip_file, force=True):
+            return "failed"
+        outcome = "updated"
+        if not wait_for_function(name, "function_updated_v2"):
+            return "failed"
+    return outcome
+
+def deploy_function(spec, role_arn, config=None):
+    """Create or update one function, wait until it is ready and move its alias; return the outcome"""
+    name = spec["name"]
+    try:
+        outcome = _deploy_code(spec, role_arn, config)
+        if outcome == "failed":
+            return outcome
+        set_reserved_concurrency(name, spec["reserved_concurrency"])
+        if spec["alias"]:
+            version = lambda_client.publish_version(FunctionName=name)["Version"]
+            if not release_version(name, spec["alias"], version, spec["shift_weight"],
+                                   spec["provisioned_concurrency"]):
+                return "failed"
+        return outcome
+    # SubprocessError: pip failing while the package's dependencies are built
+    except (ClientError, OSError, ValueError, subprocess.SubprocessError) as e:
+        logging.error(f"Error deploying Lambda function {name}: {e}")
+        return "failed"
+
+def deploy_manifest(path, max_workers=DEPLOY_WORKERS):
+    """Deploy every function in a manifest concurrently; return {function name: outcome}"""
+    start = time.monotonic()
+    specs = load_manifest(path)
+    os.makedirs(PACKAGE_DIR, exist_ok=True)
+
+    # One lookup per distinct execution role, shared by every function using it
+    role_arns = {name: create_lambda_role(name) for name in sorted({spec["role"] for spec in specs})}
+    existing = list_function_configurations()
+    logging.info(f"Manifest {path}: {len(specs)} functions, {sum(s['name'] in existing for s in specs)} already exist")
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {}
+        for spec in specs:
+            if not role_arns[spec["role"]]:
+                results[spec["name"]] = "failed"
+                continue
+            futures[spec["name"]] = pool.submit(deploy_function, spec, role_arns[spec["role"]], existing.get(spec["name"]))
+        for name, future in futures.items():
+            results[name] = future.result()
+
+    counts = {}
+    for outcome in results.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    logging.info(f"Deployed {len(results)} functions in {time.monotonic() - start:.1f}s: "
+                 + ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items())))
+    return results
+
 # ================= MAIN =================
 def main():
+    if MANIFEST_FILE:
+        deploy_manifest(MANIFEST_FILE)
+        return
+
     # Create IAM role
     role_arn = create_lambda_role(ROLE_NAME)
     if not role_arn:
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Shared, lazily created boto3 clients for the automation scripts.
+
+Scripts declare their clients at import time as before:
+
+    import aws_clients
+    ec2_client = aws_clients.client("ec2", region_name=REGION)
+
+but nothing is built until the first attribute access. Real clients are then
+created from one shared Session per profile, with a tuned botocore Config, and
+cached per (service, region, profile), so every script and thread asking for the
+same client reuses one connection pool. Resources are not thread-safe, so they
+are cached per thread instead.
+
+Every new client is passed to the registered client hooks. By default that
+installs aws_retry, which owns rate limiting and retries for all scripts, and
+aws_metrics, which records per-operation latency and call counts.
+"""
+import threading
+
+import boto3
+from botocore.config import Config
+
+import aws_metrics
+import aws_retry
+
+# ================= CONFIG =================
+MAX_POOL_CONNECTIONS = 50   # Matches the largest worker pools in the scripts
+CONNECT_TIMEOUT = 5         # Seconds
+READ_TIMEOUT = 60           # Seconds
+# aws_retry replaces botocore's retry handler; "standard" avoids stacking
+# botocore's adaptive client-side limiter on top of ours
+RETRY_MODE = "standard"
+MAX_ATTEMPTS = aws_retry.MAX_ATTEMPTS
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    retries={"mode": RETRY_MODE, "max_attempts": MAX_ATTEMPTS}
+)
+
+# ================= STATE =================
+_sessions = {}    # profile -> boto3.Session
+_clients = {}     # (service, region, profile) -> client
+_local = threading.local()
+_lock = threading.Lock()
+_client_hooks = [aws_retry.install, aws_metrics.install]   # Called with every new botocore client
+
+# ================= FUNCTIONS =================
+def get_session(profile=None):
+    """Return the shared Session for a profile (None = default credential chain)"""
+    with _lock:
+        if profile not in _sessions:
+            _sessions[profile] = boto3.session.Session(profile_name=profile)
+        return _sessions[profile]
+
+def register_client_hook(hook):
+    """Call hook(client) for every client created from now on and every cached one"""
+    with _lock:
+        _client_hooks.append(hook)
+        existing = list(_clients.values())
+    for client_ in existing:
+        hook(client_)
+
+def _run_client_hooks(client_):
+    for hook in _client_hooks:
+        hook(client_)
+
+def get_client(service, region_name=None, profile=None):
+    """Return the cached client for (service, region, profile), creating it once"""
+    key = (service, region_name, profile)
+    client_ = _clients.get(key)
+    if client_ is None:
+        session = get_session(profile)
+        # Session.client() is not thread-safe, so creation is serialized
+        with _lock:
+            client_ = _clients.get(key)
+            if client_ is None:
+                client_ = session.client(service, region_name=region_name, config=CLIENT_CONFIG)
+                _run_client_hooks(client_)
+                _clients[key] = client_
+    return client_
+
+def get_resource(service, region_name=None, profile=None):
+    """Return this thread's resource for (service, region, profile), creating it once"""
+    resources = getattr(_local, "resources", None)
+    if resources is None:
+        resources = _local.resources = {}
+    key = (service, region_name, profile)
+    if key not in resources:
+        session = get_session(profile)
+        with _lock:
+            resource_ = session.resource(service, region_name=region_name, config=CLIENT_CONFIG)
+            _run_client_hooks(resource_.meta.client)
+        resources[key] = resource_
+    return resources[key]
+
+def clear_cache():
+    """Drop every cached session and client"""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+    _local.__dict__.clear()
+
+class LazyClient:
+    """Placeholder that resolves to a shared client or resource on first use"""
+
+    def __init__(self, service, region_name=None, profile=None, is_resource=False):
+        self.service = service
+        self.region_name = region_name
+        self.profile = profile
+        self.is_resource = is_resource
+
+    def resolve(self):
+        """Return the real client or resource"""
+        if self.is_resource:
+            return get_resource(self.service, self.region_name, self.profile)
+        return get_client(self.service, self.region_name, self.profile)
+
+    def for_region(self, region_name):
+        """Return a new placeholder for the same service in another region"""
+        return LazyClient(self.service, region_name, self.profile, self.is_resource)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        kind = "resource" if self.is_resource else "client"
+        return f"LazyClient({kind} {self.service!r}, region={self.region_name!r}, profile={self.profile!r})"
+
+def client(service, region_name=None, profile=None):
+    """Declare a client that is created on first use"""
+    return LazyClient(service, region_name, profile)
+
+def resource(service, region_name=None, profile=None):
+    """Declare a resource that is created on first use"""
+    return LazyClient(service, region_name, profile, is_resource=True)
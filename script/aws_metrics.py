@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Per-operation latency, call counts, retries and payload sizes for AWS calls.
+
+aws_clients installs this module on each client it creates. It hooks botocore's
+event system:
+
+* before-call / after-call / after-call-error time every API call and record
+  its error code and the retries botocore reports in ResponseMetadata.
+* before-send adds up request bytes for every attempt.
+* get_waiter() is wrapped, so time spent blocked in waiters (for example
+  db_instance_available) is reported separately from real work.
+
+At exit a JSON report is written to AWS_METRICS_FILE, and, if
+AWS_METRICS_PROM_FILE is set, a Prometheus text exposition file as well.
+Set AWS_METRICS_FILE to an empty string to disable the JSON report.
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# ================= CONFIG =================
+METRICS_FILE = os.environ.get("AWS_METRICS_FILE", "/tmp/aws_metrics.json")
+PROM_FILE = os.environ.get("AWS_METRICS_PROM_FILE")
+# Latency histogram upper bounds in seconds (Prometheus "le" buckets)
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+# ================= STATE =================
+_started = time.monotonic()
+_operations = {}   # (service, operation) -> counters
+_waiters = {}      # (service, waiter) -> counters
+_lock = threading.Lock()
+
+def _new_operation():
+    return {"calls": 0, "errors": {}, "retries": 0, "latency_sum": 0.0, "latency_max": 0.0,
+            "latency_buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            "request_bytes": 0, "response_bytes": 0}
+
+def _split_event(event_name):
+    _, service, operation = event_name.split(".", 2)
+    return service, operation
+
+def _content_length(headers):
+    try:
+        return int(headers.get("Content-Length") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+# ================= RECORDING =================
+def record_call(service, operation, latency, error=None, retries=0, response_bytes=0):
+    """Add one finished API call to the counters"""
+    bucket = len(LATENCY_BUCKETS)
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if latency <= bound:
+            bucket = i
+            break
+    with _lock:
+        stats = _operations.setdefault((service, operation), _new_operation())
+        stats["calls"] += 1
+        stats["retries"] += retries
+        stats["latency_sum"] += latency
+        stats["latency_max"] = max(stats["latency_max"], latency)
+        stats["latency_buckets"][bucket] += 1
+        stats["response_bytes"] += response_bytes
+        if error:
+            stats["errors"][error] = stats["errors"].get(error, 0) + 1
+
+def record_waiter(service, waiter_name, seconds, error=None):
+    """Add one finished waiter.wait() to the counters"""
+    with _lock:
+        stats = _waiters.setdefault((service, waiter_name), {"waits": 0, "seconds": 0.0, "failures": 0})
+        stats["waits"] += 1
+        stats["seconds"] += seconds
+        if error:
+            stats["failures"] += 1
+
+# ================= BOTOCORE HOOKS =================
+def _before_call(context, **kwargs):
+    context["aws_metrics_start"] = time.monotonic()
+
+def _after_call(event_name, http_response, parsed, context, **kwargs):
+    start = context.pop("aws_metrics_start", None)
+    if start is None:
+        return
+    service, operation = _split_event(event_name)
+    error = parsed.get("Error", {}).get("Code") if http_response.status_code >= 300 else None
+    record_call(service, operation, time.monotonic() - start,
+                error=error,
+                retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+                response_bytes=_content_length(http_response.headers))
+
+def _after_call_error(event_name, exception, context, **kwargs):
+    start = context.pop("aws_metrics_start", None)
+    if start is None:
+        return
+    service, operation = _split_event(event_name)
+    record_call(service, operation, time.monotonic() - start, error=type(exception).__name__)
+
+def _before_send(event_name, request, **kwargs):
+    size = _content_length(request.headers)
+    if not size and isinstance(request.body, (bytes, str)):
+        size = len(request.body)
+    service, operation = _split_event(event_name)
+    with _lock:
+        _operations.setdefault((service, operation), _new_operation())["request_bytes"] += size
+
+def _wrap_get_waiter(client, service):
+    get_waiter = client.get_waiter
+
+    def timed_get_waiter(waiter_name):
+        waiter = get_waiter(waiter_name)
+        wait = waiter.wait
+
+        def timed_wait(**kwargs):
+            start = time.monotonic()
+            error = None
+            try:
+                return wait(**kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                record_waiter(service, waiter_name, time.monotonic() - start, error)
+
+        waiter.wait = timed_wait
+        return waiter
+
+    client.get_waiter = timed_get_waiter
+
+def install(client):
+    """Instrument a botocore client"""
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    events.register(f"before-call.{service}", _before_call, unique_id=f"aws-metrics-before-{service}")
+    events.register(f"after-call.{service}", _after_call, unique_id=f"aws-metrics-after-{service}")
+    events.register(f"after-call-error.{service}", _after_call_error, unique_id=f"aws-metrics-error-{service}")
+    events.register(f"before-send.{service}", _before_send, unique_id=f"aws-metrics-send-{service}")
+    _wrap_get_waiter(client, service)
+
+# ================= REPORTING =================
+def get_report():
+    """Return every counter as a JSON-serializable dict"""
+    with _lock:
+        operations = {f"{service}.{operation}": dict(stats, errors=dict(stats["errors"]),
+                                                      latency_buckets=list(stats["latency_buckets"]))
+                      for (service, operation), stats in _operations.items()}
+        waiters = {f"{service}.{name}": dict(stats) for (service, name), stats in _waiters.items()}
+    return {
+        "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else None,
+        "wall_seconds": round(time.monotonic() - _started, 3),
+        "api_seconds": round(sum(s["latency_sum"] for s in operations.values()), 3),
+        "waiter_seconds": round(sum(s["seconds"] for s in waiters.values()), 3),
+        "latency_buckets": LATENCY_BUCKETS,
+        "operations": operations,
+        "waiters": waiters,
+    }
+
+def reset():
+    """Drop every counter and restart the wall clock"""
+    global _started
+    with _lock:
+        _operations.clear()
+        _waiters.clear()
+        _started = time.monotonic()
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+def prometheus_text(report=None):
+    """Render a report in the Prometheus text exposition format"""
+    report = report or get_report()
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+    ops = [(dict(zip(("service", "operation"), key.split(".", 1))), stats)
+           for key, stats in sorted(report["operations"].items())]
+    metric("aws_api_calls_total", "counter", "AWS API calls made",
+           [(_labels(**l), s["calls"]) for l, s in ops])
+    metric("aws_api_retries_total", "counter", "Retried attempts reported by botocore",
+           [(_labels(**l), s["retries"]) for l, s in ops])
+    metric("aws_api_errors_total", "counter", "AWS API calls that failed, by error code",
+           [(_labels(**l, code=code), count) for l, s in ops for code, count in sorted(s["errors"].items())])
+    metric("aws_api_request_bytes_total", "counter", "Request body bytes sent",
+           [(_labels(**l), s["request_bytes"]) for l, s in ops])
+    metric("aws_api_response_bytes_total", "counter", "Response body bytes received",
+           [(_labels(**l), s["response_bytes"]) for l, s in ops])
+
+    lines.append("# HELP aws_api_call_duration_seconds AWS API call latency including retries")
+    lines.append("# TYPE aws_api_call_duration_seconds histogram")
+    for l, s in ops:
+        cumulative = 0
+        for bound, count in zip(report["latency_buckets"] + ["+Inf"], s["latency_buckets"]):
+            cumulative += count
+            lines.append(f"aws_api_call_duration_seconds_bucket{_labels(**l, le=bound)} {cumulative}")
+        lines.append(f"aws_api_call_duration_seconds_sum{_labels(**l)} {s['latency_sum']}")
+        lines.append(f"aws_api_call_duration_seconds_count{_labels(**l)} {s['calls']}")
+
+    waiters = [(dict(zip(("service", "waiter"), key.split(".", 1))), stats)
+               for key, stats in sorted(report["waiters"].items())]
+    metric("aws_waiter_seconds_total", "counter", "Seconds spent blocked in botocore waiters",
+           [(_labels(**l), s["seconds"]) for l, s in waiters])
+    metric("aws_script_wall_seconds", "gauge", "Script wall time when the report was written",
+           [("", report["wall_seconds"])])
+    return "\n".join(lines) + "\n"
+
+def write_reports(json_file=METRICS_FILE, prom_file=PROM_FILE):
+    """Write the JSON and optional Prometheus reports if any call was recorded"""
+    if not _operations and not _waiters:
+        return
+    report = get_report()
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"AWS metrics written to {json_file} "
+                     f"({report['api_seconds']}s in API calls, {report['waiter_seconds']}s in waiters, "
+                     f"{report['wall_seconds']}s wall)")
+    if prom_file:
+        with open(prom_file, "w") as f:
+            f.write(prometheus_text(report))
+
+atexit.register(write_reports)
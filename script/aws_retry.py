@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Shared rate limiting and throttling-aware retries for every AWS client.
+
+aws_clients installs this module on each client it creates:
+
+* before-send: one token bucket per (region, service, operation), shared by all
+  threads and clients, paces requests, so every region gets its own rate.
+  Account-wide services (IAM, Organizations, Route 53, ...) share one bucket
+  across regions. Throttle responses halve the bucket's rate and successes
+  slowly restore it (additive increase, multiplicative decrease).
+* needs-retry: replaces botocore's retry handler. Errors are classified by
+  e.response['Error']['Code'] and HTTP status, and throttles and transient
+  failures are retried with exponential backoff and full jitter.
+
+get_stats() and log_stats() report calls, throttles, retries and seconds spent
+throttled per operation and region, so worker pool sizes can be tuned from data.
+"""
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+# ================= CONFIG =================
+MAX_ATTEMPTS = 8          # Including the first request
+BASE_DELAY = 0.5          # Seconds; backoff ceiling doubles from here per attempt
+MAX_DELAY = 20.0          # Seconds
+DEFAULT_RATE = 10.0       # Requests per second per operation
+SERVICE_RATES = {         # Starting rates; AWS limits are per account and region
+    "ec2": 20.0,
+    "iam": 10.0,
+    "sts": 20.0,
+    "s3": 50.0,
+    "lambda": 10.0,
+    "cloudformation": 5.0,
+    "rds": 5.0,
+    "ecr": 10.0,
+    "eks": 5.0,
+}
+# Limits of these apply to the whole account, so every region shares one bucket
+GLOBAL_SERVICES = {"iam", "organizations", "route53", "route53domains", "cloudfront", "waf", "shield",
+                   "globalaccelerator"}
+GLOBAL_REGION = "global"
+MIN_RATE = 0.5            # Never pace an operation below this
+DECREASE_FACTOR = 0.5     # Rate multiplier after a throttle
+INCREASE_STEP = 0.1       # Rate added back after each success
+
+THROTTLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "BandwidthLimitExceeded",
+    "SlowDown",
+    "PriorRequestNotComplete",
+    "EC2ThrottledException",
+}
+TRANSIENT_CODES = {
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "InternalError",
+    "InternalFailure",
+    "InternalServerError",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "IDPCommunicationError",
+}
+TRANSIENT_STATUS = {500, 502, 503, 504}
+
+# ================= ERROR CLASSIFICATION =================
+def error_code(e):
+    """Return the AWS error code of a ClientError, or "" for anything else"""
+    if isinstance(e, ClientError):
+        return e.response.get("Error", {}).get("Code", "")
+    return ""
+
+def classify(code, status=None, exception=None):
+    """Return "throttle", "transient" or None (success or not retryable)"""
+    if exception is not None:
+        return "transient" if isinstance(exception, (ConnectionError, HTTPClientError)) else None
+    if code in THROTTLE_CODES or status == 429:
+        return "throttle"
+    if code in TRANSIENT_CODES or status in TRANSIENT_STATUS:
+        return "transient"
+    return None
+
+def backoff_delay(attempts):
+    """Full-jitter exponential backoff for the retry after `attempts` tries"""
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** (attempts - 1)))
+
+# ================= RATE LIMITER =================
+class TokenBucket:
+    """Thread-safe token bucket whose rate adapts to throttling"""
+
+    def __init__(self, rate):
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available; return seconds waited"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve the token now and sleep outside the lock, so waiters queue fairly
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(MIN_RATE, self.rate * DECREASE_FACTOR)
+            self.tokens = min(self.tokens, 0.0)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+_buckets = {}     # (region, service, operation) -> TokenBucket
+_stats = {}       # (region, service, operation) -> counters
+_lock = threading.Lock()
+
+def get_bucket(region, service, operation):
+    """Return the shared bucket for one operation in one region"""
+    key = (region, service, operation)
+    with _lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(SERVICE_RATES.get(service, DEFAULT_RATE))
+        return _buckets[key]
+
+def _record(region, service, operation, **counts):
+    key = (region, service, operation)
+    with _lock:
+        stats = _stats.setdefault(key, {"calls": 0, "throttles": 0, "retries": 0,
+                                        "failures": 0, "throttled_seconds": 0.0})
+        for name, value in counts.items():
+            stats[name] += value
+
+# ================= BOTOCORE HOOKS =================
+def _before_send(region, event_name, **kwargs):
+    _, service, operation = event_name.split(".", 2)
+    waited = get_bucket(region, service, operation).acquire()
+    _record(region, service, operation, calls=1, throttled_seconds=waited)
+    # Returning None lets botocore (or moto) send the request as usual
+
+def _needs_retry(region, response, attempts, caught_exception, operation, **kwargs):
+    service = operation.service_model.service_id.hyphenize()
+    bucket = get_bucket(region, service, operation.name)
+    code, status = "", None
+    if response is not None:
+        http_response, parsed = response
+        status = http_response.status_code
+        code = parsed.get("Error", {}).get("Code", "")
+    kind = classify(code, status, caught_exception)
+    if kind is None:
+        if caught_exception is None and status is not None and status < 300:
+            bucket.on_success()
+        return None
+
+    if kind == "throttle":
+        bucket.on_throttle()
+        _record(region, service, operation.name, throttles=1)
+    if attempts >= MAX_ATTEMPTS:
+        logging.warning(f"{service}.{operation.name} in {region} gave up after {attempts} attempts "
+                        f"({code or caught_exception})")
+        _record(region, service, operation.name, failures=1)
+        return None
+
+    delay = backoff_delay(attempts)
+    _record(region, service, operation.name, retries=1,
+            throttled_seconds=delay if kind == "throttle" else 0.0)
+    logging.debug(f"{service}.{operation.name} in {region} {kind} ({code or caught_exception}), "
+                  f"retrying in {delay:.2f}s")
+    return delay
+
+def limit_region(client, service):
+    """Return the region key a client's limits are counted under"""
+    if service in GLOBAL_SERVICES:
+        return GLOBAL_REGION
+    # STS is global unless the client uses a regional endpoint
+    if service == "sts" and (client.meta.endpoint_url or "").startswith("https://sts.amazonaws.com"):
+        return GLOBAL_REGION
+    return client.meta.region_name or GLOBAL_REGION
+
+def install(client):
+    """Route a botocore client's pacing and retries through this module"""
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    # AWS limits are per account and region; the hooks are bound to this client's region
+    region = limit_region(client, service)
+    # Drop botocore's own retry handler so retries are not multiplied
+    events.unregister(f"needs-retry.{service}", unique_id=f"retry-config-{service}")
+    events.register(f"needs-retry.{service}", lambda **kwargs: _needs_retry(region, **kwargs),
+                    unique_id=f"aws-retry-{service}")
+    events.register(f"before-send.{service}", lambda **kwargs: _before_send(region, **kwargs),
+                    unique_id=f"aws-retry-limit-{service}")
+
+# ================= REPORTING =================
+def get_stats():
+    """Return a copy of the counters keyed by "service.operation@region" """
+    with _lock:
+        return {f"{service}.{operation}@{region}": dict(stats)
+                for (region, service, operation), stats in _stats.items()}
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+def log_stats():
+    """Log operations that were throttled or retried, worst first"""
+    stats = get_stats()
+    noisy = sorted(((name, s) for name, s in stats.items() if s["throttles"] or s["retries"]),
+                   key=lambda item: item[1]["throttled_seconds"], reverse=True)
+    total = sum(s["throttled_seconds"] for s in stats.values())
+    logging.info(f"AWS calls: {sum(s['calls'] for s in stats.values())}, "
+                 f"throttled for {total:.1f}s in total")
+    for name, s in noisy:
+        logging.info(f"  {name}: {s['calls']} calls, {s['throttles']} throttles, {s['retries']} retries, "
+                     f"{s['failures']} gave up, {s['throttled_seconds']:.1f}s throttled")
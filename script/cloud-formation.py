@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+import hashlib
+import json
 import logging
+import os
+import re
+from aws_retry import error_code
 from botocore.exceptions import ClientError
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
 import time
 
 # ================= CONFIG =================
@@ -13,8 +20,41 @@ PARAMETERS = [
     # {"ParameterKey": "InstanceType", "ParameterValue": "t2.micro"},
 ]
 
+CAPABILITIES = ['CAPABILITY_NAMED_IAM', 'CAPABILITY_AUTO_EXPAND']
+
 LOG_FILE = "/tmp/cloudformation.log"
 
+# No-op detection and change sets
+FINGERPRINT_FILE = "/tmp/cfn_fingerprints.json"  # Last deployed template/parameter hash per stack
+PREVIEW_ONLY = os.environ.get("CFN_PREVIEW") == "1"  # Create and log change sets without executing them
+TEMPLATE_BUCKET = os.environ.get("CFN_TEMPLATE_BUCKET")  # S3 bucket for templates over the inline limit
+TEMPLATE_PREFIX = "cloudformation/"
+INLINE_TEMPLATE_LIMIT = 51200  # Bytes; larger TemplateBody values are rejected
+
+# Multi-stack mode: a YAML or JSON manifest of stacks deployed in dependency order
+STACKS_MANIFEST = os.environ.get("CFN_STACKS_MANIFEST")
+MAX_STACK_WORKERS = 4  # Stacks created/updated at once
+
+# Drift scan: every stack in the region, detections started together and polled in one loop
+DRIFT_SCAN = os.environ.get("CFN_DRIFT_SCAN") == "1"
+DRIFT_REPORT_FILE = "/tmp/cfn_drift_report.json"
+DRIFT_WORKERS = 8  # Concurrent drift API calls (aws_retry paces them per operation)
+DRIFT_STACK_STATUSES = [
+    "CREATE_COMPLETE", "UPDATE_COMPLETE", "UPDATE_ROLLBACK_COMPLETE", "IMPORT_COMPLETE", "IMPORT_ROLLBACK_COMPLETE",
+]
+
+# Event streaming: polling starts fast and slows while nothing new happens
+POLL_MIN = 2          # Seconds
+POLL_MAX = 30         # Seconds
+POLL_BACKOFF = 1.5    # Delay multiplier after a poll with no new events
+STACK_TIMEOUT = 3600  # Seconds before giving up on a stack operation
+STACK_COMPLETE = {"create": "CREATE_COMPLETE", "update": "UPDATE_COMPLETE", "delete": "DELETE_COMPLETE"}
+STACK_FAILED = {
+    "CREATE_FAILED", "ROLLBACK_IN_PROGRESS", "ROLLBACK_COMPLETE", "ROLLBACK_FAILED",
+    "UPDATE_FAILED", "UPDATE_ROLLBACK_IN_PROGRESS", "UPDATE_ROLLBACK_COMPLETE", "UPDATE_ROLLBACK_FAILED",
+    "DELETE_FAILED",
+}
+
 # ================= LOGGING =================
 logging.basicConfig(
     level=logging.INFO,
@@ -23,7 +63,14 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENT =================
-cf_client = boto3.client("cloudformation", region_name=REGION)
+cf_client = aws_clients.client("cloudformation", region_name=REGION)
+s3_client = aws_clients.client("s3", region_name=REGION)
+sts_client = aws_clients.client("sts", region_name=REGION)  # Only for ${AWS::AccountId} in export names
+
+# ================= STATE =================
+_fingerprints = None   # stack name -> {"fingerprint", "stack_id", "updated"}, loaded once
+_fingerprint_lock = threading.Lock()
+_account_id = None     # Looked up once, if a template's export names use it
 
 # ================= FUNCTIONS =================
 
@@ -45,71 +92,677 @@ def stack_exists(stack_name):
 def create_stack(stack_name, template_body, parameters):
     try:
         logging.info(f"Creating stack {stack_name}...")
-        cf_client.create_stack(
+        response = cf_client.create_stack(
             StackName=stack_name,
             TemplateBody=template_body,
             Parameters=parameters,
-            Capabilities=['CAPABILITY_NAMED_IAM', 'CAPABILITY_AUTO_EXPAND']
+            Capabilities=CAPABILITIES
         )
-        wait_for_completion(stack_name, "create")
+        return wait_for_completion(response['StackId'], "create")
     except ClientError as e:
         logging.error(f"Failed to create stack: {e}")
+        return False
 
 def update_stack(stack_name, template_body, parameters):
     try:
         logging.info(f"Updating stack {stack_name}...")
+        stack_id, last_event_id = get_stack_position(stack_name)
         cf_client.update_stack(
             StackName=stack_name,
             TemplateBody=template_body,
             Parameters=parameters,
-            Capabilities=['CAPABILITY_NAMED_IAM', 'CAPABILITY_AUTO_EXPAND']
+            Capabilities=CAPABILITIES
         )
-        wait_for_completion(stack_name, "update")
+        return wait_for_completion(stack_id, "update", last_event_id)
     except ClientError as e:
         if "No updates are to be performed" in str(e):
             logging.info("Stack is already up-to-date")
-        else:
-            logging.error(f"Failed to update stack: {e}")
+            return True
+        logging.error(f"Failed to update stack: {e}")
+        return False
 
 def delete_stack(stack_name):
     try:
         logging.info(f"Deleting stack {stack_name}...")
+        # Events of a deleted stack can only be read by stack ID
+        stack_id, last_event_id = get_stack_position(stack_name)
         cf_client.delete_stack(StackName=stack_name)
-        wait_for_completion(stack_name, "delete")
+        return wait_for_completion(stack_id, "delete", last_event_id)
     except ClientError as e:
         logging.error(f"Failed to delete stack: {e}")
+        return False
 
-def wait_for_completion(stack_name, action):
-    logging.info(f"Waiting for stack {stack_name} to {action}...")
-    waiter = None
-    if action == "create":
-        waiter = cf_client.get_waiter('stack_create_complete')
-    elif action == "update":
-        waiter = cf_client.get_waiter('stack_update_complete')
-    elif action == "delete":
-        waiter = cf_client.get_waiter('stack_delete_complete')
-
-    elif action == "update":
-        waiter = cf_client.get_waiter('stack_update_complete')
-    else:
-        logging.error(f"Unknown action {action}")
-        return
+def get_stack_position(stack_name):
+    """Return (stack ID, ID of the newest event) so only later events are streamed"""
+    stack_id = cf_client.describe_stacks(StackName=stack_name)['Stacks'][0]['StackId']
+    events = cf_client.describe_stack_events(StackName=stack_id)['StackEvents']
+    return stack_id, events[0]['EventId'] if events else None
 
+def new_stack_events(stack_id, last_event_id=None):
+    """Return the events after last_event_id, oldest first, paging only as far back as needed"""
+    events = []
+    paginator = cf_client.get_paginator('describe_stack_events')
+    for page in paginator.paginate(StackName=stack_id):
+        for event in page['StackEvents']:
+            if event['EventId'] == last_event_id:
+                return events[::-1]
+            events.append(event)
+    return events[::-1]
+
+def stream_stack_events(stack_id, action, last_event_id=None, timeout=STACK_TIMEOUT):
+    """Log stack events as they happen; return True on success, False on the first failure"""
+    started = {}        # Logical ID -> timestamp of its first IN_PROGRESS event
+    cleanup = False     # Failures while cleaning up old resources don't fail an update
+    delay = POLL_MIN
+    deadline = time.monotonic() + timeout
+    while True:
+        events = new_stack_events(stack_id, last_event_id)
+        for event in events:
+            last_event_id = event['EventId']
+            logical_id = event['LogicalResourceId']
+            status = event['ResourceStatus']
+            reason = event.get('ResourceStatusReason') or ""
+            if status.endswith("_IN_PROGRESS"):
+                started.setdefault(logical_id, event['Timestamp'])
+            duration = ""
+            if (status.endswith("_COMPLETE") or status.endswith("_FAILED")) and logical_id in started:
+                duration = f" in {(event['Timestamp'] - started.pop(logical_id)).total_seconds():.0f}s"
+            logging.info(f"{event['StackName']}: {logical_id} ({event.get('ResourceType')}) {status}{duration} {reason}".rstrip())
+
+            if event.get('PhysicalResourceId') == stack_id:
+                cleanup = status.endswith("CLEANUP_IN_PROGRESS")
+                if status == STACK_COMPLETE[action]:
+                    return True
+                if status in STACK_FAILED:
+                    logging.error(f"Stack {event['StackName']} {action} failed: {status} {reason}")
+                    return False
+            elif status.endswith("_FAILED") and not cleanup:
+                logging.error(f"Stack {event['StackName']} {action} failed at {logical_id}: {reason}")
+                return False
+
+        delay = POLL_MIN if events else min(POLL_MAX, delay * POLL_BACKOFF)
+        if time.monotonic() + delay > deadline:
+            logging.error(f"Timed out after {timeout}s waiting for stack {stack_id} to {action}")
+            return False
+        time.sleep(delay)
+
+def wait_for_completion(stack_id, action, last_event_id=None):
+    """Stream the stack's events until the action finishes; return True on success"""
+    if action not in STACK_COMPLETE:
+        logging.error(f"Unknown action {action}")
+        return False
+    logging.info(f"Waiting for stack {stack_id} to {action}...")
+    start = time.monotonic()
     try:
-        waiter.wait(StackName=stack_name)
-        logging.info(f"Stack {stack_name} {action}d successfully!")
+        ok = stream_stack_events(stack_id, action, last_event_id)
     except ClientError as e:
         logging.error(f"Error while waiting for stack {action}: {e}")
+        return False
+    if ok:
+        logging.info(f"Stack {stack_id} {action}d successfully in {time.monotonic() - start:.0f}s!")
+    return ok
+
+# ----- NO-OP DETECTION AND CHANGE SETS -----
+def stack_fingerprint(template_body, parameters, capabilities=CAPABILITIES):
+    """Hash everything a deploy sends, so an identical redeploy can be recognised locally"""
+    digest = hashlib.sha256(template_body.encode())
+    for p in sorted(parameters, key=lambda p: p["ParameterKey"]):
+        digest.update(f"\0{p['ParameterKey']}={p.get('ParameterValue')}".encode())
+    digest.update(f"\0{sorted(capabilities)}".encode())
+    return digest.hexdigest()
+
+def _load_fingerprints():
+    global _fingerprints
+    if _fingerprints is None:
+        try:
+            with open(FINGERPRINT_FILE) as f:
+                _fingerprints = json.load(f)
+        except (OSError, ValueError):
+            _fingerprints = {}
+    return _fingerprints
+
+def get_fingerprint(stack_name):
+    with _fingerprint_lock:
+        return _load_fingerprints().get(stack_name)
+
+def save_fingerprint(stack_name, fingerprint, stack):
+    """Remember what was deployed, tied to the stack's last-modified time"""
+    with _fingerprint_lock:
+        fingerprints = _load_fingerprints()
+        fingerprints[stack_name] = {"fingerprint": fingerprint, "stack_id": stack["StackId"],
+                                    "updated": str(stack.get("LastUpdatedTime") or stack["CreationTime"])}
+        with open(FINGERPRINT_FILE, "w") as f:
+            json.dump(fingerprints, f, indent=2)
+
+def describe_stack(stack_name):
+    """Return the stack, or None if it does not exist"""
+    try:
+        return cf_client.describe_stacks(StackName=stack_name)['Stacks'][0]
+    except ClientError as e:
+        if "does not exist" in str(e):
+            return None
+        raise
+
+def deployed_matches(stack, template_body, parameters):
+    """Compare the deployed template and parameters with what would be sent"""
+    deployed = {p["ParameterKey"]: p.get("ParameterValue") for p in stack.get("Parameters", [])}
+    # An update resets parameters left out to their template default, so compare against that
+    wanted = template_defaults(parse_template(template_body))
+    wanted.update({p["ParameterKey"]: p.get("ParameterValue") for p in parameters if not p.get("UsePreviousValue")})
+    kept = {p["ParameterKey"] for p in parameters if p.get("UsePreviousValue")}
+    if any(deployed.get(key) != wanted.get(key) for key in (deployed.keys() | wanted.keys()) - kept):
+        return False
+    body = cf_client.get_template(StackName=stack["StackId"], TemplateStage="Original")['TemplateBody']
+    if isinstance(body, dict):  # botocore parses JSON templates
+        try:
+            return body == json.loads(template_body)
+        except ValueError:
+            return False
+    return body == template_body
+
+def template_source(stack_name, template_body):
+    """Return TemplateBody, or TemplateURL after staging a template over the inline limit in S3"""
+    size = len(template_body.encode())
+    if size <= INLINE_TEMPLATE_LIMIT:
+        return {"TemplateBody": template_body}
+    if not TEMPLATE_BUCKET:
+        raise ValueError(f"Template for {stack_name} is {size} bytes; set CFN_TEMPLATE_BUCKET to stage it in S3")
+    key = f"{TEMPLATE_PREFIX}{stack_name}/{hashlib.sha256(template_body.encode()).hexdigest()}.template"
+    try:
+        s3_client.head_object(Bucket=TEMPLATE_BUCKET, Key=key)
+    except ClientError as e:
+        if error_code(e) not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        s3_client.put_object(Bucket=TEMPLATE_BUCKET, Key=key, Body=template_body.encode())
+        logging.info(f"Template for {stack_name} staged at s3://{TEMPLATE_BUCKET}/{key}")
+    return {"TemplateURL": f"https://{TEMPLATE_BUCKET}.s3.{REGION}.amazonaws.com/{key}"}
+
+def wait_for_change_set(change_set_id, timeout=STACK_TIMEOUT):
+    """Poll a change set until it is ready; return the final description, or None on timeout"""
+    delay = POLL_MIN
+    deadline = time.monotonic() + timeout
+    while True:
+        change_set = cf_client.describe_change_set(ChangeSetName=change_set_id)
+        if change_set['Status'] in ("CREATE_COMPLETE", "FAILED"):
+            return change_set
+        if time.monotonic() + delay > deadline:
+            logging.error(f"Timed out after {timeout}s waiting for change set {change_set_id} "
+                          f"(still {change_set['Status']})")
+            return None
+        time.sleep(delay)
+        delay = min(POLL_MAX, delay * POLL_BACKOFF)
+
+def log_change_set(stack_name, change_set):
+    """Log the preview of every resource the change set would touch"""
+    changes = change_set.get('Changes', [])
+    logging.info(f"Change set for {stack_name}: {len(changes)} resource changes")
+    for change in changes:
+        rc = change.get('ResourceChange', {})
+        replacement = f" (replacement: {rc['Replacement']})" if rc.get('Replacement') else ""
+        logging.info(f"  {rc.get('Action')} {rc.get('LogicalResourceId')} ({rc.get('ResourceType')}){replacement}")
+
+def deploy_with_change_set(stack_name, template_body, parameters, capabilities=CAPABILITIES):
+    """Create a stack, or update it through a previewed change set, skipping it if nothing changed.
+
+    A stack whose fingerprint and last-modified time match the local cache is
+    skipped after one DescribeStacks. Otherwise the deployed template and
+    parameters are compared; only a real difference creates a change set.
+    """
+    fingerprint = stack_fingerprint(template_body, parameters, capabilities)
+    stack = describe_stack(stack_name)
+    if stack:
+        cached = get_fingerprint(stack_name)
+        updated = str(stack.get('LastUpdatedTime') or stack['CreationTime'])
+        settled = stack['StackStatus'] in ("CREATE_COMPLETE", "UPDATE_COMPLETE")
+        if settled and cached and cached['fingerprint'] == fingerprint and cached['updated'] == updated:
+            logging.info(f"Stack {stack_name} unchanged (fingerprint), skipping")
+            return True
+        if settled and deployed_matches(stack, template_body, parameters):
+            logging.info(f"Stack {stack_name} unchanged (matches deployed template), skipping")
+            save_fingerprint(stack_name, fingerprint, stack)
+            return True
+
+    if stack is None:
+        # A new stack's change set would only list every resource as Add
+        if PREVIEW_ONLY:
+            logging.info(f"Preview only; stack {stack_name} would be created")
+            return True
+        response = cf_client.create_stack(StackName=stack_name, Parameters=parameters, Capabilities=capabilities,
+                                          **template_source(stack_name, template_body))
+        ok = wait_for_completion(response['StackId'], "create")
+        if ok:
+            save_fingerprint(stack_name, fingerprint, describe_stack(stack_name))
+        return ok
+
+    last_event_id = get_stack_position(stack_name)[1]
+    response = cf_client.create_change_set(
+        StackName=stack_name,
+        ChangeSetName=f"deploy-{fingerprint[:12]}-{int(time.time())}",
+        ChangeSetType="UPDATE",
+        Parameters=parameters,
+        Capabilities=capabilities,
+        **template_source(stack_name, template_body)
+    )
+    change_set = wait_for_change_set(response['Id'])
+    if change_set is None:
+        logging.error(f"Change set for {stack_name} was not ready; deleting it without executing")
+        try:
+            cf_client.delete_change_set(ChangeSetName=response['Id'])
+        except ClientError as e:
+            logging.warning(f"Could not delete change set {response['Id']}: {error_code(e)}")
+        return False
+    if change_set['Status'] == "FAILED":
+        reason = change_set.get('StatusReason', "")
+        if "didn't contain changes" in reason or "No updates are to be performed" in reason:
+            logging.info(f"Stack {stack_name} has no changes, skipping")
+            cf_client.delete_change_set(ChangeSetName=response['Id'])
+            save_fingerprint(stack_name, fingerprint, describe_stack(stack_name))
+            return True
+        logging.error(f"Change set for {stack_name} failed: {reason}")
+        return False
+
+    log_change_set(stack_name, change_set)
+    if PREVIEW_ONLY:
+        logging.info(f"Preview only; change set {change_set['ChangeSetName']} left for review")
+        return True
+    cf_client.execute_change_set(ChangeSetName=response['Id'])
+    ok = wait_for_completion(response['StackId'], "update", last_event_id)
+    if ok:
+        save_fingerprint(stack_name, fingerprint, describe_stack(stack_name))
+    return ok
+
+# ----- DRIFT SCAN -----
+def list_stack_names(statuses=DRIFT_STACK_STATUSES):
+    """Return the names of every stack in one of the given statuses"""
+    names = []
+    for page in cf_client.get_paginator('list_stacks').paginate(StackStatusFilter=statuses):
+        names.extend(summary['StackName'] for summary in page['StackSummaries'])
+    return names
+
+def start_drift_detection(stack_name):
+    """Start drift detection; return the detection ID or None"""
+    try:
+        return cf_client.detect_stack_drift(StackName=stack_name)['StackDriftDetectionId']
+    except ClientError as e:
+        logging.error(f"Cannot start drift detection for {stack_name}: {e}")
+        return None
+
+def get_resource_drifts(stack_name):
+    """Return the stack's modified and deleted resources with their property differences"""
+    drifts = []
+    paginator = cf_client.get_paginator('describe_stack_resource_drifts')
+    for page in paginator.paginate(StackName=stack_name, StackResourceDriftStatusFilters=["MODIFIED", "DELETED"]):
+        for drift in page['StackResourceDrifts']:
+            drifts.append({
+                "logical_id": drift['LogicalResourceId'],
+                "physical_id": drift.get('PhysicalResourceId'),
+                "type": drift['ResourceType'],
+                "status": drift['StackResourceDriftStatus'],
+                "differences": [{"path": d['PropertyPath'], "type": d['DifferenceType'],
+                                 "expected": d.get('ExpectedValue'), "actual": d.get('ActualValue')}
+                                for d in drift.get('PropertyDifferences', [])],
+            })
+    return drifts
+
+def get_detection_status(detection_id):
+    """Return (status, None) for a drift detection, or (None, error message) if the poll failed"""
+    try:
+        return cf_client.describe_stack_drift_detection_status(StackDriftDetectionId=detection_id), None
+    except ClientError as e:
+        return None, str(e)
+
+def _finish_detection(stack_name, status):
+    entry = {"stack": stack_name, "status": status.get('StackDriftStatus', "UNKNOWN"),
+             "detection_status": status['DetectionStatus'],
+             "drifted_resources": status.get('DriftedStackResourceCount', 0), "resources": []}
+    if status['DetectionStatus'] == "DETECTION_FAILED":
+        entry["reason"] = status.get('DetectionStatusReason')
+    if entry["status"] == "DRIFTED":
+        try:
+            entry["resources"] = get_resource_drifts(stack_name)
+        except ClientError as e:
+            # The stack is known to have drifted; only the per-resource detail is missing
+            logging.error(f"{stack_name}: DRIFTED, but its resource drifts could not be read: {e}")
+            entry["reason"] = f"resource drifts unavailable: {e}"
+        for resource in entry["resources"]:
+            paths = ", ".join(d["path"] for d in resource["differences"]) or resource["status"]
+            logging.warning(f"{stack_name}: {resource['logical_id']} ({resource['type']}) {resource['status']}: {paths}")
+    else:
+        logging.info(f"{stack_name}: {entry['status']}")
+    return entry
+
+def drift_scan(stack_names=None, max_workers=DRIFT_WORKERS, timeout=STACK_TIMEOUT, report_file=DRIFT_REPORT_FILE):
+    """Detect drift on many stacks at once and write one report; return it.
+
+    All detections are started up front. One loop then polls every pending
+    detection per round, fetching resource drifts as each one completes, and
+    backs off only while nothing finishes.
+    """
+    start = time.monotonic()
+    stack_names = stack_names if stack_names is not None else list_stack_names()
+    logging.info(f"Starting drift detection on {len(stack_names)} stacks...")
+    entries = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for stack_name, detection_id in zip(stack_names, pool.map(start_drift_detection, stack_names)):
+            if detection_id:
+                pending[detection_id] = stack_name
+            else:
+                entries.append({"stack": stack_name, "status": "UNKNOWN", "detection_status": "NOT_STARTED",
+                                "drifted_resources": 0, "resources": []})
+
+        delay = POLL_MIN
+        deadline = start + timeout
+        poll_errors = {}  # detection ID -> last failed poll; the stack stays pending and is polled again
+        while pending:
+            ids = list(pending)
+            finished = {}
+            for i, (status, error) in zip(ids, pool.map(get_detection_status, ids)):
+                if error:
+                    logging.warning(f"{pending[i]}: drift status poll failed, retrying next round: {error}")
+                    poll_errors[i] = error
+                elif status['DetectionStatus'] != "DETECTION_IN_PROGRESS":
+                    finished[i] = status
+            futures = [pool.submit(_finish_detection, pending.pop(i), status) for i, status in finished.items()]
+            entries.extend(future.result() for future in futures)
+            if not pending:
+                break
+            delay = POLL_MIN if finished else min(POLL_MAX, delay * POLL_BACKOFF)
+            if time.monotonic() + delay > deadline:
+                logging.error(f"Drift detection still running on {len(pending)} stacks after {timeout}s")
+                for i, name in pending.items():
+                    entry = {"stack": name, "status": "UNKNOWN", "detection_status": "TIMED_OUT",
+                             "drifted_resources": 0, "resources": []}
+                    if i in poll_errors:
+                        entry["reason"] = f"last status poll failed: {poll_errors[i]}"
+                    entries.append(entry)
+                break
+            logging.info(f"Drift detection: {len(entries)}/{len(stack_names)} stacks done")
+            time.sleep(delay)
+
+    counts = {}
+    for entry in entries:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    report = {"region": REGION, "seconds": round(time.monotonic() - start, 1), "summary": counts,
+              "stacks": sorted(entries, key=lambda e: (e["status"] != "DRIFTED", e["stack"]))}
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    logging.info(f"Drift scan of {len(entries)} stacks in {report['seconds']}s: "
+                 + ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+                 + f"; report written to {report_file}")
+    return report
+
+# ----- MULTI-STACK DEPLOY -----
+def parse_template(template_body):
+    """Parse a JSON or YAML template, turning short-form tags like !ImportValue into Fn:: dicts"""
+    if template_body.lstrip().startswith("{"):
+        return json.loads(template_body)
+    import yaml  # Only needed for YAML templates
+
+    class CfnLoader(yaml.SafeLoader):
+        pass
+
+    def construct_tag(loader, tag_suffix, node):
+        if isinstance(node, yaml.ScalarNode):
+            value = loader.construct_scalar(node)
+        elif isinstance(node, yaml.SequenceNode):
+            value = loader.construct_sequence(node, deep=True)
+        else:
+            value = loader.construct_mapping(node, deep=True)
+        if tag_suffix == "Ref":
+            return {"Ref": value}
+        if tag_suffix == "GetAtt" and isinstance(value, str):
+            value = value.split(".", 1)
+        return {f"Fn::{tag_suffix}": value}
+
+    CfnLoader.add_multi_constructor("!", construct_tag)
+    return yaml.load(template_body, Loader=CfnLoader) or {}
+
+def template_defaults(template):
+    """Return {parameter: default} as CloudFormation reports it, for parameters that have one"""
+    defaults = {}
+    for name, p in (template.get("Parameters") or {}).items():
+        if "Default" in p:
+            value = p["Default"]
+            if isinstance(value, bool):  # YAML true/false
+                value = str(value).lower()
+            elif isinstance(value, list):
+                value = ",".join(str(v) for v in value)
+            defaults[name] = str(value)
+    return defaults
+
+def get_account_id():
+    """Return this account's ID (memoized), or None if it cannot be looked up"""
+    global _account_id
+    if _account_id is None:
+        try:
+            _account_id = sts_client.get_caller_identity()["Account"]
+        except ClientError as e:
+            logging.warning(f"Cannot look up the account ID: {e}")
+    return _account_id
+
+def pseudo_parameter(name, stack_name):
+    """Return a pseudo parameter known before deployment, or None"""
+    partition = "aws-cn" if REGION.startswith("cn-") else "aws-us-gov" if REGION.startswith("us-gov-") else "aws"
+    if name == "AWS::StackName":
+        return stack_name
+    if name == "AWS::Region":
+        return REGION
+    if name == "AWS::Partition":
+        return partition
+    if name == "AWS::URLSuffix":
+        return "amazonaws.com.cn" if partition == "aws-cn" else "amazonaws.com"
+    if name == "AWS::AccountId":
+        return get_account_id()
+    return None
+
+def resolve_name(value, stack_name, parameters):
+    """Resolve a literal export/import name expression; return None if it depends on runtime values"""
+    if isinstance(value, str):
+        return value
+    if not isinstance(value, dict) or len(value) != 1:
+        return None
+    fn, arg = next(iter(value.items()))
+    if fn == "Ref":
+        return pseudo_parameter(arg, stack_name) if arg.startswith("AWS::") else parameters.get(arg)
+    if fn == "Fn::Sub":
+        text, variables = (arg, {}) if isinstance(arg, str) else (arg[0], arg[1])
+        names = dict(parameters)
+        for key, expr in variables.items():
+            names[key] = resolve_name(expr, stack_name, parameters)
+        missing = False
+
+        def substitute(match):
+            nonlocal missing
+            name = match.group(1)
+            resolved = pseudo_parameter(name, stack_name) if name.startswith("AWS::") else names.get(name)
+            missing = missing or resolved is None
+            return str(resolved)
+        result = re.sub(r"\$\{([^}!]+)\}", substitute, text)
+        return None if missing else result
+    if fn == "Fn::Join":
+        parts = [resolve_name(part, stack_name, parameters) for part in arg[1]]
+        return None if None in parts else arg[0].join(parts)
+    return None
+
+def _find_imports(node, found):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "Fn::ImportValue":
+                found.append(value)
+            else:
+                _find_imports(value, found)
+    elif isinstance(node, list):
+        for item in node:
+            _find_imports(item, found)
+    return found
+
+def template_exports_imports(template, stack_name, parameters):
+    """Return (export names, import names) of a parsed template; unresolvable names are skipped"""
+    parameters = {**template_defaults(template), **parameters}
+    exports, imports = set(), set()
+    for output in (template.get("Outputs") or {}).values():
+        if "Export" in output:
+            name = resolve_name(output["Export"].get("Name"), stack_name, parameters)
+            if name is None:
+                logging.warning(f"{stack_name}: cannot resolve export name {output['Export'].get('Name')}")
+            else:
+                exports.add(name)
+    for expr in _find_imports(template.get("Resources") or {}, []) + _find_imports(template.get("Outputs") or {}, []):
+        name = resolve_name(expr, stack_name, parameters)
+        if name is None:
+            logging.warning(f"{stack_name}: cannot resolve import {expr}; use depends_on")
+        else:
+            imports.add(name)
+    return exports, imports
+
+def load_stacks_manifest(path):
+    """Read a manifest of stacks: [{name, template, parameters, depends_on}]"""
+    with open(path) as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+        else:
+            import yaml  # Only needed for YAML manifests
+            data = yaml.safe_load(f) or {}
+    base = os.path.dirname(os.path.abspath(path))
+    stacks = []
+    for entry in data.get("stacks") or []:
+        stacks.append({
+            "name": entry["name"],
+            "template": os.path.join(base, entry["template"]),
+            "parameters": {k: str(v) for k, v in (entry.get("parameters") or {}).items()},
+            "depends_on": list(entry.get("depends_on") or []),
+        })
+    return stacks
+
+def build_stack_graph(stacks):
+    """Return {stack name: set of stack names it depends on} from export/import references"""
+    exporters, imports = {}, {}
+    for stack in stacks:
+        template = parse_template(load_template(stack["template"]))
+        stack_exports, stack_imports = template_exports_imports(template, stack["name"], stack["parameters"])
+        for name in stack_exports:
+            if name in exporters:
+                raise ValueError(f"Export {name} is defined by both {exporters[name]} and {stack['name']}")
+            exporters[name] = stack["name"]
+        imports[stack["name"]] = stack_imports
+
+    names = {stack["name"] for stack in stacks}
+    graph = {}
+    for stack in stacks:
+        deps = set(stack["depends_on"])
+        for name in imports[stack["name"]]:
+            if name in exporters:
+                deps.add(exporters[name])
+            else:
+                # Exported by a stack outside the manifest, which must already exist
+                logging.info(f"{stack['name']}: import {name} is not exported by any stack in the manifest")
+        unknown = deps - names
+        if unknown:
+            raise ValueError(f"{stack['name']} depends on stacks not in the manifest: {sorted(unknown)}")
+        graph[stack["name"]] = deps - {stack["name"]}
+
+    # Kahn's algorithm, only to reject cycles before anything is deployed
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependency cycle between stacks: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return graph
+
+def deploy_stack(stack):
+    """Create or update one manifest stack; return True on success"""
+    template_body = load_template(stack["template"])
+    parameters = [{"ParameterKey": k, "ParameterValue": v} for k, v in stack["parameters"].items()]
+    return deploy_with_change_set(stack["name"], template_body, parameters)
+
+def deploy_stacks(stacks, max_workers=MAX_STACK_WORKERS):
+    """Deploy stacks concurrently in dependency order; return {stack name: outcome}.
+
+    A stack starts as soon as every stack it imports from has succeeded. When
+    one fails, everything that depends on it, directly or not, is cancelled.
+    """
+    start = time.monotonic()
+    graph = build_stack_graph(stacks)
+    by_name = {stack["name"]: stack for stack in stacks}
+    dependents = {name: set() for name in graph}
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents[dep].add(name)
+
+    results, timings = {}, {}
+    waiting = {name: set(deps) for name, deps in graph.items()}
+    running = {}
+
+    def cancel(name):
+        for child in dependents[name]:
+            if child not in results:
+                results[child] = "cancelled"
+                waiting.pop(child, None)
+                logging.warning(f"Stack {child} cancelled: depends on failed stack {name}")
+                cancel(child)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            for name in [n for n, deps in waiting.items() if not deps]:
+                del waiting[name]
+                timings[name] = time.monotonic()
+                running[pool.submit(deploy_stack, by_name[name])] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                timings[name] = round(time.monotonic() - timings[name], 1)
+                try:
+                    ok = future.result()
+                except Exception as e:
+                    # Template parse, parameter validation and connection errors
+                    # fail this stack only, never the whole deployment
+                    logging.error(f"Stack {name} failed: {type(e).__name__}: {e}")
+                    ok = False
+                results[name] = "ok" if ok else "failed"
+                if ok:
+                    for child in dependents[name]:
+                        if child in waiting:
+                            waiting[child].discard(name)
+                else:
+                    cancel(name)
+
+    counts = {}
+    for outcome in results.values():
+        counts[outcome] = counts.get(outcome, 0) + 1
+    logging.info(f"Deployed {len(results)} stacks in {time.monotonic() - start:.0f}s: "
+                 + ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items())))
+    for name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+        logging.info(f"  {name}: {results[name]} in {seconds}s")
+    return results
 
 # ================= MAIN =================
 def main():
-    template_body = load_template(TEMPLATE_FILE)
+    if DRIFT_SCAN:
+        drift_scan()
+        return
 
-    if stack_exists(STACK_NAME):
-        logging.info(f"Stack {STACK_NAME} already exists. Updating...")
-        update_stack(STACK_NAME, template_body, PARAMETERS)
-    else:
-        create_stack(STACK_NAME, template_body, PARAMETERS)
+    if STACKS_MANIFEST:
+        try:
+            stacks = load_stacks_manifest(STACKS_MANIFEST)
+            deploy_stacks(stacks)
+        except Exception as e:
+            # A manifest or template that doesn't parse stops before anything is deployed
+            logging.error(f"Failed to deploy stacks from {STACKS_MANIFEST}: {type(e).__name__}: {e}")
+        return
+
+    # Unchanged stacks are skipped; changes go through a previewed change set
+    try:
+        template_body = load_template(TEMPLATE_FILE)
+        deploy_with_change_set(STACK_NAME, template_body, PARAMETERS)
+    except Exception as e:
+        logging.error(f"Failed to deploy stack {STACK_NAME}: {type(e).__name__}: {e}")
 
     # Uncomment to delete stack
     # delete_stack(STACK_NAME)
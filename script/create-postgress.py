@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+from aws_retry import error_code
 from botocore.exceptions import ClientError
+from rds_tuning import ensure_parameter_group, postgres_parameters, storage_settings
+from step_dag import Journal, Step, StepFailed, run_steps
 import logging
 import time
 import os
@@ -14,12 +17,22 @@ DB_USERNAME = "adminuser"
 DB_PASSWORD = os.environ.get("DB_PASSWORD")  # Set via environment (do NOT commit secrets)
 DB_INSTANCE_CLASS = "db.t3.micro"   # Free tier eligible
 DB_ENGINE = "postgres"
+DB_ENGINE_VERSION = "16"            # Major version; RDS picks the default minor
+DB_PARAMETER_FAMILY = "postgres16"  # Must match DB_ENGINE_VERSION
+DB_WORKLOAD = os.environ.get("PG_WORKLOAD", "mixed")  # oltp, analytics or mixed; sizes the parameters
+DB_ALLOCATED_STORAGE = 20           # GiB of gp3; IOPS/throughput are set from 400 GiB
 DB_PORT = 5432
 
 VPC_CIDR = "10.0.0.0/16"
-SUBNET_CIDR = "10.0.1.0/24"
+SUBNET_CIDRS = ["10.0.1.0/24", "10.0.2.0/24"]  # One per AZ; RDS subnet groups need two AZs
 SECURITY_GROUP_NAME = "RDS-SG"
 SECURITY_GROUP_DESC = "Allow PostgreSQL access"
+SUBNET_GROUP_NAME = "rds-subnet-group"
+
+# Journal of finished steps and the resources they created; reruns resume from it.
+# {region} is filled in by main(), after region_fanout may have rebound REGION
+STATE_FILE = os.environ.get("PG_STATE_FILE", f"/tmp/{DB_IDENTIFIER}-{{region}}-state.json")
+FRESH_START = os.environ.get("PG_FRESH") == "1"  # Ignore the journal and create everything anew
 
 # ================= LOGGING =================
 logging.basicConfig(
@@ -28,42 +41,69 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENTS =================
-ec2_client = boto3.client("ec2", region_name=REGION)
-ec2_resource = boto3.resource("ec2", region_name=REGION)
-rds_client = boto3.client("rds", region_name=REGION)
+ec2_client = aws_clients.client("ec2", region_name=REGION)
+rds_client = aws_clients.client("rds", region_name=REGION)
 
 # ================= FUNCTIONS =================
 def create_vpc():
     logging.info("Creating VPC...")
-    vpc = ec2_resource.create_vpc(CidrBlock=VPC_CIDR)
-    vpc.wait_until_available()
-    vpc.create_tags(Tags=[{"Key": "Name", "Value": "RDSVPC"}])
-    logging.info(f"VPC created: {vpc.id}")
+    vpc_id = ec2_client.create_vpc(CidrBlock=VPC_CIDR)['Vpc']['VpcId']
+    ec2_client.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
+    ec2_client.create_tags(Resources=[vpc_id], Tags=[{"Key": "Name", "Value": "RDSVPC"}])
+    logging.info(f"VPC created: {vpc_id}")
+    return vpc_id
+
+def enable_dns_hostnames(vpc_id):
+    ec2_client.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+
+def get_availability_zones():
+    zones = ec2_client.describe_availability_zones(Filters=[{"Name": "state", "Values": ["available"]}])
+    names = sorted(zone['ZoneName'] for zone in zones['AvailabilityZones'])
+    if len(names) < len(SUBNET_CIDRS):
+        raise RuntimeError(f"{REGION} has {len(names)} available AZs, {len(SUBNET_CIDRS)} are needed")
+    return names[:len(SUBNET_CIDRS)]
+
+def create_subnet(vpc_id, zones, index):
+    subnet_id = ec2_client.create_subnet(VpcId=vpc_id, CidrBlock=SUBNET_CIDRS[index],
+                                         AvailabilityZone=zones[index])['Subnet']['SubnetId']
+    logging.info(f"Subnet created: {subnet_id} in {zones[index]}")
+    return subnet_id
 
-    # Enable DNS hostnames
-    ec2_client.modify_vpc_attribute(VpcId=vpc.id, EnableDnsHostnames={'Value': True})
+# Internet Gateway and route table (for public access)
+def create_internet_gateway():
+    return ec2_client.create_internet_gateway()['InternetGateway']['InternetGatewayId']
 
-    # Subnet
-    subnet = vpc.create_subnet(CidrBlock=SUBNET_CIDR)
-    logging.info(f"Subnet created: {subnet.id}")
+def attach_internet_gateway(vpc_id, igw_id):
+    ec2_client.attach_internet_gateway(VpcId=vpc_id, InternetGatewayId=igw_id)
+    return True
 
-    # Internet Gateway and route table (for public access)
-    igw = ec2_resource.create_internet_gateway()
-    vpc.attach_internet_gateway(InternetGatewayId=igw.id)
-    route_table = vpc.create_route_table()
-    route_table.create_route(DestinationCidrBlock="0.0.0.0/0", GatewayId=igw.id)
-    route_table.associate_with_subnet(SubnetId=subnet.id)
+def create_route_table(vpc_id):
+    return ec2_client.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
 
-    return vpc, subnet
+def create_default_route(route_table_id, igw_id, igw_attached):
+    ec2_client.create_route(RouteTableId=route_table_id, DestinationCidrBlock="0.0.0.0/0", GatewayId=igw_id)
+
+def associate_route_table(route_table_id, subnet_id):
+    ec2_client.associate_route_table(RouteTableId=route_table_id, SubnetId=subnet_id)
 
 def create_security_group(vpc_id):
     logging.info("Creating Security Group...")
-    sg = ec2_client.create_security_group(
-        GroupName=SECURITY_GROUP_NAME,
-        Description=SECURITY_GROUP_DESC,
-        VpcId=vpc_id
-    )
-    sg_id = sg['GroupId']
+    try:
+        sg = ec2_client.create_security_group(
+            GroupName=SECURITY_GROUP_NAME,
+            Description=SECURITY_GROUP_DESC,
+            VpcId=vpc_id
+        )
+        sg_id = sg['GroupId']
+    except ClientError as e:
+        if error_code(e) != "InvalidGroup.Duplicate":
+            raise
+        # Left behind by an interrupted run; reuse it
+        groups = ec2_client.describe_security_groups(Filters=[
+            {"Name": "vpc-id", "Values": [vpc_id]}, {"Name": "group-name", "Values": [SECURITY_GROUP_NAME]}])
+        sg_id = groups['SecurityGroups'][0]['GroupId']
+        if any(p.get('FromPort') == DB_PORT for p in groups['SecurityGroups'][0].get('IpPermissions', [])):
+            return sg_id
 
     # Open PostgreSQL port
     ec2_client.authorize_security_group_ingress(
@@ -78,57 +118,180 @@ def create_security_group(vpc_id):
     logging.info(f"Security group {sg_id} allows port {DB_PORT}")
     return sg_id
 
-def create_db_subnet_group(subnet_id):
-    subnet_group_name = "rds-subnet-group"
-    logging.info(f"Creating DB Subnet Group {subnet_group_name}...")
+def create_db_subnet_group(subnet_ids):
+    logging.info(f"Creating DB Subnet Group {SUBNET_GROUP_NAME}...")
     try:
         rds_client.create_db_subnet_group(
-            DBSubnetGroupName=subnet_group_name,
+            DBSubnetGroupName=SUBNET_GROUP_NAME,
             DBSubnetGroupDescription="Subnet group for PostgreSQL RDS",
-            SubnetIds=[subnet_id]
+            SubnetIds=subnet_ids
         )
     except ClientError as e:
+        if error_code(e) == "DBSubnetGroupAlreadyExists":
+            rds_client.modify_db_subnet_group(DBSubnetGroupName=SUBNET_GROUP_NAME, SubnetIds=subnet_ids)
+            return SUBNET_GROUP_NAME
         logging.error(f"Could not create DB Subnet Group: {e}")
         return None
-    return subnet_group_name
+    return SUBNET_GROUP_NAME
+
+def tuned_group_name():
+    """Named after what it is tuned for, so changing the class or workload makes a new group.
+
+    Built from the current settings, which region_fanout or a benchmark may set after import.
+    """
+    instance_class = DB_INSTANCE_CLASS[3:] if DB_INSTANCE_CLASS.startswith("db.") else DB_INSTANCE_CLASS
+    return f"{DB_IDENTIFIER}-{instance_class.replace('.', '-')}-{DB_WORKLOAD}"
 
-def create_postgres_rds(sg_id, subnet_group_name):
+def create_parameter_group():
+    """Parameter group tuned to DB_INSTANCE_CLASS and DB_WORKLOAD"""
+    parameters = postgres_parameters(DB_INSTANCE_CLASS, DB_WORKLOAD, DB_ALLOCATED_STORAGE)
+    logging.info(f"Tuning for {DB_INSTANCE_CLASS} ({DB_WORKLOAD}): shared_buffers={parameters['shared_buffers']} pages, "
+                 f"max_connections={parameters['max_connections']}, work_mem={parameters['work_mem']}kB")
+    return ensure_parameter_group(rds_client, tuned_group_name(), DB_PARAMETER_FAMILY, parameters,
+                                  f"{DB_WORKLOAD} tuning for {DB_INSTANCE_CLASS}")
+
+def create_postgres_rds(sg_id, subnet_group_name, parameter_group_name, igw_attached):
+    """Start creating the instance; an instance left by an earlier run is reused.
+
+    A publicly accessible instance needs the VPC's internet gateway attached first.
+    """
     logging.info(f"Creating PostgreSQL RDS instance {DB_IDENTIFIER}...")
     try:
-        response = rds_client.create_db_instance(
+        rds_client.create_db_instance(
             DBName=DB_NAME,
             DBInstanceIdentifier=DB_IDENTIFIER,
-            AllocatedStorage=20,  # GB
             DBInstanceClass=DB_INSTANCE_CLASS,
             Engine=DB_ENGINE,
+            EngineVersion=DB_ENGINE_VERSION,
+            DBParameterGroupName=parameter_group_name,
             MasterUsername=DB_USERNAME,
             MasterUserPassword=DB_PASSWORD,
             VpcSecurityGroupIds=[sg_id],
             DBSubnetGroupName=subnet_group_name,
             PubliclyAccessible=True,
             Port=DB_PORT,
-            MultiAZ=False
+            MultiAZ=False,
+            **storage_settings(DB_ALLOCATED_STORAGE, DB_WORKLOAD)
         )
-        logging.info("RDS creation initiated. Waiting until available...")
-        waiter = rds_client.get_waiter('db_instance_available')
-        waiter.wait(DBInstanceIdentifier=DB_IDENTIFIER)
-        db_instance = rds_client.describe_db_instances(DBInstanceIdentifier=DB_IDENTIFIER)['DBInstances'][0]
-        endpoint = db_instance['Endpoint']['Address']
-        logging.info(f"PostgreSQL RDS is available at {endpoint}:{DB_PORT}")
-        return endpoint
+        logging.info("RDS creation initiated")
+    except ClientError as e:
+        if error_code(e) != "DBInstanceAlreadyExists":
+            logging.error(f"Error creating RDS instance: {e}")
+            return None
+        logging.info(f"RDS instance {DB_IDENTIFIER} already exists, waiting for it instead")
+        use_parameter_group(parameter_group_name)
+    return DB_IDENTIFIER
+
+def use_parameter_group(parameter_group_name):
+    """Switch an existing instance to the parameter group if it uses another one"""
+    db_instance = rds_client.describe_db_instances(DBInstanceIdentifier=DB_IDENTIFIER)['DBInstances'][0]
+    current = [group['DBParameterGroupName'] for group in db_instance.get('DBParameterGroups', [])]
+    if parameter_group_name in current:
+        return
+    rds_client.modify_db_instance(DBInstanceIdentifier=DB_IDENTIFIER, DBParameterGroupName=parameter_group_name,
+                                  ApplyImmediately=True)
+    logging.warning(f"{DB_IDENTIFIER} switched from {', '.join(current)} to {parameter_group_name}; "
+                    f"static parameters such as shared_buffers apply after a reboot")
+
+def wait_for_postgres_rds(db_identifier):
+    logging.info(f"Waiting until {db_identifier} is available...")
+    try:
+        rds_client.get_waiter('db_instance_available').wait(DBInstanceIdentifier=db_identifier)
+        db_instance = rds_client.describe_db_instances(DBInstanceIdentifier=db_identifier)['DBInstances'][0]
     except ClientError as e:
-        logging.error(f"Error creating RDS instance: {e}")
+        logging.error(f"Error waiting for RDS instance: {e}")
         return None
+    endpoint = db_instance['Endpoint']['Address']
+    logging.info(f"PostgreSQL RDS is available at {endpoint}:{DB_PORT}")
+    return endpoint
+
+# ----- RESUME CHECKS -----
+# Each returns True if what a journaled step created still exists
+def _exists(call, **kwargs):
+    try:
+        return call(**kwargs)
+    except ClientError as e:
+        if "NotFound" in error_code(e):
+            return None
+        raise
+
+def vpc_exists(vpc_id, **_):
+    return bool(_exists(ec2_client.describe_vpcs, VpcIds=[vpc_id]))
+
+def subnet_exists(subnet_id=None, subnet_b_id=None, **_):
+    return bool(_exists(ec2_client.describe_subnets, SubnetIds=[subnet_id or subnet_b_id]))
+
+def igw_exists(igw_id, vpc_id=None, **_):
+    found = _exists(ec2_client.describe_internet_gateways, InternetGatewayIds=[igw_id])
+    if not found:
+        return False
+    if vpc_id is None:
+        return True
+    # Attachment check for attach_internet_gateway
+    return any(a['VpcId'] == vpc_id for a in found['InternetGateways'][0].get('Attachments', []))
+
+def route_table_exists(route_table_id, **_):
+    return bool(_exists(ec2_client.describe_route_tables, RouteTableIds=[route_table_id]))
+
+def security_group_exists(sg_id, **_):
+    return bool(_exists(ec2_client.describe_security_groups, GroupIds=[sg_id]))
+
+def parameter_group_exists(parameter_group_name, **_):
+    # A journaled group for another class or workload is stale, not reusable
+    if parameter_group_name != tuned_group_name():
+        return False
+    return bool(_exists(rds_client.describe_db_parameter_groups, DBParameterGroupName=parameter_group_name))
+
+def subnet_group_exists(subnet_group_name, **_):
+    return bool(_exists(rds_client.describe_db_subnet_groups, DBSubnetGroupName=subnet_group_name))
+
+def db_instance_exists(db_identifier, **_):
+    found = _exists(rds_client.describe_db_instances, DBInstanceIdentifier=db_identifier)
+    return bool(found) and found['DBInstances'][0]['DBInstanceStatus'] not in ("deleting", "failed")
+
+def db_instance_available(db_identifier, **_):
+    found = _exists(rds_client.describe_db_instances, DBInstanceIdentifier=db_identifier)
+    return bool(found) and found['DBInstances'][0]['DBInstanceStatus'] == "available"
+
+# Independent steps run concurrently, e.g. the IGW is created while the subnets are
+# and the security group does not wait for routing
+STEPS = [
+    Step("vpc", create_vpc, outputs=["vpc_id"], verify=vpc_exists),
+    Step("availability_zones", get_availability_zones, outputs=["zones"]),
+    Step("dns_hostnames", enable_dns_hostnames, inputs=["vpc_id"]),
+    Step("subnet_a", lambda vpc_id, zones: create_subnet(vpc_id, zones, 0),
+         inputs=["vpc_id", "zones"], outputs=["subnet_id"], verify=subnet_exists),
+    Step("subnet_b", lambda vpc_id, zones: create_subnet(vpc_id, zones, 1),
+         inputs=["vpc_id", "zones"], outputs=["subnet_b_id"], verify=subnet_exists),
+    Step("internet_gateway", create_internet_gateway, outputs=["igw_id"], verify=igw_exists),
+    Step("attach_internet_gateway", attach_internet_gateway, inputs=["vpc_id", "igw_id"], outputs=["igw_attached"],
+         verify=igw_exists),
+    Step("route_table", create_route_table, inputs=["vpc_id"], outputs=["route_table_id"], verify=route_table_exists),
+    Step("default_route", create_default_route, inputs=["route_table_id", "igw_id", "igw_attached"]),
+    Step("route_table_association", associate_route_table, inputs=["route_table_id", "subnet_id"]),
+    Step("route_table_association_b", lambda route_table_id, subnet_b_id: associate_route_table(route_table_id, subnet_b_id),
+         inputs=["route_table_id", "subnet_b_id"]),
+    Step("security_group", create_security_group, inputs=["vpc_id"], outputs=["sg_id"], verify=security_group_exists),
+    Step("db_subnet_group", lambda subnet_id, subnet_b_id: create_db_subnet_group([subnet_id, subnet_b_id]),
+         inputs=["subnet_id", "subnet_b_id"], outputs=["subnet_group_name"], verify=subnet_group_exists),
+    Step("parameter_group", create_parameter_group, outputs=["parameter_group_name"], verify=parameter_group_exists),
+    Step("rds", create_postgres_rds, inputs=["sg_id", "subnet_group_name", "parameter_group_name", "igw_attached"],
+         outputs=["db_identifier"],
+         verify=db_instance_exists),
+    Step("rds_available", wait_for_postgres_rds, inputs=["db_identifier"], outputs=["endpoint"],
+         verify=db_instance_available),
+]
 
 # ================= MAIN =================
 def main():
-    vpc, subnet = create_vpc()
-    sg_id = create_security_group(vpc.id)
-    subnet_group_name = create_db_subnet_group(subnet.id)
-    if subnet_group_name:
-        endpoint = create_postgres_rds(sg_id, subnet_group_name)
-        if endpoint:
-            logging.info(f"Connect to PostgreSQL using: psql -h {endpoint} -U {DB_USERNAME} -d {DB_NAME}")
+    state_file = STATE_FILE.format(region=REGION)
+    journal = Journal(state_file, fresh=FRESH_START)
+    try:
+        context = run_steps(STEPS, journal=journal)
+    except StepFailed as e:
+        logging.error(f"PostgreSQL provisioning stopped: {e}. Rerun to resume from {state_file}")
+        return
+    logging.info(f"Connect to PostgreSQL using: psql -h {context['endpoint']} -U {DB_USERNAME} -d {DB_NAME}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
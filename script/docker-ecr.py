@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
 import subprocess
 import docker
 import os
@@ -16,7 +16,7 @@ IMAGE_NAME = "my-app"  # Name of the Docker image
 DOCKER_CONTEXT = "./"  # Path to the build context for the Docker image
 
 # ================= AWS CLIENTS =================
-ecr_client = boto3.client("ecr", region_name=REGION)
+ecr_client = aws_clients.client("ecr", region_name=REGION)
 docker_client = docker.from_env()
 
 # ================= FUNCTIONS =================
@@ -10,9 +10,13 @@
 
 
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+import aws_retry
+from aws_retry import error_code
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
+import threading
 import time
 
 # ================= CONFIG =================
@@ -23,6 +27,11 @@ POLICIES = [
     "arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess",
     "arn:aws:iam::aws:policy/AmazonEC2ReadOnlyAccess"
 ]
+# Instances in these states are swept; terminated instances have no VPC
+INSTANCE_STATES = ["pending", "running", "stopping", "stopped"]
+PAGE_SIZE = 1000  # DescribeInstances MaxResults per page
+MAX_VPC_WORKERS = 4   # VPCs reconciled in parallel
+MAX_WORKERS = 16      # Instance updates in flight across all VPCs (1 = sequential sweep)
 LOG_FILE = "/tmp/full_security_automation.log"
 
 # ================= LOGGING =================
@@ -33,9 +42,16 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENTS =================
-ec2_client = boto3.client("ec2", region_name=REGION)
-iam_client = boto3.client("iam", region_name=REGION)
-ec2_resource = boto3.resource("ec2", region_name=REGION)
+ec2_client = aws_clients.client("ec2", region_name=REGION)
+iam_client = aws_clients.client("iam", region_name=REGION)
+
+# ================= ROLE CACHE =================
+# Filled once per run so shared roles are described and attached only once
+_profile_roles = {}   # instance profile ARN -> role names in the profile
+_role_policies = {}   # role name -> set of attached managed policy ARNs
+_role_attempts = {}   # role name -> policy ARNs already tried this run, attached or not
+_key_locks = {}
+_cache_lock = threading.Lock()
 
 # ================= FUNCTIONS =================
 
@@ -50,7 +66,7 @@ def create_security_group(vpc_id):
         sg_id = response['GroupId']
         logging.info(f"Created Security Group {sg_id} in VPC {vpc_id}")
     except ClientError as e:
-        if "InvalidGroup.Duplicate" in str(e):
+        if error_code(e) == "InvalidGroup.Duplicate":
             logging.info(f"Security Group {SECURITY_GROUP_NAME} already exists in VPC {vpc_id}")
             response = ec2_client.describe_security_groups(
                 Filters=[{"Name": "group-name", "Values": [SECURITY_GROUP_NAME]},
@@ -71,7 +87,7 @@ def create_security_group(vpc_id):
             ]
         )
     except ClientError as e:
-        if "InvalidPermission.Duplicate" in str(e):
+        if error_code(e) == "InvalidPermission.Duplicate":
             logging.info("Ingress rules already exist")
         else:
             logging.error(f"Error adding ingress rules: {e}")
@@ -83,70 +99,197 @@ def create_security_group(vpc_id):
             IpPermissions=[{'IpProtocol': '-1', 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]
         )
     except ClientError as e:
-        if "InvalidPermission.Duplicate" in str(e):
+        if error_code(e) == "InvalidPermission.Duplicate":
             logging.info("Egress rules already exist")
         else:
             logging.error(f"Error adding egress rules: {e}")
 
     return sg_id
 
-def attach_sg_to_instance(instance_id, sg_id):
-    """Attach security group to an EC2 instance"""
-    instance = ec2_resource.Instance(instance_id)
-    current_sgs = [sg['GroupId'] for sg in instance.security_groups]
+def attach_sg_to_instance(instance, sg_id):
+    """Attach security group to an EC2 instance from the inventory"""
+    instance_id = instance['InstanceId']
+    current_sgs = instance['SecurityGroups']
     if sg_id not in current_sgs:
         new_sgs = current_sgs + [sg_id]
-        instance.modify_attribute(Groups=new_sgs)
+        ec2_client.modify_instance_attribute(InstanceId=instance_id, Groups=new_sgs)
+        instance['SecurityGroups'] = new_sgs
         logging.info(f"Attached SG {sg_id} to instance {instance_id}")
-    else:
-        logging.info(f"Instance {instance_id} already has SG {sg_id}")
+        return True
+    logging.info(f"Instance {instance_id} already has SG {sg_id}")
+    return False
 
 def attach_policies_to_role(role_name, policies):
-    """Attach IAM policies to a role"""
+    """Attach IAM policies to a role; return the ARNs that are now attached"""
+    attached = []
     for policy_arn in policies:
         try:
             iam_client.attach_role_policy(RoleName=role_name, PolicyArn=policy_arn)
             logging.info(f"Attached {policy_arn} to role {role_name}")
+            attached.append(policy_arn)
         except ClientError as e:
-            if "EntityAlreadyExists" in str(e):
+            if error_code(e) == "EntityAlreadyExists":
                 logging.info(f"Policy {policy_arn} already attached to role {role_name}")
+                attached.append(policy_arn)
             else:
                 logging.error(f"Error attaching policy {policy_arn}: {e}")
+    return attached
+
+def reset_role_cache():
+    """Forget cached instance profiles and role policies"""
+    with _cache_lock:
+        _profile_roles.clear()
+        _role_policies.clear()
+        _role_attempts.clear()
+        _key_locks.clear()
+
+def _key_lock(key):
+    """Return the lock serializing lookups for one cache key"""
+    with _cache_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def get_profile_role_names(profile_arn):
+    """Resolve an instance profile ARN to its role names (memoized)"""
+    with _key_lock(("profile", profile_arn)):
+        if profile_arn not in _profile_roles:
+            profile_name = profile_arn.split('/')[-1]
+            try:
+                response = iam_client.get_instance_profile(InstanceProfileName=profile_name)
+                roles = [role['RoleName'] for role in response['InstanceProfile']['Roles']]
+            except ClientError as e:
+                logging.error(f"Error resolving instance profile {profile_name}: {e}")
+                roles = []
+            _profile_roles[profile_arn] = roles
+        return _profile_roles[profile_arn]
+
+def list_attached_role_policies(role_name):
+    """Return the managed policy ARNs attached to a role"""
+    paginator = iam_client.get_paginator("list_attached_role_policies")
+    return {policy['PolicyArn']
+            for page in paginator.paginate(RoleName=role_name)
+            for policy in page['AttachedPolicies']}
+
+def ensure_role_policies(role_name, policies):
+    """Attach only the policies a role is missing, using the per-run cache"""
+    with _key_lock(("role", role_name)):
+        attached = _role_policies.get(role_name)
+        if attached is None:
+            try:
+                attached = list_attached_role_policies(role_name)
+            except ClientError as e:
+                # Listed once per run; the attaches below are still tried once
+                logging.error(f"Error listing policies for role {role_name}: {e}")
+                attached = set()
+            _role_policies[role_name] = attached
+        # A failed attach (AccessDenied, NoSuchEntity) is not retried for every instance sharing the role
+        tried = _role_attempts.setdefault(role_name, set())
+        missing = [policy_arn for policy_arn in policies if policy_arn not in attached and policy_arn not in tried]
+        if missing:
+            tried.update(missing)
+            attached.update(attach_policies_to_role(role_name, missing))
 
 def get_all_vpcs():
     """Return all VPC IDs in the region"""
-    vpcs = ec2_client.describe_vpcs()
-    return [vpc['VpcId'] for vpc in vpcs['Vpcs']]
-
-def get_instances_in_vpc(vpc_id):
-    """Return all EC2 instance IDs in a VPC"""
-    instances = ec2_client.describe_instances(Filters=[{"Name": "vpc-id", "Values": [vpc_id]}])
-    instance_ids = []
-    for res in instances['Reservations']:
-        for inst in res['Instances']:
-            instance_ids.append(inst['InstanceId'])
-    return instance_ids
+    paginator = ec2_client.get_paginator("describe_vpcs")
+    return [vpc['VpcId'] for page in paginator.paginate() for vpc in page['Vpcs']]
+
+def build_inventory():
+    """Return {vpc_id: [instance, ...]} from one paginated DescribeInstances stream.
+
+    Each instance carries its security group IDs and instance profile ARN so the
+    later steps never need to describe it again.
+    """
+    inventory = {vpc_id: [] for vpc_id in get_all_vpcs()}
+    paginator = ec2_client.get_paginator("describe_instances")
+    pages = paginator.paginate(
+        Filters=[{"Name": "instance-state-name", "Values": INSTANCE_STATES}],
+        PaginationConfig={"PageSize": PAGE_SIZE}
+    )
+    for page in pages:
+        for res in page['Reservations']:
+            for inst in res['Instances']:
+                vpc_id = inst.get('VpcId')
+                if not vpc_id:
+                    continue
+                inventory.setdefault(vpc_id, []).append({
+                    'InstanceId': inst['InstanceId'],
+                    'SecurityGroups': [sg['GroupId'] for sg in inst.get('SecurityGroups', [])],
+                    'IamInstanceProfileArn': inst.get('IamInstanceProfile', {}).get('Arn')
+                })
+    return inventory
+
+def reconcile_instance(instance, sg_id):
+    """Attach the SG and role policies to one instance; return its outcome"""
+    attached = attach_sg_to_instance(instance, sg_id)
+
+    # Attach IAM role policies if instance has IAM role
+    arn = instance['IamInstanceProfileArn']
+    if arn:
+        for role_name in get_profile_role_names(arn):
+            ensure_role_policies(role_name, POLICIES)
+    return "attached" if attached else "unchanged"
+
+def reconcile_vpc(vpc_id, instances, instance_pool):
+    """Ensure the SG exists in a VPC, then reconcile its instances on the pool"""
+    result = {"VpcId": vpc_id, "SecurityGroupId": None, "instances": len(instances),
+              "attached": 0, "unchanged": 0, "failed": 0}
+    # The SG must exist before any instance in this VPC can reference it
+    sg_id = create_security_group(vpc_id)
+    result["SecurityGroupId"] = sg_id
+    if not sg_id:
+        logging.error(f"Skipping {len(instances)} instances in VPC {vpc_id}: no security group")
+        result["failed"] = len(instances)
+        return result
+    if not instances:
+        logging.info(f"No EC2 instances in VPC {vpc_id}")
+        return result
+
+    futures = {instance_pool.submit(reconcile_instance, inst, sg_id): inst for inst in instances}
+    for future in as_completed(futures):
+        instance_id = futures[future]['InstanceId']
+        try:
+            result[future.result()] += 1
+        except Exception as e:
+            # Connection and read timeouts are not ClientErrors; one instance must not abort the VPC
+            logging.error(f"Failed to reconcile instance {instance_id}: {type(e).__name__}: {e}")
+            result["failed"] += 1
+    return result
+
+def run_sweep(inventory, max_workers=MAX_WORKERS, max_vpc_workers=MAX_VPC_WORKERS):
+    """Reconcile every VPC in parallel and return one result per VPC"""
+    # Instance work goes to its own pool so VPC tasks waiting on it can never starve it
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="instance") as instance_pool, \
+            ThreadPoolExecutor(max_workers=max_vpc_workers, thread_name_prefix="vpc") as vpc_pool:
+        futures = [vpc_pool.submit(reconcile_vpc, vpc_id, instances, instance_pool)
+                   for vpc_id, instances in inventory.items()]
+        return [future.result() for future in futures]
+
+def log_summary(results, elapsed):
+    """Log per-VPC outcomes and the sweep totals"""
+    totals = {"instances": 0, "attached": 0, "unchanged": 0, "failed": 0}
+    for result in results:
+        logging.info(f"VPC {result['VpcId']} (SG {result['SecurityGroupId']}): "
+                     f"{result['attached']} attached, {result['unchanged']} unchanged, "
+                     f"{result['failed']} failed")
+        for key in totals:
+            totals[key] += result[key]
+    logging.info(f"Sweep finished in {elapsed:.1f}s: {len(results)} VPCs, "
+                 f"{totals['instances']} instances, {totals['attached']} attached, "
+                 f"{totals['unchanged']} unchanged, {totals['failed']} failed")
+    return totals
 
 # ================= MAIN =================
 def main():
-    vpcs = get_all_vpcs()
-    logging.info(f"Found VPCs: {vpcs}")
-
-    for vpc_id in vpcs:
-        sg_id = create_security_group(vpc_id)
-        instances = get_instances_in_vpc(vpc_id)
-        if not instances:
-            logging.info(f"No EC2 instances in VPC {vpc_id}")
-            continue
-        for instance_id in instances:
-            attach_sg_to_instance(instance_id, sg_id)
-
-            # Attach IAM role policies if instance has IAM role
-            instance = ec2_resource.Instance(instance_id)
-            if 'IamInstanceProfile' in instance.meta.data:
-                arn = instance.iam_instance_profile_arn
-                role_name = arn.split('/')[-1]
-                attach_policies_to_role(role_name, POLICIES)
+    start = time.monotonic()
+    reset_role_cache()
+    inventory = build_inventory()
+    logging.info(f"Found VPCs: {list(inventory)}")
+
+    results = run_sweep(inventory)
+    log_summary(results, time.monotonic() - start)
+    logging.info(f"Checked {len(_role_policies)} roles across {len(_profile_roles)} instance profiles")
+    aws_retry.log_stats()
+    return results
 
 if __name__ == "__main__":
     main()
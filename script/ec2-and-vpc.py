@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
 from botocore.exceptions import ClientError
+from step_dag import Step, StepFailed, run_steps
 import logging
 import time
 
@@ -22,37 +23,48 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENTS =================
-ec2_client = boto3.client("ec2", region_name=REGION)
-ec2_resource = boto3.resource("ec2", region_name=REGION)
+ec2_client = aws_clients.client("ec2", region_name=REGION)
+ec2_resource = aws_clients.resource("ec2", region_name=REGION)
 
 # ================= FUNCTIONS =================
 def create_vpc():
     logging.info("Creating VPC...")
-    vpc = ec2_resource.create_vpc(CidrBlock=VPC_CIDR)
-    vpc.wait_until_available()
-    vpc.create_tags(Tags=[{"Key": "Name", "Value": "MyVPC"}])
-    logging.info(f"VPC created: {vpc.id}")
-
-    # Enable DNS support
-    ec2_client.modify_vpc_attribute(VpcId=vpc.id, EnableDnsHostnames={'Value': True})
-    logging.info(f"Enabled DNS hostnames for VPC {vpc.id}")
-
-    # Create subnet
-    subnet = vpc.create_subnet(CidrBlock=SUBNET_CIDR)
-    logging.info(f"Subnet created: {subnet.id}")
-
-    # Create Internet Gateway and attach
-    igw = ec2_resource.create_internet_gateway()
-    vpc.attach_internet_gateway(InternetGatewayId=igw.id)
-    logging.info(f"Internet Gateway created and attached: {igw.id}")
-
-    # Create route table
-    route_table = vpc.create_route_table()
-    route_table.create_route(DestinationCidrBlock="0.0.0.0/0", GatewayId=igw.id)
-    route_table.associate_with_subnet(SubnetId=subnet.id)
-    logging.info(f"Route table configured with IGW for subnet {subnet.id}")
-
-    return vpc, subnet
+    vpc_id = ec2_client.create_vpc(CidrBlock=VPC_CIDR)['Vpc']['VpcId']
+    ec2_client.get_waiter('vpc_available').wait(VpcIds=[vpc_id])
+    ec2_client.create_tags(Resources=[vpc_id], Tags=[{"Key": "Name", "Value": "MyVPC"}])
+    logging.info(f"VPC created: {vpc_id}")
+    return vpc_id
+
+def enable_dns_hostnames(vpc_id):
+    ec2_client.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
+    logging.info(f"Enabled DNS hostnames for VPC {vpc_id}")
+
+def create_subnet(vpc_id):
+    subnet_id = ec2_client.create_subnet(VpcId=vpc_id, CidrBlock=SUBNET_CIDR)['Subnet']['SubnetId']
+    logging.info(f"Subnet created: {subnet_id}")
+    return subnet_id
+
+def create_internet_gateway():
+    igw_id = ec2_client.create_internet_gateway()['InternetGateway']['InternetGatewayId']
+    logging.info(f"Internet Gateway created: {igw_id}")
+    return igw_id
+
+def attach_internet_gateway(vpc_id, igw_id):
+    ec2_client.attach_internet_gateway(VpcId=vpc_id, InternetGatewayId=igw_id)
+    logging.info(f"Internet Gateway {igw_id} attached to {vpc_id}")
+    return True
+
+def create_route_table(vpc_id):
+    return ec2_client.create_route_table(VpcId=vpc_id)['RouteTable']['RouteTableId']
+
+def create_default_route(route_table_id, igw_id, igw_attached):
+    ec2_client.create_route(RouteTableId=route_table_id, DestinationCidrBlock="0.0.0.0/0", GatewayId=igw_id)
+    return True
+
+def associate_route_table(route_table_id, subnet_id):
+    ec2_client.associate_route_table(RouteTableId=route_table_id, SubnetId=subnet_id)
+    logging.info(f"Route table {route_table_id} associated with subnet {subnet_id}")
+    return True
 
 def create_security_group(vpc_id):
     logging.info("Creating Security Group...")
@@ -81,7 +93,7 @@ def create_security_group(vpc_id):
     logging.info("Opened ports 8080 and 3001")
     return sg_id
 
-def launch_ec2_instance(subnet_id, sg_id):
+def launch_ec2_instance(subnet_id, sg_id, default_routed, subnet_routed):
     logging.info("Launching EC2 instance with Nginx setup...")
 
     # User-data script to install and configure Nginx
@@ -119,11 +131,33 @@ systemctl start nginx
     logging.info(f"Instance is running at public IP: {instance.public_ip_address}")
     return instance.id, instance.public_ip_address
 
+# Same engine as create-postgress.py: routing and the security group are set up
+# concurrently; the instance waits for both routing steps because its user data
+# installs packages from the internet once, at first boot
+STEPS = [
+    Step("vpc", create_vpc, outputs=["vpc_id"]),
+    Step("dns_hostnames", enable_dns_hostnames, inputs=["vpc_id"]),
+    Step("subnet", create_subnet, inputs=["vpc_id"], outputs=["subnet_id"]),
+    Step("internet_gateway", create_internet_gateway, outputs=["igw_id"]),
+    Step("attach_internet_gateway", attach_internet_gateway, inputs=["vpc_id", "igw_id"], outputs=["igw_attached"]),
+    Step("route_table", create_route_table, inputs=["vpc_id"], outputs=["route_table_id"]),
+    Step("default_route", create_default_route, inputs=["route_table_id", "igw_id", "igw_attached"],
+         outputs=["default_routed"]),
+    Step("route_table_association", associate_route_table, inputs=["route_table_id", "subnet_id"],
+         outputs=["subnet_routed"]),
+    Step("security_group", create_security_group, inputs=["vpc_id"], outputs=["sg_id"]),
+    Step("instance", launch_ec2_instance, inputs=["subnet_id", "sg_id", "default_routed", "subnet_routed"],
+         outputs=["instance_id", "public_ip"]),
+]
+
 # ================= MAIN =================
 def main():
-    vpc, subnet = create_vpc()
-    sg_id = create_security_group(vpc.id)
-    instance_id, public_ip = launch_ec2_instance(subnet.id, sg_id)
+    try:
+        context = run_steps(STEPS)
+    except StepFailed as e:
+        logging.error(f"Provisioning stopped: {e}")
+        return
+    instance_id, public_ip = context["instance_id"], context["public_ip"]
     logging.info(f"EC2 instance {instance_id} is ready.")
     logging.info(f"Access Nginx on http://{public_ip}:8080 and http://{public_ip}:3001")
 
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
 import time
 import logging
 
@@ -18,7 +18,7 @@ MIN_NODES = 1
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
 # ================= AWS CLIENT =================
-eks_client = boto3.client("eks", region_name=REGION)
+eks_client = aws_clients.client("eks", region_name=REGION)
 
 # ================= FUNCTIONS =================
 def create_eks_cluster():
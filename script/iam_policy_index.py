@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""Offline IAM effective-permission evaluator over a cached account snapshot.
+
+One paginated GetAccountAuthorizationDetails call captures every user, group,
+role and managed policy document. The snapshot is cached as JSON and compiled
+into a PolicyIndex:
+
+* every principal's statements are flattened once (inline + managed + the
+  inline and managed policies of its groups) and bucketed by service prefix,
+  so a query only looks at statements that could match its action;
+* Action/NotAction/Resource/NotResource patterns are compiled once;
+* a reverse index maps each managed policy ARN to the principals that hold it,
+  directly or through a group.
+
+Evaluation follows IAM's identity-policy rules: an explicit Deny wins, then any
+Allow, otherwise an implicit deny. A permissions boundary, if set, must also
+allow the call. Conditions cannot be evaluated offline: statements with a
+Condition are assumed to match and the decision is flagged as conditional.
+SCPs, resource policies and session policies are out of scope.
+
+Examples:
+    python iam_policy_index.py who-can s3:PutObject arn:aws:s3:::my-bucket/key
+    python iam_policy_index.py check user/dev-user s3:PutObject arn:aws:s3:::my-bucket/key
+    python iam_policy_index.py holders arn:aws:iam::aws:policy/AmazonS3FullAccess --refresh
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from functools import lru_cache
+
+import aws_clients
+
+# ================= CONFIG =================
+REGION = "us-east-1"  # Region doesn't matter for IAM
+SNAPSHOT_FILE = "/tmp/iam_snapshot.json"
+SNAPSHOT_MAX_AGE = 3600  # Seconds before the cached snapshot is refetched
+
+# ================= LOGGING =================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# ================= AWS CLIENT =================
+iam_client = aws_clients.client("iam", region_name=REGION)
+
+# ================= SNAPSHOT =================
+def fetch_snapshot():
+    """Return the raw account authorization details from one paginated call"""
+    snapshot = {"UserDetailList": [], "GroupDetailList": [], "RoleDetailList": [], "Policies": []}
+    paginator = iam_client.get_paginator("get_account_authorization_details")
+    for page in paginator.paginate(Filter=["User", "Group", "Role", "LocalManagedPolicy", "AWSManagedPolicy"]):
+        for key in snapshot:
+            snapshot[key].extend(page.get(key, []))
+    return snapshot
+
+def load_snapshot(path=SNAPSHOT_FILE, max_age=SNAPSHOT_MAX_AGE, refresh=False):
+    """Return the cached snapshot, fetching and caching it when stale or missing"""
+    if not refresh and os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age:
+        with open(path) as f:
+            return json.load(f)
+    logging.info("Fetching IAM account authorization details...")
+    snapshot = fetch_snapshot()
+    with open(path, "w") as f:
+        json.dump(snapshot, f, default=str)
+    logging.info(f"Cached {len(snapshot['UserDetailList'])} users, {len(snapshot['GroupDetailList'])} groups, "
+                 f"{len(snapshot['RoleDetailList'])} roles and {len(snapshot['Policies'])} policies in {path}")
+    return snapshot
+
+# ================= PATTERNS =================
+@lru_cache(maxsize=None)
+def _compile(pattern, ignore_case):
+    regex = "".join(".*" if c == "*" else "." if c == "?" else re.escape(c) for c in pattern)
+    return re.compile(regex + r"\Z", re.IGNORECASE if ignore_case else 0)
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def _document(doc):
+    # boto3 decodes policy documents, but cached or hand-written ones may be strings
+    return json.loads(doc) if isinstance(doc, str) else doc
+
+class Statement:
+    """One compiled policy statement"""
+    __slots__ = ("effect", "actions", "not_actions", "resources", "not_resources", "conditional", "source")
+
+    def __init__(self, raw, source):
+        self.effect = raw.get("Effect", "Deny")
+        self.actions = [_compile(a, True) for a in _as_list(raw.get("Action"))]
+        self.not_actions = [_compile(a, True) for a in _as_list(raw.get("NotAction"))]
+        self.resources = [_compile(r, False) for r in _as_list(raw.get("Resource"))]
+        self.not_resources = [_compile(r, False) for r in _as_list(raw.get("NotResource"))]
+        self.conditional = bool(raw.get("Condition"))
+        self.source = source
+
+    def prefixes(self, raw):
+        """Service prefixes this statement can match ("*" = any)"""
+        if "NotAction" in raw:
+            return {"*"}
+        prefixes = set()
+        for action in _as_list(raw.get("Action")):
+            service = action.split(":", 1)[0].lower()
+            prefixes.add("*" if "*" in service or "?" in service or ":" not in action else service)
+        return prefixes
+
+    def matches(self, action, resource):
+        if self.actions and not any(p.match(action) for p in self.actions):
+            return False
+        if self.not_actions and any(p.match(action) for p in self.not_actions):
+            return False
+        if self.resources and not any(p.match(resource) for p in self.resources):
+            return False
+        if self.not_resources and any(p.match(resource) for p in self.not_resources):
+            return False
+        return True
+
+def compile_document(document, source):
+    """Return [(statement, prefixes)] for a policy document"""
+    compiled = []
+    for raw in _as_list(_document(document).get("Statement")):
+        statement = Statement(raw, source)
+        compiled.append((statement, statement.prefixes(raw)))
+    return compiled
+
+class Decision:
+    """Outcome of one evaluation"""
+    __slots__ = ("decision", "conditional", "statements")
+
+    def __init__(self, decision, conditional=False, statements=()):
+        self.decision = decision          # "allow", "deny" or "implicit-deny"
+        self.conditional = conditional    # True if a Condition was assumed to match
+        self.statements = list(statements)
+
+    @property
+    def allowed(self):
+        return self.decision == "allow"
+
+    def __repr__(self):
+        flag = " (conditional)" if self.conditional else ""
+        return f"Decision({self.decision}{flag}, via {self.statements})"
+
+# ================= INDEX =================
+class PolicyIndex:
+    """Compiled, queryable view of an account snapshot"""
+
+    def __init__(self, snapshot):
+        self.policies = {}        # policy ARN -> compiled statements of the default version
+        self.principals = {}      # principal ARN -> {"type", "name", "buckets", "boundary"}
+        self.holders = {}         # policy ARN -> principal ARNs it is attached to directly
+        self.group_members = {}   # group name -> set of user ARNs
+
+        for policy in snapshot.get("Policies", []):
+            for version in policy.get("PolicyVersionList", []):
+                if version.get("IsDefaultVersion"):
+                    self.policies[policy["Arn"]] = compile_document(version["Document"], policy["Arn"])
+
+        groups = {}
+        for group in snapshot.get("GroupDetailList", []):
+            statements = self._inline(group.get("GroupPolicyList", []), group["Arn"])
+            managed = [p["PolicyArn"] for p in group.get("AttachedManagedPolicies", [])]
+            groups[group["GroupName"]] = (group["Arn"], statements, managed)
+            self._add_principal(group["Arn"], "group", group["GroupName"], statements, managed, None)
+
+        for user in snapshot.get("UserDetailList", []):
+            statements = self._inline(user.get("UserPolicyList", []), user["Arn"])
+            managed = [p["PolicyArn"] for p in user.get("AttachedManagedPolicies", [])]
+            inherited = []
+            for group_name in user.get("GroupList", []):
+                if group_name in groups:
+                    _, group_statements, group_managed = groups[group_name]
+                    statements = statements + group_statements
+                    inherited.extend(group_managed)
+                self.group_members.setdefault(group_name, set()).add(user["Arn"])
+            boundary = user.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+            self._add_principal(user["Arn"], "user", user["UserName"], statements, managed, boundary, inherited)
+
+        for role in snapshot.get("RoleDetailList", []):
+            statements = self._inline(role.get("RolePolicyList", []), role["Arn"])
+            managed = [p["PolicyArn"] for p in role.get("AttachedManagedPolicies", [])]
+            boundary = role.get("PermissionsBoundary", {}).get("PermissionsBoundaryArn")
+            self._add_principal(role["Arn"], "role", role["RoleName"], statements, managed, boundary)
+
+    def _inline(self, policy_list, owner_arn):
+        statements = []
+        for policy in policy_list:
+            statements.extend(compile_document(policy["PolicyDocument"], f"{owner_arn}:{policy['PolicyName']}"))
+        return statements
+
+    def _add_principal(self, arn, kind, name, statements, managed, boundary, inherited=()):
+        buckets = {}
+        for policy_arn in managed:
+            self.holders.setdefault(policy_arn, set()).add(arn)
+        for policy_arn in list(managed) + list(inherited):
+            statements = statements + self.policies.get(policy_arn, [])
+        for statement, prefixes in statements:
+            for prefix in prefixes:
+                buckets.setdefault(prefix, []).append(statement)
+        self.principals[arn] = {"type": kind, "name": name, "buckets": buckets, "boundary": boundary}
+
+    def resolve(self, principal):
+        """Accept a principal ARN or "user/name", "group/name", "role/name" """
+        if principal in self.principals:
+            return principal
+        kind, _, name = principal.partition("/")
+        for arn, info in self.principals.items():
+            if info["type"] == kind and info["name"] == name:
+                return arn
+        raise KeyError(f"Unknown principal {principal}")
+
+    @staticmethod
+    def _evaluate(statements, action, resource):
+        allowed, conditional, matched = False, False, []
+        for statement in statements:
+            if not statement.matches(action, resource):
+                continue
+            if statement.effect == "Deny":
+                if not statement.conditional:
+                    return Decision("deny", statements=[statement.source])
+                conditional = True
+            elif statement.effect == "Allow":
+                allowed = True
+                conditional = conditional or statement.conditional
+                matched.append(statement.source)
+        return Decision("allow" if allowed else "implicit-deny", conditional, matched)
+
+    def evaluate(self, principal, action, resource="*"):
+        """Return the Decision for one principal, action and resource"""
+        info = self.principals[self.resolve(principal)]
+        prefix = action.split(":", 1)[0].lower()
+        buckets = info["buckets"]
+        decision = self._evaluate(buckets.get(prefix, []) + buckets.get("*", []), action, resource)
+        if decision.allowed and info["boundary"]:
+            boundary = [s for s, _ in self.policies.get(info["boundary"], [])]
+            limit = self._evaluate(boundary, action, resource)
+            if not limit.allowed:
+                return Decision(limit.decision if limit.decision == "deny" else "implicit-deny",
+                                statements=[info["boundary"]])
+            decision.conditional = decision.conditional or limit.conditional
+        return decision
+
+    def is_allowed(self, principal, action, resource="*"):
+        return self.evaluate(principal, action, resource).allowed
+
+    def who_can(self, action, resource="*", kinds=("user", "role")):
+        """Return {principal ARN: Decision} for every principal allowed to act"""
+        result = {}
+        for arn, info in self.principals.items():
+            if info["type"] in kinds:
+                decision = self.evaluate(arn, action, resource)
+                if decision.allowed:
+                    result[arn] = decision
+        return result
+
+    def principals_for_policy(self, policy_arn, include_group_members=True):
+        """Return every principal holding a managed policy, directly or via a group"""
+        holders = set(self.holders.get(policy_arn, ()))
+        if include_group_members:
+            for arn in list(holders):
+                info = self.principals[arn]
+                if info["type"] == "group":
+                    holders |= self.group_members.get(info["name"], set())
+        return sorted(holders)
+
+def build_index(refresh=False):
+    """Load (or fetch) the snapshot and compile it"""
+    return PolicyIndex(load_snapshot(refresh=refresh))
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Query IAM permissions offline")
+    parser.add_argument("--refresh", action="store_true", help="Refetch the account snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="Can PRINCIPAL perform ACTION on RESOURCE?")
+    check.add_argument("principal", help='ARN or "user/name", "group/name", "role/name"')
+    check.add_argument("action")
+    check.add_argument("resource", nargs="?", default="*")
+    who = commands.add_parser("who-can", help="Which users and roles can perform ACTION on RESOURCE?")
+    who.add_argument("action")
+    who.add_argument("resource", nargs="?", default="*")
+    holders = commands.add_parser("holders", help="Which principals hold a managed policy?")
+    holders.add_argument("policy_arn")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = build_index(refresh=args.refresh)
+    logging.info(f"Indexed {len(index.principals)} principals in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    if args.command == "check":
+        print(index.evaluate(args.principal, args.action, args.resource))
+    elif args.command == "who-can":
+        for arn, decision in sorted(index.who_can(args.action, args.resource).items()):
+            print(f"{arn}{' (conditional)' if decision.conditional else ''}")
+    else:
+        for arn in index.principals_for_policy(args.policy_arn):
+            print(arn)
+    logging.info(f"Query answered in {(time.perf_counter() - start) * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Deterministic, incremental Lambda package builder.
+
+build_package() turns a source file or directory plus an optional
+requirements.txt into a deployment zip:
+
+* Dependencies are built once per requirements hash. Wheels are kept in
+  CACHE_DIR/wheels/<hash>, the unpacked tree in CACHE_DIR/trees/<hash>, and the
+  tree compressed into CACHE_DIR/layers/<hash>.zip. Changing only the code
+  never runs pip or recompresses site-packages again.
+* The package is a copy of the cached dependency zip with the source files
+  appended, so a rebuild compresses only the function's own files.
+* Entries are sorted and written with a fixed timestamp and permissions, so the
+  same inputs always give byte-for-byte the same zip (and the same CodeSha256).
+* A fingerprint of every input is stored next to the zip; if nothing changed,
+  the existing zip is returned without being rewritten.
+
+Example:
+    python lambda_package.py ./src /tmp/function.zip --requirements requirements.txt
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+
+# ================= CONFIG =================
+CACHE_DIR = os.path.expanduser("~/.cache/lambda-packages")
+COMPRESS_LEVEL = 6                       # zlib level 0-9 for ZIP_DEFLATED
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)  # Earliest timestamp a zip can store
+# Target platform for dependency wheels; None builds for this machine.
+# For Lambda use e.g. "manylinux2014_x86_64" or "manylinux2014_aarch64".
+PIP_PLATFORM = None
+PIP_PYTHON_VERSION = None                # e.g. "3.11"; defaults to this interpreter
+EXCLUDE_DIRS = {"__pycache__", ".git", ".venv", ".pytest_cache"}
+EXCLUDE_SUFFIXES = (".pyc", ".pyo")
+
+# ================= LOGGING =================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# ================= STATE =================
+_key_locks = {}
+_cache_lock = threading.Lock()
+
+def _key_lock(key):
+    with _cache_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+# ================= FUNCTIONS =================
+def file_sha256(path):
+    """Return the hex SHA-256 of a file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def collect_files(source):
+    """Return sorted (archive name, path) pairs for a source file or directory"""
+    if os.path.isfile(source):
+        return [(os.path.basename(source), source)]
+    files = []
+    for root, dirs, names in os.walk(source):
+        dirs[:] = [d for d in dirs if d not in EXCLUDE_DIRS]
+        for name in names:
+            if name.endswith(EXCLUDE_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, source).replace(os.sep, "/"), path))
+    return sorted(files)
+
+def requirements_hash(requirements):
+    """Hash the requirements together with everything that changes the built wheels"""
+    digest = hashlib.sha256()
+    with open(requirements, "rb") as f:
+        digest.update(f.read())
+    digest.update(f"{PIP_PLATFORM}|{PIP_PYTHON_VERSION or sys.version_info[:2]}".encode())
+    return digest.hexdigest()[:16]
+
+def _zip_info(name, path):
+    info = zipfile.ZipInfo(name, date_time=FIXED_DATE_TIME)
+    mode = 0o755 if os.access(path, os.X_OK) else 0o644
+    info.external_attr = (0o100000 | mode) << 16
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.create_system = 3  # Unix, so the permissions above are honoured
+    return info
+
+def write_entries(zf, files, compress_level=COMPRESS_LEVEL):
+    """Add (archive name, path) pairs to an open ZipFile with fixed metadata"""
+    for name, path in files:
+        with open(path, "rb") as f:
+            zf.writestr(_zip_info(name, path), f.read(), compresslevel=compress_level)
+
+def _pip(*args):
+    cmd = [sys.executable, "-m", "pip", *args, "--disable-pip-version-check", "--quiet"]
+    logging.info(f"Running: {' '.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
+def build_dependency_layer(requirements, cache_dir=CACHE_DIR, compress_level=COMPRESS_LEVEL):
+    """Return the cached dependency zip for a requirements file, building it on a miss"""
+    key = requirements_hash(requirements)
+    layer = os.path.join(cache_dir, "layers", f"{key}-{compress_level}.zip")
+    with _key_lock(key):
+        if os.path.exists(layer):
+            logging.info(f"Dependency cache hit: {key}")
+            return layer
+
+        wheels = os.path.join(cache_dir, "wheels", key)
+        tree = os.path.join(cache_dir, "trees", key)
+        if not os.path.isdir(tree):
+            platform_args = []
+            if PIP_PLATFORM:
+                platform_args = ["--platform", PIP_PLATFORM, "--implementation", "cp", "--only-binary=:all:"]
+            if PIP_PYTHON_VERSION:
+                platform_args += ["--python-version", PIP_PYTHON_VERSION]
+            os.makedirs(wheels, exist_ok=True)
+            _pip("download", "-r", requirements, "-d", wheels, *platform_args)
+            os.makedirs(os.path.dirname(tree), exist_ok=True)
+            staging = tempfile.mkdtemp(dir=os.path.dirname(tree))
+            try:
+                _pip("install", "--no-index", "--find-links", wheels, "--target", staging,
+                     "--no-compile", "-r", requirements, *platform_args)
+                os.rename(staging, tree)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+
+        os.makedirs(os.path.dirname(layer), exist_ok=True)
+        partial = f"{layer}.partial"
+        with zipfile.ZipFile(partial, "w") as zf:
+            write_entries(zf, collect_files(tree), compress_level)
+        os.replace(partial, layer)
+        layer_sha256(layer)
+        logging.info(f"Dependency layer built: {layer}")
+        return layer
+
+def layer_sha256(layer):
+    """Return the hex SHA-256 of a dependency zip, recorded next to it so it is hashed once"""
+    record = f"{layer}.sha256"
+    # A record older than the zip belongs to a layer that has since been rebuilt
+    if os.path.exists(record) and os.path.getmtime(record) >= os.path.getmtime(layer):
+        with open(record) as f:
+            return f.read().strip()
+    sha256 = file_sha256(layer)
+    with open(record, "w") as f:
+        f.write(sha256)
+    return sha256
+
+def fingerprint(files, layer, compress_level):
+    """Return a hash of every input that affects the package bytes"""
+    digest = hashlib.sha256()
+    # The layer's contents, not its name: the name only hashes requirements.txt, and
+    # unpinned requirements can resolve to different wheels when the cache is rebuilt
+    digest.update(f"{compress_level}|{FIXED_DATE_TIME}|{layer_sha256(layer) if layer else ''}".encode())
+    for name, path in files:
+        digest.update(f"{name}|{os.access(path, os.X_OK)}|{file_sha256(path)}\n".encode())
+    return digest.hexdigest()
+
+def build_package(source, output, requirements=None, compress_level=COMPRESS_LEVEL, cache_dir=CACHE_DIR):
+    """Build a reproducible Lambda zip from a source file or tree; return its path"""
+    files = collect_files(source)
+    layer = build_dependency_layer(requirements, cache_dir, compress_level) if requirements else None
+    stamp_file = f"{output}.stamp"
+    stamp = fingerprint(files, layer, compress_level)
+    if os.path.exists(output) and os.path.exists(stamp_file):
+        with open(stamp_file) as f:
+            if json.load(f).get("fingerprint") == stamp:
+                logging.info(f"Package up to date: {output}")
+                return output
+
+    partial = f"{output}.partial"
+    if layer:
+        shutil.copyfile(layer, partial)
+        with zipfile.ZipFile(layer) as zf:
+            clashes = {name for name, _ in files} & set(zf.namelist())
+        if clashes:
+            os.remove(partial)
+            raise ValueError(f"Source files shadow dependency files: {sorted(clashes)[:5]}")
+    with zipfile.ZipFile(partial, "a" if layer else "w") as zf:
+        write_entries(zf, files, compress_level)
+    os.replace(partial, output)
+    with open(stamp_file, "w") as f:
+        json.dump({"fingerprint": stamp, "files": len(files), "layer": layer}, f)
+    logging.info(f"Package built: {output} ({len(files)} source files, {os.path.getsize(output)} bytes)")
+    return output
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Build a reproducible Lambda deployment package")
+    parser.add_argument("source", help="Handler file or source directory")
+    parser.add_argument("output", help="Zip file to write")
+    parser.add_argument("--requirements", help="requirements.txt to vendor into the package")
+    parser.add_argument("--compress-level", type=int, default=COMPRESS_LEVEL)
+    args = parser.parse_args()
+    build_package(args.source, args.output, args.requirements, args.compress_level)
+
+if __name__ == "__main__":
+    main()
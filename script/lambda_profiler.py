@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Offline Lambda memory/duration profiler for the Lambda deploy manifest.
+
+For every function in a LAMBDA_MANIFEST-style manifest, a fresh interpreter
+imports the handler from the function's source tree and invokes it with
+recorded sample events and a stub context. It measures:
+
+* import (cold-start) time of the handler module,
+* wall and CPU time of each invocation,
+* peak RSS of the process and peak Python allocations (tracemalloc).
+
+Lambda allocates CPU in proportion to memory (one full vCPU at 1769 MB). The
+CPU-bound share of each invocation is scaled to every candidate MemorySize.
+The recommendation is the cheapest size in GB-seconds that fits the measured
+memory. Among sizes within COST_TOLERANCE of the cheapest, the fastest wins.
+Timeout is the slowest estimated invocation plus cold start, times
+TIMEOUT_FACTOR. With --write both are stored back into the manifest.
+
+Sample events: each manifest entry may set "events" to a JSON file (one event
+or a list) or a directory of *.json files. Without one, {} is used.
+
+Examples:
+    python lambda_profiler.py functions.yaml
+    python lambda_profiler.py functions.yaml --write --only checkout-api
+"""
+import argparse
+import glob
+import importlib
+import json
+import logging
+import math
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+
+# ================= CONFIG =================
+MEMORY_SIZES = [128, 256, 512, 1024, 1769, 2048, 3008]  # Candidate MemorySize values (MB)
+FULL_VCPU_MB = 1769                 # MemorySize at which a function gets one full vCPU
+MEMORY_HEADROOM = 1.5               # Multiplier over measured peak RSS
+RUNTIME_OVERHEAD_MB = 40            # Lambda runtime memory not seen by the local process
+COST_TOLERANCE = 0.05               # Prefer faster sizes costing at most 5% more
+TIMEOUT_FACTOR = 3.0                # Timeout = slowest estimated run x this factor
+MIN_TIMEOUT = 3                     # Seconds
+MAX_TIMEOUT = 900                   # Lambda's hard limit
+INVOCATIONS = 5                     # Times each sample event is invoked
+CHILD_TIMEOUT = 600                 # Seconds a profiling run may take
+
+# ================= LOGGING =================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# ================= STUB CONTEXT =================
+class StubContext:
+    """The parts of the Lambda context object handlers commonly use"""
+
+    def __init__(self, function_name, memory_mb, timeout):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.invoked_function_arn = f"arn:aws:lambda:us-east-1:123456789012:function:{function_name}"
+        self.memory_limit_in_mb = str(memory_mb)
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local"
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+# ================= PROFILING (CHILD PROCESS) =================
+def load_events(path):
+    """Return the sample events from a JSON file or a directory of JSON files"""
+    if not path:
+        return [{}]
+    files = sorted(glob.glob(os.path.join(path, "*.json"))) if os.path.isdir(path) else [path]
+    events = []
+    for name in files:
+        with open(name) as f:
+            data = json.load(f)
+        events.extend(data if isinstance(data, list) else [data])
+    return events or [{}]
+
+def profile_handler(source, handler, events, function_name="local", invocations=INVOCATIONS):
+    """Import and invoke a handler in this process; return the measurements"""
+    source_dir = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    sys.path.insert(0, source_dir)
+    module_name, func_name = handler.rsplit(".", 1)
+
+    start = time.perf_counter()
+    func = getattr(importlib.import_module(module_name), func_name)
+    import_seconds = time.perf_counter() - start
+
+    wall, cpu, errors = [], [], 0
+    for _ in range(invocations):
+        for event in events:
+            context = StubContext(function_name, MEMORY_SIZES[-1], MAX_TIMEOUT)
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            try:
+                func(event, context)
+            except Exception as e:
+                errors += 1
+                logging.warning(f"{function_name}: handler raised {type(e).__name__}: {e}")
+            wall.append(time.perf_counter() - wall_start)
+            cpu.append(time.process_time() - cpu_start)
+
+    # Read before tracing: tracemalloc's per-allocation bookkeeping inflates RSS,
+    # which would oversize the MemorySize recommendation
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    # Allocations are traced in a separate pass so tracemalloc does not skew timings
+    tracemalloc.start()
+    for event in events:
+        try:
+            func(event, StubContext(function_name, MEMORY_SIZES[-1], MAX_TIMEOUT))
+        except Exception:
+            pass
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "import_seconds": import_seconds,
+        "invocations": len(wall),
+        "errors": errors,
+        "wall_max": max(wall),
+        "wall_mean": sum(wall) / len(wall),
+        "cpu_fraction": min(1.0, sum(cpu) / sum(wall)) if sum(wall) else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "peak_alloc_mb": peak_alloc / (1024 * 1024),
+    }
+
+# ================= RECOMMENDATION =================
+def estimate_duration(seconds, cpu_fraction, memory_mb):
+    """Scale a locally measured duration (about one full vCPU) to a MemorySize"""
+    slowdown = max(1.0, FULL_VCPU_MB / memory_mb)
+    return seconds * (1 - cpu_fraction) + seconds * cpu_fraction * slowdown
+
+def recommend(stats):
+    """Return {"memory", "timeout", "estimates"} for one function's measurements"""
+    needed = stats["peak_rss_mb"] * MEMORY_HEADROOM + RUNTIME_OVERHEAD_MB
+    candidates = [m for m in MEMORY_SIZES if m >= needed] or [MEMORY_SIZES[-1]]
+    estimates = {m: estimate_duration(stats["wall_mean"], stats["cpu_fraction"], m) for m in candidates}
+    costs = {m: m / 1024 * estimates[m] for m in candidates}
+    cheapest = min(costs.values())
+    memory = min((m for m in candidates if costs[m] <= cheapest * (1 + COST_TOLERANCE)),
+                 key=lambda m: (estimates[m], m))
+    slowest = estimate_duration(stats["wall_max"], stats["cpu_fraction"], memory) + stats["import_seconds"]
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(slowest * TIMEOUT_FACTOR)))
+    return {"memory": memory, "timeout": timeout,
+            "estimates": {m: round(estimates[m], 4) for m in candidates}}
+
+# ================= MANIFEST =================
+def read_manifest(path):
+    with open(path) as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        import yaml  # Only needed for YAML manifests
+        return yaml.safe_load(f) or {}
+
+def write_manifest(path, data):
+    with open(path, "w") as f:
+        if path.endswith(".json"):
+            json.dump(data, f, indent=2)
+        else:
+            import yaml
+            yaml.safe_dump(data, f, sort_keys=False)
+
+def profile_function(entry, handler_default):
+    """Profile one manifest entry in a fresh interpreter; return its measurements or None"""
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", json.dumps({
+        "source": entry["source"],
+        "handler": entry.get("handler", handler_default),
+        "events": entry.get("events"),
+        "name": entry["name"],
+    })]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=CHILD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logging.error(f"{entry['name']}: profiling took longer than {CHILD_TIMEOUT}s")
+        return None
+    if result.returncode != 0:
+        logging.error(f"{entry['name']}: profiling failed: {result.stderr.strip()}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def profile_manifest(path, only=None, write=False, handler_default="lambda_function.lambda_handler"):
+    """Profile every function in a manifest; return {name: recommendation}, optionally saving it"""
+    data = read_manifest(path)
+    results = {}
+    for entry in data.get("functions") or []:
+        if only and entry["name"] not in only:
+            continue
+        stats = profile_function(entry, handler_default)
+        if stats is None:
+            continue
+        rec = recommend(stats)
+        results[entry["name"]] = dict(rec, stats=stats)
+        logging.info(f"{entry['name']}: import {stats['import_seconds'] * 1000:.0f}ms, "
+                     f"mean {stats['wall_mean'] * 1000:.1f}ms (CPU {stats['cpu_fraction']:.0%}), "
+                     f"RSS {stats['peak_rss_mb']:.0f}MB -> MemorySize={rec['memory']} Timeout={rec['timeout']} "
+                     f"(was {entry.get('memory', '-')}/{entry.get('timeout', '-')})")
+        if write:
+            entry["memory"], entry["timeout"] = rec["memory"], rec["timeout"]
+    if write and results:
+        write_manifest(path, data)
+        logging.info(f"Recommendations written to {path}")
+    return results
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Profile Lambda handlers locally and size MemorySize/Timeout")
+    parser.add_argument("manifest", nargs="?", help="Lambda deploy manifest (YAML or JSON)")
+    parser.add_argument("--write", action="store_true", help="Store the recommendations in the manifest")
+    parser.add_argument("--only", action="append", help="Profile only this function (repeatable)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        spec = json.loads(args.child)
+        stats = profile_handler(spec["source"], spec["handler"], load_events(spec["events"]), spec["name"])
+        print(json.dumps(stats))
+        return
+    if not args.manifest:
+        parser.error("a manifest is required")
+    profile_manifest(args.manifest, args.only, args.write)
+
+if __name__ == "__main__":
+    main()
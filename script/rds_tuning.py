@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""PostgreSQL parameter group and gp3 storage settings sized to an RDS instance class.
+
+The sizing is pure arithmetic on the instance class's vCPUs and memory and a
+workload profile, so it runs offline:
+
+    postgres_parameters("db.r6g.xlarge", "oltp")   # {"shared_buffers": "1048576", ...}
+    storage_settings(500, "analytics")             # {"StorageType": "gp3", "Iops": ..., ...}
+
+Profiles:
+
+* oltp      - many short transactions: more connections, small work_mem, IOPS.
+* analytics - few large queries: few connections, large work_mem, parallel
+  workers, larger WAL, throughput.
+* mixed     - between the two.
+
+Values use the units RDS expects: shared_buffers, effective_cache_size and
+wal_buffers in 8 kB pages, *_work_mem in kB, *_wal_size in MB.
+ensure_parameter_group() creates (or updates) the group so create_db_instance
+can attach it at launch, when static parameters take effect without a reboot.
+
+Example:
+    python rds_tuning.py db.m6i.2xlarge --profile oltp --storage 500
+"""
+import argparse
+import json
+import logging
+import re
+
+from aws_retry import error_code
+from botocore.exceptions import ClientError
+
+# ================= CONFIG =================
+PAGE_KB = 8
+MB = 1024        # kB
+GB = 1024 * MB   # kB
+
+# Burstable classes: size -> (vCPUs, memory GiB)
+BURSTABLE_SIZES = {
+    "micro": (2, 1), "small": (2, 2), "medium": (2, 4),
+    "large": (2, 8), "xlarge": (4, 16), "2xlarge": (8, 32),
+}
+# Fixed-performance classes: size -> vCPUs; memory is vCPUs x the family's GiB per vCPU
+FIXED_SIZES = {
+    "large": 2, "xlarge": 4, "2xlarge": 8, "4xlarge": 16, "8xlarge": 32,
+    "12xlarge": 48, "16xlarge": 64, "24xlarge": 96,
+}
+GIB_PER_VCPU = {"m": 4, "r": 8, "x": 16}
+
+PROFILES = {
+    "oltp": {
+        "connections_per_vcpu": 100, "work_mem_share": 0.25, "maintenance_fraction": 1 / 16,
+        "min_wal_mb": 2048, "max_wal_mb": 8192, "parallel_share": 0.25, "statistics_target": 100,
+        "iops_per_gb": 30, "throughput_per_gb": 0.25,
+    },
+    "mixed": {
+        "connections_per_vcpu": 50, "work_mem_share": 0.35, "maintenance_fraction": 1 / 16,
+        "min_wal_mb": 1024, "max_wal_mb": 4096, "parallel_share": 0.5, "statistics_target": 100,
+        "iops_per_gb": 20, "throughput_per_gb": 0.5,
+    },
+    "analytics": {
+        "connections_per_vcpu": 10, "work_mem_share": 0.5, "maintenance_fraction": 1 / 8,
+        "min_wal_mb": 4096, "max_wal_mb": 16384, "parallel_share": 0.5, "statistics_target": 500,
+        "iops_per_gb": 12, "throughput_per_gb": 1.0,
+    },
+}
+
+MIN_CONNECTIONS = 20
+MAX_CONNECTIONS = 5000
+MEMORY_PER_CONNECTION_MB = 9.09   # RDS default: DBInstanceClassMemory/9531392
+MIN_WORK_MEM_KB = 4 * MB          # PostgreSQL default
+MAX_WORK_MEM_KB = 2 * GB
+MAX_MAINTENANCE_WORK_MEM_KB = 2 * GB
+WAL_STORAGE_SHARE = 0.25          # max_wal_size never exceeds this share of the volume
+SSD_RANDOM_PAGE_COST = 1.1
+
+# gp3 on RDS: below 400 GiB the volume gets 3000 IOPS / 125 MiBps and neither can be set;
+# from 400 GiB the included baseline is 12000 IOPS / 500 MiBps and both can be raised.
+GP3_MIN_GB = 20
+GP3_PROVISIONED_FROM_GB = 400
+GP3_BASELINE_IOPS = 12000
+GP3_BASELINE_THROUGHPUT = 500     # MiBps
+GP3_MAX_IOPS = 64000
+GP3_MAX_THROUGHPUT = 4000         # MiBps
+GP3_MAX_THROUGHPUT_PER_IOPS = 0.25
+
+# Take effect only at start-up; the rest can be applied immediately
+STATIC_PARAMETERS = {"shared_buffers", "max_connections", "wal_buffers"}
+PARAMETERS_PER_CALL = 20          # modify_db_parameter_group limit
+
+# ================= LOGGING =================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# ================= SIZING =================
+def instance_resources(instance_class):
+    """Return (vCPUs, memory MiB) for an RDS instance class such as db.r6g.xlarge"""
+    match = re.fullmatch(r"db\.([a-z]+)(\d+)([a-z-]*)\.(\w+)", instance_class)
+    if not match:
+        raise ValueError(f"not an RDS instance class: {instance_class}")
+    family, size = match.group(1), match.group(4)
+    if family == "t" and size in BURSTABLE_SIZES:
+        vcpus, gib = BURSTABLE_SIZES[size]
+    elif family in GIB_PER_VCPU and size in FIXED_SIZES:
+        vcpus = FIXED_SIZES[size]
+        gib = vcpus * GIB_PER_VCPU[family]
+    else:
+        raise ValueError(f"unknown instance class size: {instance_class}")
+    return vcpus, gib * 1024
+
+def _profile(profile):
+    if profile not in PROFILES:
+        raise ValueError(f"unknown workload profile {profile}; use one of {', '.join(PROFILES)}")
+    return PROFILES[profile]
+
+def postgres_parameters(instance_class, profile="mixed", allocated_gb=None):
+    """Return {parameter: value} for a PostgreSQL parameter group on this class and workload"""
+    settings = _profile(profile)
+    vcpus, memory_mb = instance_resources(instance_class)
+    memory_kb = memory_mb * MB
+
+    shared_buffers_kb = memory_kb // 4
+    effective_cache_kb = memory_kb * 3 // 4
+    max_connections = min(
+        max(MIN_CONNECTIONS, vcpus * settings["connections_per_vcpu"]),
+        int(memory_mb / MEMORY_PER_CONNECTION_MB),
+        MAX_CONNECTIONS,
+    )
+    parallel_workers = max(1, int(vcpus * settings["parallel_share"]))
+    # Share of the memory outside shared_buffers that sorts and hashes may use when every
+    # connection runs one, in its leader and each parallel worker
+    work_mem_kb = ((memory_kb - shared_buffers_kb) * settings["work_mem_share"]
+                   / (max_connections * (parallel_workers + 1)))
+    work_mem_kb = int(min(MAX_WORK_MEM_KB, max(MIN_WORK_MEM_KB, work_mem_kb)))
+    maintenance_kb = int(min(MAX_MAINTENANCE_WORK_MEM_KB, memory_kb * settings["maintenance_fraction"]))
+
+    # 16 MB of WAL buffers once shared_buffers can spare it, 1/32 of it before that
+    wal_buffers_kb = min(16 * MB, shared_buffers_kb // 32)
+    max_wal_mb = settings["max_wal_mb"]
+    if allocated_gb:
+        max_wal_mb = min(max_wal_mb, int(allocated_gb * 1024 * WAL_STORAGE_SHARE))
+    min_wal_mb = min(settings["min_wal_mb"], max_wal_mb // 2)
+
+    parameters = {
+        "shared_buffers": shared_buffers_kb // PAGE_KB,
+        "effective_cache_size": effective_cache_kb // PAGE_KB,
+        "max_connections": max_connections,
+        "work_mem": work_mem_kb,
+        "maintenance_work_mem": maintenance_kb,
+        "random_page_cost": SSD_RANDOM_PAGE_COST,
+        "effective_io_concurrency": 200,
+        "wal_buffers": wal_buffers_kb // PAGE_KB,
+        "min_wal_size": min_wal_mb,
+        "max_wal_size": max_wal_mb,
+        "checkpoint_completion_target": 0.9,
+        "wal_compression": "on",
+        "max_parallel_workers_per_gather": parallel_workers,
+        "max_parallel_workers": vcpus,
+        "default_statistics_target": settings["statistics_target"],
+    }
+    return {name: str(value) for name, value in parameters.items()}
+
+def storage_settings(allocated_gb, profile="mixed"):
+    """Return the create_db_instance storage arguments for a gp3 volume of this size"""
+    settings = _profile(profile)
+    allocated_gb = max(GP3_MIN_GB, int(allocated_gb))
+    storage = {"AllocatedStorage": allocated_gb, "StorageType": "gp3"}
+    if allocated_gb < GP3_PROVISIONED_FROM_GB:
+        return storage
+
+    throughput = int(min(GP3_MAX_THROUGHPUT,
+                         max(GP3_BASELINE_THROUGHPUT, allocated_gb * settings["throughput_per_gb"])))
+    iops = max(GP3_BASELINE_IOPS, allocated_gb * settings["iops_per_gb"],
+               throughput / GP3_MAX_THROUGHPUT_PER_IOPS)
+    storage["Iops"] = int(min(GP3_MAX_IOPS, iops))
+    storage["StorageThroughput"] = throughput
+    return storage
+
+# ================= PARAMETER GROUP =================
+def ensure_parameter_group(rds_client, name, family, parameters, description=None):
+    """Create the parameter group (or reuse one with this name) and set the parameters; return its name"""
+    try:
+        rds_client.create_db_parameter_group(
+            DBParameterGroupName=name,
+            DBParameterGroupFamily=family,
+            Description=description or f"Tuned {family} parameters"
+        )
+        logging.info(f"DB parameter group created: {name}")
+    except ClientError as e:
+        if error_code(e) != "DBParameterGroupAlreadyExists":
+            raise
+        logging.info(f"DB parameter group {name} exists, updating it")
+
+    items = [{
+        "ParameterName": key,
+        "ParameterValue": value,
+        "ApplyMethod": "pending-reboot" if key in STATIC_PARAMETERS else "immediate",
+    } for key, value in sorted(parameters.items())]
+    for start in range(0, len(items), PARAMETERS_PER_CALL):
+        rds_client.modify_db_parameter_group(DBParameterGroupName=name,
+                                             Parameters=items[start:start + PARAMETERS_PER_CALL])
+    logging.info(f"{len(items)} parameters set on {name}")
+    return name
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Print tuned PostgreSQL parameters and gp3 storage for an RDS class")
+    parser.add_argument("instance_class", help="e.g. db.m6i.large")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--storage", type=int, default=GP3_MIN_GB, help="Allocated storage (GiB)")
+    args = parser.parse_args()
+    print(json.dumps({
+        "parameters": postgres_parameters(args.instance_class, args.profile, args.storage),
+        "storage": storage_settings(args.storage, args.profile),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
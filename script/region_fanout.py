@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Run functions from the automation scripts against many regions in parallel.
+
+Every script binds its clients to a hardcoded REGION at import time. This
+module imports a separate copy of a script per region, rebinds its REGION and
+AWS clients to that region, and calls the requested functions on a bounded
+thread pool. The outcome of every (region, function) call is merged into one
+report.
+
+Example:
+    python region_fanout.py ec2-IAM-role-security-group.py:main --regions all
+    python region_fanout.py ../complete-deployment/eks-deployment.py:get_default_subnets \
+        --regions us-east-1,eu-west-1 --output /tmp/subnets.json
+
+It only uses boto3, so moto's mock_aws() can stand in for several regions.
+
+Script clients declared through aws_clients are rebound without being built,
+so a region only pays for the services its functions actually call.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.resources.base import ServiceResource
+from botocore.client import BaseClient
+
+import aws_clients
+
+# ================= CONFIG =================
+DEFAULT_REGIONS = ["us-east-1"]
+MAX_REGION_WORKERS = 4   # Total (region, function) calls in flight
+PER_REGION_LIMIT = 2     # Calls in flight within any one region
+
+# ================= LOGGING =================
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s"
+)
+
+# ================= STATE =================
+_modules = {}          # (script path, region) -> module bound to that region
+_module_locks = {}
+_region_locks = {}     # region -> semaphore enforcing PER_REGION_LIMIT
+_state_lock = threading.Lock()
+
+# ================= FUNCTIONS =================
+def get_enabled_regions():
+    """Return every region enabled for the account"""
+    ec2_client = aws_clients.get_client("ec2", region_name=DEFAULT_REGIONS[0])
+    response = ec2_client.describe_regions(AllRegions=False)
+    return sorted(region['RegionName'] for region in response['Regions'])
+
+def resolve_regions(regions):
+    """Expand "all" to the enabled regions; accept a list or comma-separated string"""
+    if isinstance(regions, str):
+        regions = [region.strip() for region in regions.split(",") if region.strip()]
+    if not regions:
+        return list(DEFAULT_REGIONS)
+    if regions == ["all"]:
+        return get_enabled_regions()
+    return list(regions)
+
+def _rebind_clients(module, region):
+    """Point a script module's REGION and AWS clients at another region"""
+    module.REGION = region
+    for attr, value in list(vars(module).items()):
+        if isinstance(value, aws_clients.LazyClient):
+            setattr(module, attr, value.for_region(region))
+        elif isinstance(value, BaseClient):
+            service = value.meta.service_model.service_name
+            setattr(module, attr, aws_clients.client(service, region_name=region))
+        elif isinstance(value, ServiceResource):
+            setattr(module, attr, aws_clients.resource(value.meta.service_name, region_name=region))
+
+def _key_lock(key):
+    """Return the lock serializing the import of one (script, region) module"""
+    with _state_lock:
+        return _module_locks.setdefault(key, threading.Lock())
+
+def load_script(script_path, region):
+    """Import a script as its own module bound to one region (cached)"""
+    script_path = os.path.abspath(script_path)
+    key = (script_path, region)
+    with _key_lock(key):
+        if key not in _modules:
+            stem = os.path.splitext(os.path.basename(script_path))[0]
+            name = f"{stem}_{region}".replace("-", "_")
+            spec = importlib.util.spec_from_file_location(name, script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _rebind_clients(module, region)
+            _modules[key] = module
+        return _modules[key]
+
+def _region_lock(region, per_region_limit):
+    """Return the semaphore bounding concurrent calls in one region"""
+    with _state_lock:
+        return _region_locks.setdefault(region, threading.BoundedSemaphore(per_region_limit))
+
+def run_in_region(region, script_path, function_name, args=(), kwargs=None,
+                  per_region_limit=PER_REGION_LIMIT):
+    """Call one script function in one region and describe the outcome"""
+    outcome = {"region": region, "script": os.path.basename(script_path), "function": function_name}
+    start = time.monotonic()
+    with _region_lock(region, per_region_limit):
+        try:
+            module = load_script(script_path, region)
+            outcome["result"] = getattr(module, function_name)(*args, **(kwargs or {}))
+            outcome["status"] = "ok"
+        except (Exception, SystemExit) as e:  # scripts call exit(); one region must not stop the rest
+            logging.error(f"[{region}] {function_name} failed: {e}")
+            outcome["status"] = "error"
+            outcome["error"] = f"{type(e).__name__}: {e}"
+    outcome["seconds"] = round(time.monotonic() - start, 3)
+    logging.info(f"[{region}] {outcome['script']}:{function_name} {outcome['status']} "
+                 f"in {outcome['seconds']}s")
+    return outcome
+
+def fan_out(tasks, regions=None, max_workers=MAX_REGION_WORKERS, per_region_limit=PER_REGION_LIMIT):
+    """Run every task in every region and merge the outcomes into one report.
+
+    tasks is a list of (script_path, function_name) or
+    (script_path, function_name, args, kwargs) tuples.
+    """
+    regions = resolve_regions(regions)
+    jobs = []
+    for region in regions:
+        for task in tasks:
+            script_path, function_name = task[0], task[1]
+            args = task[2] if len(task) > 2 else ()
+            kwargs = task[3] if len(task) > 3 else None
+            jobs.append((region, script_path, function_name, args, kwargs))
+
+    logging.info(f"Running {len(tasks)} task(s) across {len(regions)} region(s): {regions}")
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="region") as pool:
+        futures = [pool.submit(run_in_region, *job, per_region_limit=per_region_limit) for job in jobs]
+        outcomes = [future.result() for future in futures]
+
+    report = {"regions": {region: [] for region in regions}, "ok": 0, "failed": 0}
+    for outcome in outcomes:
+        report["regions"][outcome["region"]].append(outcome)
+        report["ok" if outcome["status"] == "ok" else "failed"] += 1
+    report["seconds"] = round(time.monotonic() - start, 3)
+    logging.info(f"Fan-out finished in {report['seconds']}s: "
+                 f"{report['ok']} ok, {report['failed']} failed")
+    return report
+
+def _parse_task(spec):
+    script_path, _, function_name = spec.rpartition(":")
+    if not script_path:
+        raise argparse.ArgumentTypeError(f"expected SCRIPT:FUNCTION, got {spec!r}")
+    return script_path, function_name
+
+# ================= MAIN =================
+def main():
+    parser = argparse.ArgumentParser(description="Run script functions across AWS regions")
+    parser.add_argument("tasks", nargs="+", type=_parse_task, help="SCRIPT:FUNCTION to run per region")
+    parser.add_argument("--regions", default=",".join(DEFAULT_REGIONS),
+                        help='Comma-separated regions, or "all" for every enabled region')
+    parser.add_argument("--max-workers", type=int, default=MAX_REGION_WORKERS)
+    parser.add_argument("--per-region-limit", type=int, default=PER_REGION_LIMIT)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = fan_out(args.tasks, args.regions, args.max_workers, args.per_region_limit)
+    body = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body)
+        logging.info(f"Report written to {args.output}")
+    else:
+        print(body)
+
+if __name__ == "__main__":
+    main()
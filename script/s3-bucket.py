@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
 from botocore.exceptions import ClientError
 import logging
 
@@ -16,7 +16,7 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENT =================
-s3_client = boto3.client("s3", region_name=REGION)
+s3_client = aws_clients.client("s3", region_name=REGION)
 
 # ================= FUNCTIONS =================
 def create_bucket(bucket_name, region):
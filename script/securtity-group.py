@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
-import boto3
+import aws_clients
+from aws_retry import error_code
 from botocore.exceptions import ClientError
 import logging
 
@@ -10,6 +11,21 @@ SECURITY_GROUP_NAME = "AutoSecGroup"
 SECURITY_GROUP_DESC = "Automated Security Group"
 LOG_FILE = "/tmp/security_automation.log"
 
+# Desired rules, reconciled against what the group already has
+INGRESS_RULES = [
+    # Allow HTTP (8080) and custom port (3001)
+    {'IpProtocol': 'tcp', 'FromPort': 8080, 'ToPort': 8080, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]},
+    {'IpProtocol': 'tcp', 'FromPort': 3001, 'ToPort': 3001, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
+]
+EGRESS_RULES = [
+    # Allow all outbound traffic
+    {'IpProtocol': '-1', 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
+]
+PRUNE_EXTRA_RULES = False  # True = revoke rules that are not in the lists above
+PROTOCOL_NAMES = {"6": "tcp", "17": "udp", "1": "icmp", "58": "icmpv6", "all": "-1"}
+# Fields that identify a group reference (Description and PeeringStatus don't)
+PAIR_FIELDS = ("UserId", "GroupId", "VpcId", "VpcPeeringConnectionId")
+
 # IAM policies to attach (example)
 POLICIES = [
     "arn:aws:iam::aws:policy/AmazonS3ReadOnlyAccess",
@@ -24,8 +40,8 @@ logging.basicConfig(
 )
 
 # ================= AWS CLIENTS =================
-ec2_client = boto3.client("ec2", region_name=REGION)
-iam_client = boto3.client("iam", region_name=REGION)
+ec2_client = aws_clients.client("ec2", region_name=REGION)
+iam_client = aws_clients.client("iam", region_name=REGION)
 
 # ================= FUNCTIONS =================
 
@@ -41,7 +57,7 @@ def create_security_group(sg_name, description, vpc_id):
         logging.info(f"Security Group created: {sg_id}")
         return sg_id
     except ClientError as e:
-        if "InvalidGroup.Duplicate" in str(e):
+        if error_code(e) == "InvalidGroup.Duplicate":
             logging.info(f"Security Group {sg_name} already exists, fetching ID...")
             response = ec2_client.describe_security_groups(
                 Filters=[{"Name": "group-name", "Values": [sg_name]}]
@@ -50,46 +66,113 @@ def create_security_group(sg_name, description, vpc_id):
         logging.error(f"Error creating security group: {e}")
         return None
 
-def add_sg_rules(sg_id):
-    """Add inbound and outbound rules to security group"""
-    try:
-        # Allow HTTP (8080) and custom port (3001)
-        ec2_client.authorize_security_group_ingress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {
-                    'IpProtocol': 'tcp',
-                    'FromPort': 8080,
-                    'ToPort': 8080,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-                },
-                {
-                    'IpProtocol': 'tcp',
-                    'FromPort': 3001,
-                    'ToPort': 3001,
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-                }
-            ]
-        )
-        logging.info(f"Ingress rules added to SG: {sg_id}")
-
-        # Allow all outbound traffic
-        ec2_client.authorize_security_group_egress(
-            GroupId=sg_id,
-            IpPermissions=[
-                {
-                    'IpProtocol': '-1',
-                    'IpRanges': [{'CidrIp': '0.0.0.0/0'}]
-                }
-            ]
-        )
-        logging.info(f"Egress rules added to SG: {sg_id}")
+def _rule_key(protocol, from_port, to_port, source_type, source):
+    """Canonical, hashable form of one rule (protocol, ports, one source)"""
+    protocol = PROTOCOL_NAMES.get(str(protocol).lower(), str(protocol).lower())
+    if protocol == "-1":
+        from_port = to_port = None
+    return (protocol, from_port, to_port, source_type, source)
 
-    except ClientError as e:
-        if "InvalidPermission.Duplicate" in str(e):
-            logging.info(f"Rules already exist for SG: {sg_id}")
+def _pair_key(pair, owner_id=None):
+    """Hashable form of a UserIdGroupPair; a pair without UserId belongs to the group's owner"""
+    pair = dict(pair, UserId=pair.get('UserId') or owner_id)
+    return tuple((field, pair[field]) for field in PAIR_FIELDS if pair.get(field))
+
+def normalize_permissions(permissions, owner_id=None):
+    """Flatten IpPermissions into a set of one-source rule keys"""
+    rules = set()
+    for perm in permissions:
+        protocol = perm['IpProtocol']
+        from_port, to_port = perm.get('FromPort'), perm.get('ToPort')
+        for ip_range in perm.get('IpRanges', []):
+            rules.add(_rule_key(protocol, from_port, to_port, 'IpRanges', ip_range['CidrIp']))
+        for ip_range in perm.get('Ipv6Ranges', []):
+            rules.add(_rule_key(protocol, from_port, to_port, 'Ipv6Ranges', ip_range['CidrIpv6']))
+        for prefix in perm.get('PrefixListIds', []):
+            rules.add(_rule_key(protocol, from_port, to_port, 'PrefixListIds', prefix['PrefixListId']))
+        for pair in perm.get('UserIdGroupPairs', []):
+            rules.add(_rule_key(protocol, from_port, to_port, 'UserIdGroupPairs', _pair_key(pair, owner_id)))
+    return rules
+
+def to_ip_permissions(rules):
+    """Group rule keys back into as few IpPermissions entries as possible"""
+    source_fields = {'IpRanges': 'CidrIp', 'Ipv6Ranges': 'CidrIpv6', 'PrefixListIds': 'PrefixListId'}
+    grouped = {}
+    for protocol, from_port, to_port, source_type, source in sorted(rules, key=str):
+        perm = grouped.get((protocol, from_port, to_port))
+        if perm is None:
+            perm = grouped[(protocol, from_port, to_port)] = {'IpProtocol': protocol}
+            if from_port is not None:
+                perm['FromPort'] = from_port
+                perm['ToPort'] = to_port
+        if source_type == 'UserIdGroupPairs':
+            # The whole pair, so cross-account and peered references keep their account and VPC
+            perm.setdefault(source_type, []).append(dict(source))
         else:
-            logging.error(f"Error adding SG rules: {e}")
+            perm.setdefault(source_type, []).append({source_fields[source_type]: source})
+    return list(grouped.values())
+
+def describe_sg_rules(sg_ids):
+    """Return {sg_id: (owner account, ingress rules, egress rules)} from one paginated Describe"""
+    paginator = ec2_client.get_paginator("describe_security_groups")
+    current = {}
+    for page in paginator.paginate(GroupIds=list(sg_ids)):
+        for group in page['SecurityGroups']:
+            owner_id = group.get('OwnerId')
+            current[group['GroupId']] = (owner_id,
+                                         normalize_permissions(group.get('IpPermissions', []), owner_id),
+                                         normalize_permissions(group.get('IpPermissionsEgress', []), owner_id))
+    return current
+
+def apply_rule_diff(sg_id, direction, desired, current, prune=PRUNE_EXTRA_RULES):
+    """Authorize missing rules and optionally revoke extra ones, one call each"""
+    if direction == "ingress":
+        authorize, revoke = ec2_client.authorize_security_group_ingress, ec2_client.revoke_security_group_ingress
+    else:
+        authorize, revoke = ec2_client.authorize_security_group_egress, ec2_client.revoke_security_group_egress
+    missing, extra = desired - current, current - desired
+    result = {"added": 0, "removed": 0, "extra": len(extra)}
+    # Separate calls, so a failed authorize still lets the extra rules be revoked and vice versa
+    if missing:
+        try:
+            authorize(GroupId=sg_id, IpPermissions=to_ip_permissions(missing))
+            result["added"] = len(missing)
+            logging.info(f"Added {len(missing)} {direction} rules to SG: {sg_id}")
+        except ClientError as e:
+            logging.error(f"Error adding {direction} rules to SG {sg_id}: {e}")
+    if extra and prune:
+        try:
+            revoke(GroupId=sg_id, IpPermissions=to_ip_permissions(extra))
+            result["removed"] = len(extra)
+            logging.info(f"Removed {len(extra)} {direction} rules from SG: {sg_id}")
+        except ClientError as e:
+            logging.error(f"Error removing {direction} rules from SG {sg_id}: {e}")
+    elif extra:
+        logging.info(f"SG {sg_id} has {len(extra)} {direction} rules not in config (kept)")
+    return result
+
+def reconcile_sg_rules(sg_ids, ingress=INGRESS_RULES, egress=EGRESS_RULES, prune=PRUNE_EXTRA_RULES):
+    """Bring every group's rules to the desired set; return per-group changes"""
+    try:
+        current = describe_sg_rules(sg_ids)
+    except ClientError as e:
+        logging.error(f"Error describing security groups {list(sg_ids)}: {e}")
+        return {}
+    results = {}
+    for sg_id, (owner_id, current_in, current_out) in current.items():
+        # Pairs in the config that omit UserId refer to groups in the group's own account
+        desired_in, desired_out = normalize_permissions(ingress, owner_id), normalize_permissions(egress, owner_id)
+        results[sg_id] = {
+            "ingress": apply_rule_diff(sg_id, "ingress", desired_in, current_in, prune),
+            "egress": apply_rule_diff(sg_id, "egress", desired_out, current_out, prune),
+        }
+        if not any(r["added"] or r["removed"] for r in results[sg_id].values()):
+            logging.info(f"Rules already up to date for SG: {sg_id}")
+    return results
+
+def add_sg_rules(sg_id):
+    """Add inbound and outbound rules to security group"""
+    return reconcile_sg_rules([sg_id]).get(sg_id)
 
 def attach_policies_to_user(user_name, policies):
     """Attach IAM policies to a specific IAM user"""
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Run provisioning steps concurrently in dependency order.
+
+Each Step names the context values it needs (inputs) and the values it
+produces (outputs). run_steps() starts every step whose inputs exist, on a
+bounded pool, so independent steps (for example creating an internet gateway
+and a subnet) overlap while dependent ones still run in order. Once a step
+fails no new step starts; running steps finish and the rest are reported as
+skipped.
+
+    steps = [
+        Step("vpc", create_vpc, outputs=["vpc_id"]),
+        Step("igw", create_igw, outputs=["igw_id"]),
+        Step("attach_igw", attach_igw, inputs=["vpc_id", "igw_id"], outputs=["igw_attached"]),
+    ]
+    context = run_steps(steps)
+
+Step functions are called with their inputs as keyword arguments. A step with
+one output returns its value; with several, a tuple in the same order. A step
+fails if it raises or returns None for an output. Per-step timings are logged
+at the end.
+
+With a Journal, each finished step's outputs are saved to a JSON file. On a
+rerun a step already marked done is skipped and its outputs are reused,
+after its optional verify(**inputs, **outputs) confirms (for example with a
+cheap Describe call) that what it created still exists. Steps that depend on
+a step that ran again are run again too.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# ================= CONFIG =================
+MAX_WORKERS = 8  # Steps running at once
+
+# ================= ENGINE =================
+class Step:
+    """One provisioning step: a function, the context keys it reads and the keys it writes"""
+
+    def __init__(self, name, func, inputs=(), outputs=(), verify=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.verify = verify
+
+    def run(self, context):
+        value = self.func(**{key: context[key] for key in self.inputs})
+        if not self.outputs:
+            return {}
+        values = (value,) if len(self.outputs) == 1 else tuple(value or (None,) * len(self.outputs))
+        results = dict(zip(self.outputs, values))
+        missing = [key for key, result in results.items() if result is None]
+        if missing:
+            raise StepFailed(f"step {self.name} produced no {', '.join(missing)}")
+        return results
+
+class StepFailed(Exception):
+    """Raised when a step fails; run_steps() re-raises it with what failed and what was skipped"""
+
+    def __init__(self, message, failed=(), skipped=(), context=None):
+        super().__init__(message)
+        self.failed = list(failed)
+        self.skipped = list(skipped)
+        self.context = context or {}
+
+class Journal:
+    """Step status and outputs persisted as JSON, so a rerun can skip finished steps"""
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.steps = {}
+        if not fresh and os.path.exists(path):
+            with open(path) as f:
+                self.steps = json.load(f).get("steps", {})
+
+    def completed(self, name):
+        """Return the recorded outputs of a finished step, or None"""
+        with self.lock:
+            entry = self.steps.get(name)
+            return dict(entry["outputs"]) if entry and entry["status"] == "done" else None
+
+    def record(self, name, status, outputs=None, error=None):
+        """Save a step's status; the file is replaced atomically so a crash never truncates it"""
+        with self.lock:
+            entry = {"status": status, "outputs": outputs or {}, "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            if error:
+                entry["error"] = error
+            self.steps[name] = entry
+            partial = f"{self.path}.partial"
+            with open(partial, "w") as f:
+                json.dump({"steps": self.steps}, f, indent=2)
+            os.replace(partial, self.path)
+
+def _run_step(step, context, journal, reuse=True):
+    """Run one step, or return its journaled outputs; the flag says whether it actually ran"""
+    if journal is None:
+        return step.run(context), True
+    outputs = journal.completed(step.name) if reuse else None
+    if outputs is not None:
+        inputs = {key: context[key] for key in step.inputs}
+        if step.verify is None or step.verify(**inputs, **outputs):
+            logging.info(f"Step {step.name}: already done {outputs or ''}".rstrip())
+            return outputs, False
+        logging.warning(f"Step {step.name}: recorded resources are gone, running it again")
+    journal.record(step.name, "running")
+    try:
+        outputs = step.run(context)
+    except Exception as e:
+        journal.record(step.name, "failed", error=str(e))
+        raise
+    journal.record(step.name, "done", outputs)
+    return outputs, True
+
+def validate(steps, context):
+    """Reject duplicate outputs, inputs nothing produces, and cycles"""
+    producers = {}
+    for step in steps:
+        for key in step.outputs:
+            if key in producers or key in context:
+                raise ValueError(f"{key} is produced by more than one step ({step.name})")
+            producers[key] = step.name
+    for step in steps:
+        for key in step.inputs:
+            if key not in producers and key not in context:
+                raise ValueError(f"step {step.name} needs {key}, which no step produces")
+
+    available = set(context)
+    remaining = list(steps)
+    while remaining:
+        ready = [step for step in remaining if set(step.inputs) <= available]
+        if not ready:
+            raise ValueError(f"dependency cycle between steps: {[step.name for step in remaining]}")
+        for step in ready:
+            available.update(step.outputs)
+            remaining.remove(step)
+
+def log_timings(timings, wall):
+    """Log each step's start offset and duration, slowest first"""
+    total = sum(duration for _, duration in timings.values())
+    logging.info(f"Steps finished in {wall:.1f}s wall ({total:.1f}s if run one after another)")
+    for name, (offset, duration) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        logging.info(f"  {name}: {duration:.1f}s (started at +{offset:.1f}s)")
+
+def run_steps(steps, context=None, max_workers=MAX_WORKERS, journal=None):
+    """Run steps as soon as their inputs exist; return the context with every output"""
+    context = dict(context or {})
+    validate(steps, context)
+    pending = list(steps)
+    running, timings, failed = {}, {}, []
+    fresh_keys = set()  # Outputs produced by steps that ran this time; their dependents must run too
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            if not failed:
+                for step in [s for s in pending if all(key in context for key in s.inputs)]:
+                    pending.remove(step)
+                    reuse = not fresh_keys & set(step.inputs)
+                    running[pool.submit(_run_step, step, context, journal, reuse)] = (step, time.monotonic())
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, step_start = running.pop(future)
+                timings[step.name] = (step_start - start, time.monotonic() - step_start)
+                try:
+                    outputs, ran = future.result()
+                    context.update(outputs)
+                    if ran:
+                        fresh_keys.update(outputs)
+                except Exception as e:
+                    logging.error(f"Step {step.name} failed: {e}")
+                    failed.append(step.name)
+
+    log_timings(timings, time.monotonic() - start)
+    if failed:
+        skipped = [step.name for step in pending]
+        if skipped:
+            logging.warning(f"Skipped after failure: {', '.join(skipped)}")
+        raise StepFailed(f"failed steps: {', '.join(failed)}", failed, skipped, context)
+    return context
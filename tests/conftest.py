@@ -0,0 +1,28 @@
+"""Shared fixtures: scripts loaded by path, and moto standing in for AWS."""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(REPO_ROOT, "script")
+sys.path.insert(0, SCRIPT_DIR)
+
+def load_script(file_name):
+    """Import a script by file name; most have dashes in their names, so plain import won't do"""
+    spec = importlib.util.spec_from_file_location(file_name[:-3].replace("-", "_").lower(),
+                                                  os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture
+def aws(monkeypatch):
+    """Run the test against moto with fake credentials"""
+    moto = pytest.importorskip("moto")
+    for name, value in {"AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing",
+                        "AWS_SESSION_TOKEN": "testing", "AWS_DEFAULT_REGION": "us-east-1"}.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        yield
@@ -0,0 +1,82 @@
+"""S3 staging of Lambda packages (Lambda-function.py), against moto."""
+import zipfile
+
+import pytest
+
+from conftest import load_script
+
+BUCKET = "staging-bucket"
+
+class Recorder:
+    """Forward calls to a client and record the keyword arguments of the named operations"""
+    def __init__(self, client, *operations):
+        self._client = client
+        self.calls = {operation: [] for operation in operations}
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+        if name not in self.calls:
+            return method
+
+        def record(*args, **kwargs):
+            self.calls[name].append(kwargs or args)
+            return method(*args, **kwargs)
+        return record
+
+@pytest.fixture
+def lf(aws, monkeypatch):
+    module = load_script("Lambda-function.py")
+    module.s3_client.create_bucket(Bucket=BUCKET)
+    monkeypatch.setattr(module, "s3_client", Recorder(module.s3_client, "upload_file"))
+    monkeypatch.setattr(module, "lambda_client",
+                        Recorder(module.lambda_client, "create_function", "update_function_code"))
+    return module
+
+def make_zip(path, body="def lambda_handler(event, context):\n    return 1\n"):
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("lambda_function.py", body)
+    return str(path)
+
+def test_identical_package_is_uploaded_once(lf, tmp_path):
+    first = make_zip(tmp_path / "a.zip")
+    second = make_zip(tmp_path / "b.zip")
+
+    key = lf.stage_package(first, BUCKET)
+    assert key.startswith(lf.STAGING_PREFIX) and key.endswith(".zip")
+    assert lf.stage_package(second, BUCKET) == key
+    assert len(lf.s3_client.calls["upload_file"]) == 1
+
+    changed = make_zip(tmp_path / "c.zip", body="def lambda_handler(event, context):\n    return 2\n")
+    assert lf.stage_package(changed, BUCKET) != key
+    assert len(lf.s3_client.calls["upload_file"]) == 2
+
+def test_large_package_is_deployed_from_s3(lf, tmp_path, monkeypatch):
+    zip_file = make_zip(tmp_path / "big.zip")
+    monkeypatch.setattr(lf, "STAGING_BUCKET", BUCKET)
+    monkeypatch.setattr(lf, "INLINE_LIMIT", 1)   # Every package is over the limit
+    role_arn = lf.iam_client.create_role(
+        RoleName="staging-test-role",
+        AssumeRolePolicyDocument='{"Version": "2012-10-17", "Statement": []}')["Role"]["Arn"]
+
+    assert lf.create_lambda_function("staged", role_arn, zip_file)
+    code = lf.lambda_client.calls["create_function"][0]["Code"]
+    assert code["S3Bucket"] == BUCKET and "ZipFile" not in code
+
+    updated = make_zip(tmp_path / "big2.zip", body="def lambda_handler(event, context):\n    return 3\n")
+    assert lf.update_lambda_function_code("staged", updated)
+    update = lf.lambda_client.calls["update_function_code"][0]
+    assert update["S3Bucket"] == BUCKET and update["S3Key"] != code["S3Key"] and "ZipFile" not in update
+    assert len(lf.s3_client.calls["upload_file"]) == 2
+
+def test_small_package_without_bucket_is_inline(lf, tmp_path, monkeypatch):
+    zip_file = make_zip(tmp_path / "small.zip")
+    monkeypatch.setattr(lf, "STAGING_BUCKET", None)
+    code = lf.package_code(zip_file)
+    assert set(code) == {"ZipFile"}
+    assert lf.s3_client.calls["upload_file"] == []
+
+def test_large_package_without_bucket_is_refused(lf, tmp_path, monkeypatch):
+    zip_file = make_zip(tmp_path / "big.zip")
+    monkeypatch.setattr(lf, "STAGING_BUCKET", None)
+    monkeypatch.setattr(lf, "INLINE_LIMIT", 1)
+    assert lf.package_code(zip_file) is None
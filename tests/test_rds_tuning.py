@@ -0,0 +1,71 @@
+"""Parameter and storage sizing in rds_tuning.py; pure arithmetic, no AWS calls."""
+import pytest
+
+import rds_tuning
+
+def test_instance_resources():
+    assert rds_tuning.instance_resources("db.t3.micro") == (2, 1024)
+    assert rds_tuning.instance_resources("db.m6i.2xlarge") == (8, 32 * 1024)
+    assert rds_tuning.instance_resources("db.r6g.xlarge") == (4, 32 * 1024)
+    assert rds_tuning.instance_resources("db.x2iedn.large") == (2, 32 * 1024)
+
+@pytest.mark.parametrize("instance_class", ["m6i.large", "db.m6i.nano", "db.z1d.large", "db.t3.4xlarge"])
+def test_unknown_instance_class(instance_class):
+    with pytest.raises(ValueError):
+        rds_tuning.instance_resources(instance_class)
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        rds_tuning.postgres_parameters("db.t3.micro", "batch")
+
+def test_small_oltp():
+    params = rds_tuning.postgres_parameters("db.t3.micro", "oltp")
+    assert params["shared_buffers"] == "32768"          # 256 MiB in 8 kB pages
+    assert params["effective_cache_size"] == "98304"
+    assert params["max_connections"] == "112"           # memory-bound, not 2 vCPUs x 100
+    assert params["work_mem"] == "4096"                 # clamped to the PostgreSQL default
+    assert params["wal_buffers"] == "1024"
+    assert params["max_parallel_workers_per_gather"] == "1"
+
+def test_analytics_on_memory_optimized():
+    params = rds_tuning.postgres_parameters("db.r6g.xlarge", "analytics", allocated_gb=1000)
+    assert params["shared_buffers"] == "1048576"        # 8 GiB
+    assert params["max_connections"] == "40"
+    assert params["work_mem"] == "104857"
+    assert params["maintenance_work_mem"] == str(2 * 1024 * 1024)   # capped at 2 GB
+    assert params["max_wal_size"] == "16384"
+    assert params["default_statistics_target"] == "500"
+    assert params["wal_buffers"] == "2048"              # 16 MB
+
+def test_profiles_trade_connections_for_work_mem():
+    oltp = rds_tuning.postgres_parameters("db.m6i.2xlarge", "oltp")
+    analytics = rds_tuning.postgres_parameters("db.m6i.2xlarge", "analytics")
+    assert oltp["max_connections"] == "800"
+    assert int(oltp["max_connections"]) > int(analytics["max_connections"])
+    assert int(oltp["work_mem"]) < int(analytics["work_mem"])
+    assert oltp["shared_buffers"] == analytics["shared_buffers"]
+
+def test_wal_size_limited_by_storage():
+    params = rds_tuning.postgres_parameters("db.r6g.xlarge", "analytics", allocated_gb=20)
+    assert params["max_wal_size"] == "5120"             # a quarter of the volume
+    assert params["min_wal_size"] == "2560"
+
+def test_all_values_are_strings():
+    params = rds_tuning.postgres_parameters("db.m6i.large")
+    assert all(isinstance(value, str) for value in params.values())
+
+def test_small_volume_has_fixed_performance():
+    assert rds_tuning.storage_settings(100, "oltp") == {"AllocatedStorage": 100, "StorageType": "gp3"}
+    assert rds_tuning.storage_settings(5)["AllocatedStorage"] == rds_tuning.GP3_MIN_GB
+
+@pytest.mark.parametrize("allocated_gb, profile, iops, throughput", [
+    (500, "oltp", 15000, 500),
+    (1000, "analytics", 12000, 1000),
+    (400, "mixed", 12000, 500),
+    (16000, "analytics", 64000, 4000),   # both at the gp3 maximum
+])
+def test_provisioned_volume(allocated_gb, profile, iops, throughput):
+    storage = rds_tuning.storage_settings(allocated_gb, profile)
+    assert storage["Iops"] == iops
+    assert storage["StorageThroughput"] == throughput
+    assert storage["StorageThroughput"] <= storage["Iops"] * rds_tuning.GP3_MAX_THROUGHPUT_PER_IOPS